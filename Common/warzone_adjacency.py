@@ -0,0 +1,82 @@
+###
+#   Territory Adjacency
+#
+#   Derives territory connections from the territory outlines instead of copying them from an existing game.
+#
+#   Two territories are connected when their outlines run alongside each other, within a tolerance, for at least a minimum length.
+#   The tolerance absorbs borders that were drawn or flattened slightly apart, the minimum length ignores corners that only touch.
+#   Only pairs whose bounding boxes overlap (found with the bounding box grid) have their borders compared.
+#
+#   Maps are drawn at very different scales and with different gaps between territories, so by default the tolerance is
+#   an eighth of the median territory size (the shorter side of its bounding box), about 4 on Luthadel and VengeancePact.
+#   The minimum length stays fixed: narrow territories such as bridges only share a few units of border with their neighbours.
+#
+###
+
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from warzone_commands import AddTerritoryConnectionCommand
+from warzone_connections import ConnectionIndex
+from warzone_geometry import Polygon, polygon_bbox, shared_border_length
+from warzone_spatial_index import BoundingBoxGrid
+
+DEFAULT_TOLERANCE_FRACTION = 0.125
+DEFAULT_MIN_SHARED_LENGTH = 1.0
+
+
+def estimate_tolerance(polygons: Sequence[Polygon], fraction: float = DEFAULT_TOLERANCE_FRACTION) -> float:
+    """ Returns the fraction of the median of the shorter bounding box sides of the polygons, 0 if they are all empty """
+    bboxes = np.array([polygon_bbox(polygon) for polygon in polygons if polygon]).reshape(-1, 4)
+    if len(bboxes) == 0:
+        return 0.0
+    sides = np.minimum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1])
+    return float(np.median(sides)) * fraction
+
+
+def find_shared_borders(
+        polygons: Sequence[Polygon],
+        tolerance: Optional[float] = None,
+        min_shared_length: float = DEFAULT_MIN_SHARED_LENGTH) -> Iterator[Tuple[int, int, float]]:
+    """
+    Yields (i, j, shared length) with i < j for every pair of polygons sharing a border
+
+    Args:
+        polygons: flattened outlines in the same coordinate system, empty polygons never connect
+        tolerance: the furthest apart two borders can be and still count as shared, defaults to estimate_tolerance
+        min_shared_length: the shortest shared border that makes a connection
+    """
+    if tolerance is None:
+        tolerance = estimate_tolerance(polygons)
+    indices = [index for index, polygon in enumerate(polygons) if polygon]
+    grid = BoundingBoxGrid([polygon_bbox(polygons[index]) for index in indices], tolerance)
+    for a, b in grid.overlapping_pairs():
+        i, j = indices[a], indices[b]
+        length = max(
+            shared_border_length(polygons[i], polygons[j], tolerance),
+            shared_border_length(polygons[j], polygons[i], tolerance))
+        if length >= min_shared_length:
+            yield i, j, length
+
+
+def territory_connection_commands(
+        territories: Sequence[Tuple[int, Polygon]],
+        tolerance: Optional[float] = None,
+        min_shared_length: float = DEFAULT_MIN_SHARED_LENGTH) -> Iterator[AddTerritoryConnectionCommand]:
+    """
+    Yields an AddTerritoryConnectionCommand for every pair of territories sharing a border
+
+    Args:
+        territories: (territory id, outline) pairs, a territory drawn as several outlines may repeat its id
+        tolerance, min_shared_length: see find_shared_borders
+
+    Usage:
+        WarzoneSetDetailsPostRequestModel(email, token, map_id, territory_connection_commands(territories)).write_JSON(stream)
+    """
+    territory_ids: List[int] = [territory_id for territory_id, _ in territories]
+    connections = ConnectionIndex()
+    for i, j, _ in find_shared_borders([polygon for _, polygon in territories], tolerance, min_shared_length):
+        territory_id, territory_id_2 = territory_ids[i], territory_ids[j]
+        if territory_id != territory_id_2 and connections.add(territory_id, territory_id_2):
+            yield AddTerritoryConnectionCommand(*sorted((territory_id, territory_id_2)))
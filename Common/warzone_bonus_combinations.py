@@ -0,0 +1,139 @@
+###
+#   Combination Bonuses
+#
+#   Generates a bonus for every k territory combination (pairs, triples, ...) within groups of territories,
+#   e.g. the Luthadel contract penalties where holding any 3 territories of a contract group costs -999.
+#
+#   Bonuses and their commands are generated lazily one combination at a time, so the command list never has to exist at once.
+#   Iterating again regenerates them, which lets the same generator be validated and then serialized.
+#
+#   A combination found in more than one group is only generated from the first group holding all of its territories,
+#   so duplicates are removed without remembering the combinations already generated.
+#   The counts are computed up front with inclusion-exclusion over the group overlaps, without generating anything.
+#
+###
+
+import itertools
+import math
+from typing import Callable, Hashable, Iterator, List, NamedTuple, Sequence, Tuple, Union
+
+from warzone_commands import AddBonusCommand, AddTerritoryToBonusCommand, Command
+from warzone_json import encode_command
+
+DEFAULT_SAMPLE_SIZE = 256
+
+Territory = Hashable
+
+
+class CombinationBonus(NamedTuple):
+    name: str
+    value: int
+    territories: Tuple[Territory, ...]
+
+
+class CombinationBonuses:
+    """
+    Every combination of size territories within each group, as bonuses
+
+    Args:
+        groups: the territory groups, a territory may be in several groups
+        size: the number of territories in each bonus, 2 for pairs, 3 for triples etc.
+        territory_id: returns the warzone territory id of a territory
+        name: returns the bonus name for a combination of territories, in group order
+        value: the bonus value, or a function returning it for a combination of territories
+
+    Usage:
+        bonuses = CombinationBonuses(groups, 3, get_territory_id, get_bonus_name, -999)
+        bonuses.count(), bonuses.command_count(), bonuses.estimate_payload_bytes()
+        WarzoneSetDetailsPostRequestModel(email, token, map_id, bonuses.commands()).write_JSON(stream)
+    """
+
+    def __init__(
+            self,
+            groups: Sequence[Sequence[Territory]],
+            size: int,
+            territory_id: Callable[[Territory], int],
+            name: Callable[[Tuple[Territory, ...]], str],
+            value: Union[int, Callable[[Tuple[Territory, ...]], int]]):
+        if size < 1:
+            raise ValueError(f'Combination size must be at least 1, got {size}')
+        # a territory listed twice in a group would only produce invalid bonuses
+        self.groups: List[List[Territory]] = [list(dict.fromkeys(group)) for group in groups]
+        self.size = size
+        self.territory_id = territory_id
+        self.name = name
+        self.value = value
+
+        # bit i of a territory's mask is set if group i holds it
+        self._group_masks = {}
+        for index, group in enumerate(self.groups):
+            for territory in group:
+                self._group_masks[territory] = self._group_masks.get(territory, 0) | (1 << index)
+
+    def _get_value(self, territories: Tuple[Territory, ...]) -> int:
+        return self.value(territories) if callable(self.value) else self.value
+
+    def __iter__(self) -> Iterator[CombinationBonus]:
+        """ Yields each unique bonus, group by group """
+        for index in range(len(self.groups)):
+            yield from self._iter_group(index)
+
+    def _iter_group(self, index: int) -> Iterator[CombinationBonus]:
+        group = self.groups[index]
+        earlier_groups = (1 << index) - 1
+        earlier_masks = [self._group_masks[territory] & earlier_groups for territory in group]
+        for positions in itertools.combinations(range(len(group)), self.size):
+            # skip the combination if an earlier group holds all of it, that group already generated it
+            if earlier_groups and self._all_in_one_group(earlier_masks, positions):
+                continue
+            territories = tuple(group[position] for position in positions)
+            yield CombinationBonus(self.name(territories), self._get_value(territories), territories)
+
+    @staticmethod
+    def _all_in_one_group(masks: List[int], positions: Tuple[int, ...]) -> bool:
+        shared = masks[positions[0]]
+        for position in positions[1:]:
+            if not shared:
+                return False
+            shared &= masks[position]
+        return shared != 0
+
+    def commands(self) -> Iterator[Command]:
+        """ Yields the AddBonusCommand followed by the AddTerritoryToBonusCommands of each bonus """
+        for bonus in self:
+            yield AddBonusCommand(bonus.name, bonus.value)
+            for territory in bonus.territories:
+                yield AddTerritoryToBonusCommand(self.territory_id(territory), bonus.name)
+
+    def count(self) -> int:
+        """ Returns the number of unique bonuses without generating them """
+        total = 0
+        # inclusion-exclusion over the groups, an intersection too small for one combination ends that branch
+        stack = [(index, set(group), 1) for index, group in enumerate(self.groups)]
+        while stack:
+            index, intersection, depth = stack.pop()
+            if len(intersection) < self.size:
+                continue
+            total += math.comb(len(intersection), self.size) * (1 if depth % 2 else -1)
+            for next_index in range(index + 1, len(self.groups)):
+                stack.append((next_index, intersection.intersection(self.groups[next_index]), depth + 1))
+        return total
+
+    def command_count(self) -> int:
+        """ Returns the number of commands without generating them, one per bonus plus one per territory in it """
+        return self.count() * (1 + self.size)
+
+    def estimate_payload_bytes(self, sample_size: int = DEFAULT_SAMPLE_SIZE) -> int:
+        """ Estimates the size of the compact commands json from about sample_size bonuses taken across all the groups """
+        per_group = max(1, sample_size // max(1, len(self.groups)))
+        sampled = 0
+        sampled_bytes = 0
+        for index in range(len(self.groups)):
+            for bonus in itertools.islice(self._iter_group(index), per_group):
+                sampled += 1
+                sampled_bytes += len(encode_command(AddBonusCommand(bonus.name, bonus.value)).encode('utf-8')) + 1
+                for territory in bonus.territories:
+                    sampled_bytes += len(encode_command(AddTerritoryToBonusCommand(self.territory_id(territory), bonus.name)).encode('utf-8')) + 1
+        if sampled == 0:
+            return 0
+        return round(sampled_bytes / sampled * self.count())
@@ -0,0 +1,162 @@
+###
+#   Bonus Membership
+#
+#   Which elements belong to which bonuses, as recorded in the elements' <desc> nodes for a later api upload:
+#       <desc>bonus_parents=Lanternhollow Commons;Eastern Oldgate;Oldgate</desc>   on a territory
+#       <desc>bonus_value=4</desc>                                                 on a BonusLink_
+#
+#   The document's descriptors are parsed once into element -> bonuses and bonus -> elements,
+#   changes are made in bulk against that index and only the elements that changed get their <desc> rewritten.
+#
+#   The descriptor text format lives in warzone_descriptors.
+#   Keys are matched exactly, so a bonus_parents_old descriptor or a bonus named bonus_parents never matches,
+#   and <desc> nodes without text are skipped. An element with several bonus_parents descriptors has them merged.
+#
+###
+
+from typing import Dict, Iterable, List, Optional
+
+import inkex
+
+from warzone_descriptors import (
+    BONUS_PARENTS_KEY, DESC_TAG, DESCRIPTOR_VALUE_SEPARATOR, format_descriptor, parse_bonus_names, parse_descriptor)
+
+
+def get_descriptors(element, key: str) -> List[inkex.Desc]:
+    """ Returns the element's own <desc> children holding the given key """
+    return [
+        child for child in element
+        if child.tag == DESC_TAG and (parse_descriptor(child.text) or (None,))[0] == key
+    ]
+
+
+def get_descriptor_value(element, key: str) -> Optional[str]:
+    descriptors = get_descriptors(element, key)
+    if not descriptors:
+        return None
+    return parse_descriptor(descriptors[0].text)[1]
+
+
+def upsert_descriptor(element, key: str, value) -> inkex.Desc:
+    """ Sets the element's descriptor for key, merging duplicates of it into the first """
+    descriptors = get_descriptors(element, key)
+    if not descriptors:
+        descriptor = inkex.Desc(format_descriptor(key, value))
+        element.add(descriptor)
+        return descriptor
+    for duplicate in descriptors[1:]:
+        element.remove(duplicate)
+    descriptors[0].text = format_descriptor(key, value)
+    return descriptors[0]
+
+
+def remove_descriptor(element, key: str) -> None:
+    for descriptor in get_descriptors(element, key):
+        element.remove(descriptor)
+
+
+class BonusMembership:
+    """
+    Index of the bonus_parents descriptors of a document
+
+    Usage:
+        membership = BonusMembership(self.svg)
+        membership.add(elements, 'Oldgate')
+        membership.remove([territory], 'Eastern Oldgate')
+        membership.write()
+    """
+
+    def __init__(self, root):
+        self.root = root
+        # dicts keep insertion order, so they are used as ordered sets
+        self._element_bonuses: Dict[object, Dict[str, None]] = {}
+        self._bonus_elements: Dict[str, Dict[object, None]] = {}
+        self._changed: Dict[object, None] = {}
+        self.load()
+
+    def load(self) -> None:
+        """ Parses every bonus_parents descriptor in the document, discarding unwritten changes """
+        self._element_bonuses = {}
+        self._bonus_elements = {}
+        self._changed = {}
+        for descriptor in self.root.iter(DESC_TAG):
+            parsed = parse_descriptor(descriptor.text)
+            if parsed is None or parsed[0] != BONUS_PARENTS_KEY:
+                continue
+            element = descriptor.getparent()
+            bonuses = self._element_bonuses.setdefault(element, {})
+            for bonus_name in parse_bonus_names(parsed[1]):
+                bonuses[bonus_name] = None
+                self._bonus_elements.setdefault(bonus_name, {})[element] = None
+
+    def bonuses_of(self, element) -> List[str]:
+        """ Returns the bonuses the element belongs to, in the order they were added """
+        return list(self._element_bonuses.get(element, ()))
+
+    def elements_of(self, bonus_name: str) -> List[object]:
+        """ Returns the elements belonging to the bonus, in the order they were added """
+        return list(self._bonus_elements.get(bonus_name, ()))
+
+    def bonus_names(self) -> List[str]:
+        return list(self._bonus_elements)
+
+    def elements(self) -> List[object]:
+        """ Returns every element belonging to at least one bonus """
+        return [element for element, bonuses in self._element_bonuses.items() if bonuses]
+
+    def __contains__(self, bonus_name: str) -> bool:
+        return bonus_name in self._bonus_elements
+
+    def add(self, elements: Iterable[object], bonus_name: str) -> int:
+        """ Adds the elements to the bonus, returning how many were not already in it """
+        bonus_name = bonus_name.strip()
+        if not bonus_name or DESCRIPTOR_VALUE_SEPARATOR in bonus_name:
+            raise ValueError(f'Invalid bonus name: {bonus_name!r}')
+        members = self._bonus_elements.setdefault(bonus_name, {})
+        added = 0
+        for element in elements:
+            if element in members:
+                continue
+            members[element] = None
+            self._element_bonuses.setdefault(element, {})[bonus_name] = None
+            self._changed[element] = None
+            added += 1
+        return added
+
+    def remove(self, elements: Iterable[object], bonus_name: str) -> int:
+        """ Removes the elements from the bonus, returning how many were in it """
+        members = self._bonus_elements.get(bonus_name)
+        if members is None:
+            return 0
+        removed = 0
+        for element in elements:
+            if element not in members:
+                continue
+            del members[element]
+            del self._element_bonuses[element][bonus_name]
+            self._changed[element] = None
+            removed += 1
+        if not members:
+            del self._bonus_elements[bonus_name]
+        return removed
+
+    def remove_bonus(self, bonus_name: str) -> int:
+        """ Removes every element from the bonus """
+        return self.remove(self.elements_of(bonus_name), bonus_name)
+
+    def changed_elements(self) -> List[object]:
+        return list(self._changed)
+
+    def write(self) -> int:
+        """ Rewrites the bonus_parents descriptor of every changed element, returning how many were written """
+        written = 0
+        for element in self._changed:
+            bonuses = self._element_bonuses.get(element)
+            if bonuses:
+                upsert_descriptor(element, BONUS_PARENTS_KEY, DESCRIPTOR_VALUE_SEPARATOR.join(bonuses))
+            else:
+                remove_descriptor(element, BONUS_PARENTS_KEY)
+                self._element_bonuses.pop(element, None)
+            written += 1
+        self._changed = {}
+        return written
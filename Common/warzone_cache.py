@@ -0,0 +1,37 @@
+###
+#   Cache Folder
+#
+#   Where the extensions and tools keep data that is expensive to recompute or download,
+#   e.g. the inkscape version or the last state uploaded to a map.
+#
+#   %LOCALAPPDATA%\warzone-map-making on windows, ~/.cache/warzone-map-making elsewhere,
+#   or WARZONE_CACHE_DIR if it is set.
+#
+###
+
+import json
+import os
+import sys
+
+CACHE_DIRECTORY_ENVIRONMENT_VARIABLE = 'WARZONE_CACHE_DIR'
+CACHE_DIRECTORY_NAME = 'warzone-map-making'
+
+
+def get_cache_directory(*parts: str) -> str:
+    """ Returns the cache folder, or the sub folder of it given by parts. The folder is not created """
+    directory = os.environ.get(CACHE_DIRECTORY_ENVIRONMENT_VARIABLE)
+    if not directory:
+        if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+            directory = os.path.join(os.environ['LOCALAPPDATA'], CACHE_DIRECTORY_NAME)
+        else:
+            directory = os.path.join(os.path.expanduser('~'), '.cache', CACHE_DIRECTORY_NAME)
+    return os.path.join(directory, *parts)
+
+
+def write_json_atomic(path: str, value) -> None:
+    """ Writes compact json through a temporary file, so a crash mid-write never leaves a corrupt file """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as stream:
+        json.dump(value, stream, separators=(',', ':'))
+    os.replace(temp_path, path)
@@ -0,0 +1,190 @@
+###
+#   Territory Centerpoints
+#
+#   Finds the point to place a territory's army label: the pole of inaccessibility,
+#   the point inside the territory furthest from its border, rather than the centroid which can fall outside concave territories.
+#
+#   The search covers the territory's bounding box with square cells and keeps subdividing the cells that could still
+#   hold a point further from the border than the best found so far (polylabel). Instead of one cell at a time through
+#   a priority queue, each generation of cells of every territory is measured at once with numpy, territories being
+#   batched by their edge count so they can share padded edge arrays.
+#
+###
+
+import math
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from warzone_commands import SetTerritoryCenterpointCommand
+from warzone_geometry import MAX_BLOCK_CELLS, Polygon, polygon_bbox, polygon_edges, signed_area
+
+DEFAULT_CENTERPOINT_PRECISION = 0.5
+CENTERPOINT_DECIMALS = 2
+
+_CHILD_OFFSETS = np.array([[-1, -1], [1, -1], [-1, 1], [1, 1]], dtype=float) / 2
+
+
+def ring_centroid(ring: np.ndarray) -> Tuple[float, float]:
+    """ Area centroid of a ring, the mean of its vertices if it has no area """
+    area = signed_area(ring)
+    if area == 0.0:
+        mean = ring.mean(axis=0)
+        return float(mean[0]), float(mean[1])
+    following = np.roll(ring, -1, axis=0)
+    cross = ring[:, 0] * following[:, 1] - following[:, 0] * ring[:, 1]
+    x = float(np.dot(ring[:, 0] + following[:, 0], cross)) / (6 * area)
+    y = float(np.dot(ring[:, 1] + following[:, 1], cross)) / (6 * area)
+    return x, y
+
+
+def _padded_edges(polygon: Polygon, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    starts, ends = polygon_edges(polygon)
+    # zero length edges at an existing vertex change neither the nearest distance nor the crossing count
+    padding = np.repeat(starts[:1], width - len(starts), axis=0)
+    return np.concatenate([starts, padding]), np.concatenate([ends, padding])
+
+
+def _cell_distances(centers: np.ndarray, owners: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """ Signed distance of each cell center to the outline of the polygon that owns it, positive inside """
+    distances = np.empty(len(centers))
+    directions = ends - starts
+    squared_lengths = np.einsum('pek,pek->pe', directions, directions)
+    safe_lengths = np.where(squared_lengths == 0, 1.0, squared_lengths)
+    block = max(1, MAX_BLOCK_CELLS // starts.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for begin in range(0, len(centers), block):
+            points = centers[begin:begin + block]
+            owner = owners[begin:begin + block]
+            cell_starts, cell_ends, cell_directions = starts[owner], ends[owner], directions[owner]
+            to_points = points[:, None, :] - cell_starts
+            along = np.clip(np.einsum('cek,cek->ce', to_points, cell_directions) / safe_lengths[owner], 0.0, 1.0)
+            offsets = to_points - along[:, :, None] * cell_directions
+            nearest = np.sqrt(np.einsum('cek,cek->ce', offsets, offsets).min(axis=1))
+            # even-odd crossing count as in points_in_polygon
+            px, py = points[:, 0][:, None], points[:, 1][:, None]
+            x1, y1, x2, y2 = cell_starts[:, :, 0], cell_starts[:, :, 1], cell_ends[:, :, 0], cell_ends[:, :, 1]
+            spans = (y1 > py) != (y2 > py)
+            crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside = np.count_nonzero(spans & (px < crossing_x), axis=1) % 2 == 1
+            distances[begin:begin + block] = np.where(inside, nearest, -nearest)
+    return distances
+
+
+def _best_per_owner(distances: np.ndarray, owners: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns the index of each owner's largest distance and whether the owner had any cells """
+    order = np.lexsort((distances, owners))
+    sorted_owners = owners[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = sorted_owners[1:] != sorted_owners[:-1]
+    best = np.zeros(count, dtype=int)
+    present = np.zeros(count, dtype=bool)
+    best[sorted_owners[last]] = order[last]
+    present[sorted_owners[last]] = True
+    return best, present
+
+
+def _solve_batch(polygons: List[Polygon], precision: float) -> np.ndarray:
+    """ Runs polylabel for polygons padded to the same edge count, all of their cells measured together """
+    width = max(sum(len(ring) for ring in polygon) for polygon in polygons)
+    padded = [_padded_edges(polygon, width) for polygon in polygons]
+    starts = np.stack([edges[0] for edges in padded])
+    ends = np.stack([edges[1] for edges in padded])
+    count = len(polygons)
+
+    bboxes = np.array([polygon_bbox(polygon) for polygon in polygons])
+    cell_sizes = np.minimum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1])
+
+    # the largest ring's centroid and the bounding box center are the first guesses, often already close
+    guesses = []
+    for polygon, bbox in zip(polygons, bboxes):
+        largest = max(polygon, key=lambda ring: abs(signed_area(ring)))
+        guesses.append(ring_centroid(largest))
+        guesses.append(((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2))
+    guesses = np.array(guesses)
+    guess_owners = np.repeat(np.arange(count), 2)
+    guess_distances = _cell_distances(guesses, guess_owners, starts, ends)
+    best, _ = _best_per_owner(guess_distances, guess_owners, count)
+    best_points = guesses[best]
+    best_distances = guess_distances[best]
+
+    # cover each bounding box with square cells the size of its shorter side
+    centers, owners, halves = [], [], []
+    for index, (bbox, cell_size) in enumerate(zip(bboxes, cell_sizes)):
+        if cell_size <= 0:
+            best_points[index] = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+            best_distances[index] = 0.0
+            continue
+        xs = np.arange(bbox[0], bbox[2], cell_size) + cell_size / 2
+        ys = np.arange(bbox[1], bbox[3], cell_size) + cell_size / 2
+        grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+        centers.append(grid)
+        owners.append(np.full(len(grid), index))
+        halves.append(np.full(len(grid), cell_size / 2))
+    if not centers:
+        return np.column_stack([best_points, best_distances])
+    centers, owners, halves = np.concatenate(centers), np.concatenate(owners), np.concatenate(halves)
+
+    while len(centers):
+        distances = _cell_distances(centers, owners, starts, ends)
+        best, present = _best_per_owner(distances, owners, count)
+        improved = present & (distances[best] > best_distances)
+        best_points[improved] = centers[best[improved]]
+        best_distances[improved] = distances[best[improved]]
+        # a point within a cell is at most the cell's half diagonal further from the outline than the cell's center
+        promising = distances + halves * math.sqrt(2) - best_distances[owners] > precision
+        halves = np.repeat(halves[promising] / 2, 4)
+        owners = np.repeat(owners[promising], 4)
+        centers = (centers[promising][:, None, :] + _CHILD_OFFSETS[None, :, :] * 2 * halves.reshape(-1, 4, 1)).reshape(-1, 2)
+
+    return np.column_stack([best_points, best_distances])
+
+
+def poles_of_inaccessibility(polygons: Sequence[Polygon], precision: float = DEFAULT_CENTERPOINT_PRECISION) -> np.ndarray:
+    """
+    Finds the point inside each polygon furthest from its outline
+
+    Args:
+        polygons: rings using the even-odd rule, holes are avoided like the outside
+        precision: each result is within this distance of the true pole's distance from the outline
+
+    Returns:
+        (n, 3) array of x, y and distance from the outline, distance is 0 or negative for polygons with no usable interior
+    """
+    polygons = [[ring for ring in polygon if len(ring) >= 3] for polygon in polygons]
+    if any(not polygon for polygon in polygons):
+        raise ValueError('Polygon has no rings to find a centerpoint in')
+    results = np.zeros((len(polygons), 3))
+    # polygons are padded to the edge count of their batch, so batch them with others of a similar size
+    edge_counts = np.array([sum(len(ring) for ring in polygon) for polygon in polygons], dtype=int)
+    buckets = np.ceil(np.log2(np.maximum(edge_counts, 1))).astype(int)
+    for bucket in np.unique(buckets):
+        indices = np.flatnonzero(buckets == bucket)
+        results[indices] = _solve_batch([polygons[index] for index in indices], precision)
+    return results
+
+
+def pole_of_inaccessibility(polygon: Polygon, precision: float = DEFAULT_CENTERPOINT_PRECISION) -> Tuple[float, float, float]:
+    """ Finds the point inside a single polygon furthest from its outline, see poles_of_inaccessibility """
+    x, y, distance = poles_of_inaccessibility([polygon], precision)[0]
+    return float(x), float(y), float(distance)
+
+
+def territory_centerpoint_commands(
+        territories: Sequence[Tuple[int, Polygon]],
+        precision: float = DEFAULT_CENTERPOINT_PRECISION) -> Iterator[SetTerritoryCenterpointCommand]:
+    """
+    Yields a SetTerritoryCenterpointCommand at the pole of inaccessibility of each territory
+
+    Args:
+        territories: (territory id, outline) pairs in map coordinates, a territory drawn as several outlines
+            gets the centerpoint of the outline with the most room
+    """
+    territories = [(territory_id, polygon) for territory_id, polygon in territories if any(len(ring) >= 3 for ring in polygon)]
+    poles = poles_of_inaccessibility([polygon for _, polygon in territories], precision)
+    best = {}
+    for (territory_id, _), (x, y, distance) in zip(territories, poles):
+        if territory_id not in best or distance > best[territory_id][2]:
+            best[territory_id] = (x, y, distance)
+    for territory_id, (x, y, _) in best.items():
+        yield SetTerritoryCenterpointCommand(territory_id, round(float(x), CENTERPOINT_DECIMALS), round(float(y), CENTERPOINT_DECIMALS))
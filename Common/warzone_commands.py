@@ -0,0 +1,247 @@
+###
+#   Warzone Commands
+#
+#   The SetMapDetails command model shared by the tools and extensions.
+#
+#   Commands use __slots__ so large command lists (e.g. the combinatorial contract bonuses)
+#   do not carry a per instance __dict__, and serialize through the compact streaming encoder.
+#
+#   Construction only coerces types, validation is done in bulk over a whole command list
+#   with validate_commands once it has been generated.
+#
+###
+
+from typing import Iterable, List, Optional
+
+from warzone_json import encode_command, payload_to_json, write_payload_json
+
+CONNECTION_WRAPS = ("Normal", "WrapHorizontally", "WrapVertically")
+
+
+class Command:
+    """
+    Base of all SetMapDetails commands
+
+    Subclasses list their json fields in __slots__, in the order they are serialized.
+    Fields that are None are left out of the json.
+    """
+    __slots__ = ()
+    command = ""
+
+    def to_dict(self) -> dict:
+        values = {"command": self.command}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not None:
+                values[field] = value
+        return values
+
+    def to_JSON(self) -> str:
+        return encode_command(self)
+
+    def validate(self) -> Optional[List[str]]:
+        """ Validates this command alone, prefer validate_commands for whole command lists """
+        errors = validate_commands([self])
+        if len(errors) > 0:
+            return errors
+
+    def get_error_string(self, field) -> str:
+        return f"Invalid {field} for Command {self.command}: {self.to_JSON()}"
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __hash__(self) -> int:
+        return hash((self.command,) + tuple(getattr(self, field) for field in self.__slots__))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_JSON()})"
+
+
+class AddBonusCommand(Command):
+    __slots__ = ("name", "armies", "color")
+    command = "addBonus"
+
+    def __init__(self, bonus_name: str, armies: int, color: Optional[str] = None):
+        self.name = bonus_name
+        self.armies = int(armies)
+        self.color = color
+
+
+class AddTerritoryToBonusCommand(Command):
+    __slots__ = ("id", "bonusName")
+    command = "addTerritoryToBonus"
+
+    def __init__(self, territory_id: int, bonus_name: str):
+        self.id = int(territory_id)
+        self.bonusName = bonus_name
+
+
+class UpdateBonusCommand(Command):
+    """ Changes an existing bonus, fields that are None are left as they are """
+    __slots__ = ("name", "newName", "armies", "color")
+    command = "updateBonus"
+
+    def __init__(self, bonus_name: str, new_name: Optional[str] = None, armies: Optional[int] = None, color: Optional[str] = None):
+        self.name = bonus_name
+        self.newName = new_name
+        self.armies = int(armies) if armies is not None else None
+        self.color = color
+
+
+class RemoveBonusCommand(Command):
+    __slots__ = ("name",)
+    command = "removeBonus"
+
+    def __init__(self, bonus_name: str):
+        self.name = bonus_name
+
+
+class RemoveTerritoryFromBonusCommand(Command):
+    __slots__ = ("id", "bonusName")
+    command = "removeTerritoryFromBonus"
+
+    def __init__(self, territory_id: int, bonus_name: str):
+        self.id = int(territory_id)
+        self.bonusName = bonus_name
+
+
+class AddTerritoryConnectionCommand(Command):
+    __slots__ = ("id1", "id2", "wrap")
+    command = "addTerritoryConnection"
+
+    def __init__(self, territory_id: int, territory_id_2: int, wrap: str = "Normal"):
+        self.id1 = int(territory_id)
+        self.id2 = int(territory_id_2)
+        self.wrap = wrap
+
+
+class RemoveTerritoryConnectionCommand(Command):
+    __slots__ = ("id1", "id2")
+    command = "removeTerritoryConnection"
+
+    def __init__(self, territory_id: int, territory_id_2: int):
+        self.id1 = int(territory_id)
+        self.id2 = int(territory_id_2)
+
+
+class SetTerritoryNameCommand(Command):
+    __slots__ = ("id", "name")
+    command = "setTerritoryName"
+
+    def __init__(self, territory_id: int, territory_name: str):
+        self.id = int(territory_id)
+        self.name = territory_name
+
+
+class SetTerritoryCenterpointCommand(Command):
+    __slots__ = ("id", "x", "y")
+    command = "setTerritoryCenterPoint"
+
+    def __init__(self, territory_id: int, x, y):
+        self.id = int(territory_id)
+        self.x = str(x)
+        self.y = str(y)
+
+
+COMMAND_TYPES = {
+    command_type.command: command_type for command_type in (
+        AddBonusCommand, UpdateBonusCommand, RemoveBonusCommand, AddTerritoryToBonusCommand, RemoveTerritoryFromBonusCommand,
+        AddTerritoryConnectionCommand, RemoveTerritoryConnectionCommand, SetTerritoryNameCommand, SetTerritoryCenterpointCommand)
+}
+
+
+def command_from_dict(values: dict) -> Command:
+    """
+    Builds the command a json command object describes, e.g. one read back from a saved payload
+
+    Raises:
+        ValueError: for an unknown command or missing or mistyped fields
+    """
+    command_type = COMMAND_TYPES.get(values.get("command"))
+    if command_type is None:
+        raise ValueError(f'Unknown command: {values.get("command")!r}')
+    arguments = [values.get(field) for field in command_type.__slots__]
+    # trailing optional fields that are left out take the constructor's defaults
+    while arguments and arguments[-1] is None:
+        arguments.pop()
+    try:
+        return command_type(*arguments)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid fields for command {command_type.command}: {e}') from None
+
+
+class WarzoneSetDetailsPostRequestModel:
+    __slots__ = ("email", "APIToken", "mapID", "commands")
+
+    def __init__(self, email: str, APIToken: str, mapID: int, commands: Iterable[Command]):
+        self.email = email
+        self.APIToken = APIToken
+        self.mapID = int(mapID)
+        self.commands = commands
+
+    def to_JSON(self) -> str:
+        return payload_to_json(self.email, self.APIToken, self.mapID, self.commands)
+
+    def write_JSON(self, stream) -> None:
+        """
+        Streams the compact payload to a text stream one command at a time
+
+        The extensions write it to stderr, where inkex.debug used to print the same payload indented by 4
+        """
+        write_payload_json(stream, self.email, self.APIToken, self.mapID, self.commands)
+
+
+def _is_blank(value) -> bool:
+    return value is None or value == ""
+
+
+def validate_commands(commands: Iterable[Command]) -> List[str]:
+    """
+    Validates a whole command list in one pass
+
+    Returns:
+        List[str]: an error string for every invalid field, empty if all commands are valid
+    """
+    errors = []
+    for command in commands:
+        command_type = type(command)
+        if command_type is AddTerritoryToBonusCommand or command_type is RemoveTerritoryFromBonusCommand:
+            if command.id < 0:
+                errors.append(command.get_error_string("id"))
+            if _is_blank(command.bonusName):
+                errors.append(command.get_error_string("bonusName"))
+        elif command_type is AddBonusCommand or command_type is RemoveBonusCommand:
+            if _is_blank(command.name):
+                errors.append(command.get_error_string("name"))
+        elif command_type is UpdateBonusCommand:
+            if _is_blank(command.name):
+                errors.append(command.get_error_string("name"))
+            if command.newName == "":
+                errors.append(command.get_error_string("newName"))
+        elif command_type is AddTerritoryConnectionCommand:
+            if command.id1 < 0 or command.id1 == command.id2:
+                errors.append(command.get_error_string("id1"))
+            if command.id2 < 0:
+                errors.append(command.get_error_string("id2"))
+            if command.wrap not in CONNECTION_WRAPS:
+                errors.append(command.get_error_string("wrap"))
+        elif command_type is RemoveTerritoryConnectionCommand:
+            if command.id1 < 0 or command.id1 == command.id2:
+                errors.append(command.get_error_string("id1"))
+            if command.id2 < 0:
+                errors.append(command.get_error_string("id2"))
+        elif command_type is SetTerritoryNameCommand:
+            if command.id < 0:
+                errors.append(command.get_error_string("id"))
+            if _is_blank(command.name):
+                errors.append(command.get_error_string("name"))
+        elif command_type is SetTerritoryCenterpointCommand:
+            if command.id < 0:
+                errors.append(command.get_error_string("id"))
+            for field in ("x", "y"):
+                try:
+                    float(getattr(command, field))
+                except ValueError:
+                    errors.append(command.get_error_string(field))
+    return errors
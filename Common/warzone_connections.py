@@ -0,0 +1,75 @@
+###
+#   Territory Connection Index
+#
+#   A set of undirected territory connections used to de-duplicate AddTerritoryConnectionCommands.
+#
+#   Warzone connections are undirected, so (a, b) and (b, a) are the same connection.
+#   Each connection is stored as a canonical (low, high) pair packed into a single integer
+#   with the Szudzik pairing function, giving O(1) membership checks in a plain python set.
+#
+###
+
+from typing import Iterable, Iterator, Tuple
+
+
+def canonical_connection(territory_id: int, territory_id_2: int) -> Tuple[int, int]:
+    """ Returns the connection as an ordered (low, high) pair of territory ids """
+    a, b = int(territory_id), int(territory_id_2)
+    return (a, b) if a <= b else (b, a)
+
+
+def connection_key(territory_id: int, territory_id_2: int) -> int:
+    """
+    Packs an undirected connection into a unique integer
+
+    Szudzik pairing on the canonical pair: high * high + low.
+    Exact integer arithmetic, so unlike cantor pairing through float division it never collides on large ids
+    """
+    low, high = canonical_connection(territory_id, territory_id_2)
+    return high * high + low
+
+
+class ConnectionIndex:
+    """
+    Insertion ordered set of undirected territory connections
+
+    Usage:
+        connections = ConnectionIndex()
+        for territory in territories:
+            for connected_id in territory.connectedTo:
+                if connections.add(territory.id, connected_id):
+                    commands.append(AddTerritoryConnectionCommand(territory.id, connected_id))
+    """
+
+    def __init__(self, connections: Iterable[Tuple[int, int]] = ()):
+        self._keys = set()
+        self._connections = []
+        for territory_id, territory_id_2 in connections:
+            self.add(territory_id, territory_id_2)
+
+    def add(self, territory_id: int, territory_id_2: int) -> bool:
+        """
+        Adds a connection if it is not already present
+
+        Returns:
+            bool: True if the connection was new, False if it (or its reverse) had already been added
+        """
+        key = connection_key(territory_id, territory_id_2)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._connections.append(canonical_connection(territory_id, territory_id_2))
+        return True
+
+    def contains(self, territory_id: int, territory_id_2: int) -> bool:
+        return connection_key(territory_id, territory_id_2) in self._keys
+
+    def __contains__(self, connection: Tuple[int, int]) -> bool:
+        return self.contains(*connection)
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        """ Yields the canonical (low, high) connections in the order they were first added """
+        return iter(self._connections)
@@ -0,0 +1,39 @@
+###
+#   Descriptor Format
+#
+#   The key=value text the extensions store in an element's <desc> nodes to carry warzone metadata in the svg:
+#       <desc>bonus_parents=Lanternhollow Commons;Eastern Oldgate;Oldgate</desc>   on a territory
+#       <desc>bonus_value=4</desc>                                                 on a BonusLink_
+#
+#   Plain string handling only, so the tools can read descriptors without inkex.
+#
+###
+
+from typing import List, Optional, Tuple
+
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+INKSCAPE_NAMESPACE = 'http://www.inkscape.org/namespaces/inkscape'
+DESC_TAG = f'{{{SVG_NAMESPACE}}}desc'
+LABEL_ATTRIBUTE = f'{{{INKSCAPE_NAMESPACE}}}label'
+
+BONUS_PARENTS_KEY = 'bonus_parents'
+BONUS_VALUE_KEY = 'bonus_value'
+DESCRIPTOR_KEY_SEPARATOR = '='
+DESCRIPTOR_VALUE_SEPARATOR = ';'
+
+
+def parse_descriptor(text: Optional[str]) -> Optional[Tuple[str, str]]:
+    """ Splits 'key=value' into (key, value), None for text that is not a descriptor """
+    if not text or DESCRIPTOR_KEY_SEPARATOR not in text:
+        return None
+    key, value = text.split(DESCRIPTOR_KEY_SEPARATOR, 1)
+    return key.strip(), value
+
+
+def format_descriptor(key: str, value) -> str:
+    return f'{key}{DESCRIPTOR_KEY_SEPARATOR}{value}'
+
+
+def parse_bonus_names(value: str) -> List[str]:
+    """ Splits a bonus_parents value into its bonus names, dropping empty names and repeats """
+    return list(dict.fromkeys(name.strip() for name in value.split(DESCRIPTOR_VALUE_SEPARATOR) if name.strip()))
@@ -0,0 +1,385 @@
+###
+#   Polygon Geometry
+#
+#   Numpy based polygon operations on flattened territory outlines.
+#
+#   A polygon is a list of rings, each ring an (n, 2) float array of vertices without a repeated closing vertex.
+#   Rings are interpreted with the even-odd rule, the same way a territory path with holes is drawn.
+#
+#   polygon_difference works by splitting both outlines at every crossing, keeping the edges of the first polygon
+#   that lie outside the second and the edges of the second that lie inside the first, then stitching those edges
+#   back into rings. Vertices are snapped to a fixed number of decimal places so shared borders line up exactly,
+#   which keeps neighbouring territories that touch (the common case on a map) from being cut at all.
+#
+###
+
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_PRECISION = 6
+MAX_BLOCK_CELLS = 2_000_000
+
+Ring = np.ndarray
+Polygon = List[Ring]
+
+
+def normalize_ring(points, precision: int = DEFAULT_PRECISION) -> Ring:
+    """ Snaps the vertices, removes consecutive duplicates and the repeated closing vertex """
+    ring = np.round(np.asarray(points, dtype=float).reshape(-1, 2), precision)
+    if len(ring) == 0:
+        return ring
+    keep = np.ones(len(ring), dtype=bool)
+    keep[1:] = np.any(ring[1:] != ring[:-1], axis=1)
+    ring = ring[keep]
+    if len(ring) > 1 and np.all(ring[0] == ring[-1]):
+        ring = ring[:-1]
+    return ring
+
+
+def signed_area(ring: Ring) -> float:
+    """ Shoelace area, positive for counter-clockwise rings in a y-up coordinate system """
+    if len(ring) < 3:
+        return 0.0
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def polygon_area(polygon: Polygon) -> float:
+    """ Even-odd area of a polygon whose rings have been oriented with orient_polygon """
+    return sum(signed_area(ring) for ring in polygon)
+
+
+def polygon_bbox(polygon: Polygon) -> Tuple[float, float, float, float]:
+    """ Returns (min x, min y, max x, max y) """
+    points = np.concatenate(polygon)
+    minimum, maximum = points.min(axis=0), points.max(axis=0)
+    return float(minimum[0]), float(minimum[1]), float(maximum[0]), float(maximum[1])
+
+
+def bboxes_overlap(a: Sequence[float], b: Sequence[float], tolerance: float = 0.0) -> bool:
+    return a[0] <= b[2] + tolerance and b[0] <= a[2] + tolerance and a[1] <= b[3] + tolerance and b[1] <= a[3] + tolerance
+
+
+def polygon_edges(polygon: Polygon) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns the start and end points of every edge of every ring """
+    starts = np.concatenate([ring for ring in polygon if len(ring) > 1])
+    ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in polygon if len(ring) > 1])
+    return starts, ends
+
+
+def points_in_polygon(points: np.ndarray, polygon: Polygon) -> np.ndarray:
+    """ Even-odd point in polygon test for many points at once """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    inside = np.zeros(len(points), dtype=bool)
+    if len(points) == 0 or not polygon:
+        return inside
+    starts, ends = polygon_edges(polygon)
+    x1, y1 = starts[:, 0][None, :], starts[:, 1][None, :]
+    x2, y2 = ends[:, 0][None, :], ends[:, 1][None, :]
+    block = max(1, MAX_BLOCK_CELLS // len(starts))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for begin in range(0, len(points), block):
+            px = points[begin:begin + block, 0][:, None]
+            py = points[begin:begin + block, 1][:, None]
+            spans = (y1 > py) != (y2 > py)
+            crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside[begin:begin + block] = np.count_nonzero(spans & (px < crossing_x), axis=1) % 2 == 1
+    return inside
+
+
+def orient_polygon(polygon: Polygon) -> Polygon:
+    """
+    Orients rings so the filled area is always on the left of an edge
+
+    Rings nested inside an even number of other rings are made counter-clockwise, the rest (holes) clockwise
+    """
+    rings = [ring for ring in polygon if len(ring) >= 3 and signed_area(ring) != 0.0]
+    oriented = []
+    for index, ring in enumerate(rings):
+        others = rings[:index] + rings[index + 1:]
+        probe = (ring[0] + ring[1]) / 2
+        depth = sum(bool(points_in_polygon(probe, [other])[0]) for other in others)
+        is_outer = depth % 2 == 0
+        if (signed_area(ring) > 0) != is_outer:
+            ring = ring[::-1].copy()
+        oriented.append(ring)
+    return oriented
+
+
+def _cross(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def _split_parameters(
+        a_starts: np.ndarray,
+        a_ends: np.ndarray,
+        b_starts: np.ndarray,
+        b_ends: np.ndarray,
+        epsilon: float = 1e-9) -> Tuple[Dict[int, List[Tuple[float, np.ndarray]]], Dict[int, List[Tuple[float, np.ndarray]]]]:
+    """
+    Finds every point where an edge of a touches or crosses an edge of b
+
+    Returns:
+        the split points of a's and b's edges, keyed by edge index, as (parameter along the edge, point)
+    """
+    a_splits: Dict[int, List[Tuple[float, np.ndarray]]] = {}
+    b_splits: Dict[int, List[Tuple[float, np.ndarray]]] = {}
+
+    r = a_ends - a_starts
+    s = b_ends - b_starts
+    r_lengths = np.hypot(r[:, 0], r[:, 1])
+    s_lengths = np.hypot(s[:, 0], s[:, 1])
+    b_min = np.minimum(b_starts, b_ends)
+    b_max = np.maximum(b_starts, b_ends)
+
+    block = max(1, MAX_BLOCK_CELLS // max(1, len(b_starts)))
+    for begin in range(0, len(a_starts), block):
+        rows = slice(begin, begin + block)
+        a_min = np.minimum(a_starts[rows], a_ends[rows])
+        a_max = np.maximum(a_starts[rows], a_ends[rows])
+        candidates = (a_min[:, None, 0] <= b_max[None, :, 0] + epsilon) & (b_min[None, :, 0] <= a_max[:, None, 0] + epsilon) \
+            & (a_min[:, None, 1] <= b_max[None, :, 1] + epsilon) & (b_min[None, :, 1] <= a_max[:, None, 1] + epsilon)
+        a_indices, b_indices = np.nonzero(candidates)
+        if len(a_indices) == 0:
+            continue
+        a_indices = a_indices + begin
+
+        ri, si = r[a_indices], s[b_indices]
+        qp = b_starts[b_indices] - a_starts[a_indices]
+        denominator = _cross(ri, si)
+        scale = r_lengths[a_indices] * s_lengths[b_indices]
+        parallel = np.abs(denominator) <= epsilon * scale
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = _cross(qp, si) / denominator
+            u = _cross(qp, ri) / denominator
+        crossing = ~parallel & (t >= -epsilon) & (t <= 1 + epsilon) & (u >= -epsilon) & (u <= 1 + epsilon)
+        for a_index, b_index, t_value, u_value in zip(a_indices[crossing], b_indices[crossing], t[crossing], u[crossing]):
+            t_value = min(max(float(t_value), 0.0), 1.0)
+            u_value = min(max(float(u_value), 0.0), 1.0)
+            point = a_starts[a_index] + t_value * r[a_index]
+            a_splits.setdefault(int(a_index), []).append((t_value, point))
+            b_splits.setdefault(int(b_index), []).append((u_value, point))
+
+        # collinear overlaps split each edge at the other edge's end points
+        collinear = parallel & (np.abs(_cross(qp, ri)) <= epsilon * np.maximum(r_lengths[a_indices], 1.0) * np.maximum(np.hypot(qp[:, 0], qp[:, 1]), 1.0))
+        for a_index, b_index in zip(a_indices[collinear], b_indices[collinear]):
+            r_squared = float(np.dot(r[a_index], r[a_index]))
+            s_squared = float(np.dot(s[b_index], s[b_index]))
+            if r_squared == 0.0 or s_squared == 0.0:
+                continue
+            for point in (b_starts[b_index], b_ends[b_index]):
+                t_value = float(np.dot(point - a_starts[a_index], r[a_index])) / r_squared
+                if epsilon < t_value < 1 - epsilon:
+                    a_splits.setdefault(int(a_index), []).append((t_value, point))
+            for point in (a_starts[a_index], a_ends[a_index]):
+                u_value = float(np.dot(point - b_starts[b_index], s[b_index])) / s_squared
+                if epsilon < u_value < 1 - epsilon:
+                    b_splits.setdefault(int(b_index), []).append((u_value, point))
+
+    return a_splits, b_splits
+
+
+def _split_edges(starts: np.ndarray, ends: np.ndarray, splits: Dict[int, List[Tuple[float, np.ndarray]]], precision: int) -> List[Tuple[tuple, tuple]]:
+    """ Splits edges at their split points and snaps the results, dropping edges that collapse to a point """
+    edges = []
+    for index in range(len(starts)):
+        points = [starts[index]]
+        for _, point in sorted(splits.get(index, []), key=lambda split: split[0]):
+            points.append(point)
+        points.append(ends[index])
+        keys = [tuple(np.round(point, precision).tolist()) for point in points]
+        for start, end in zip(keys, keys[1:]):
+            if start != end:
+                edges.append((start, end))
+    return edges
+
+
+def _stitch_rings(edges: List[Tuple[tuple, tuple]]) -> Polygon:
+    """ Joins directed edges into closed rings, taking the sharpest right turn where several edges leave a vertex """
+    outgoing: Dict[tuple, List[int]] = {}
+    for index, (start, _) in enumerate(edges):
+        outgoing.setdefault(start, []).append(index)
+
+    used = [False] * len(edges)
+    rings = []
+    for first in range(len(edges)):
+        if used[first]:
+            continue
+        ring_start = edges[first][0]
+        ring = [ring_start]
+        current = first
+        closed = False
+        while True:
+            used[current] = True
+            start, end = edges[current]
+            if end == ring_start:
+                closed = True
+                break
+            candidates = [index for index in outgoing.get(end, []) if not used[index]]
+            if not candidates:
+                break
+            if len(candidates) > 1:
+                incoming = math.atan2(end[1] - start[1], end[0] - start[0])
+
+                def turn(index):
+                    following = edges[index][1]
+                    angle = math.atan2(following[1] - end[1], following[0] - end[0]) - incoming
+                    return (angle + math.pi) % (2 * math.pi) - math.pi
+                candidates.sort(key=turn)
+            ring.append(end)
+            current = candidates[0]
+        if closed and len(ring) >= 3:
+            rings.append(np.array(ring, dtype=float))
+    return rings
+
+
+def remove_collinear_vertices(ring: Ring, epsilon: float = 1e-9) -> Ring:
+    """ Drops vertices that lie on the straight line between their neighbours """
+    if len(ring) < 4:
+        return ring
+    previous = np.roll(ring, 1, axis=0)
+    following = np.roll(ring, -1, axis=0)
+    incoming = ring - previous
+    outgoing = following - ring
+    scale = np.hypot(incoming[:, 0], incoming[:, 1]) * np.hypot(outgoing[:, 0], outgoing[:, 1])
+    straight = (np.abs(_cross(incoming, outgoing)) <= epsilon * np.maximum(scale, epsilon)) \
+        & (np.einsum('ij,ij->i', incoming, outgoing) > 0)
+    return ring[~straight]
+
+
+def polygon_difference(subject: Polygon, clip: Polygon, precision: int = DEFAULT_PRECISION) -> Polygon:
+    """
+    Returns subject minus clip
+
+    Both polygons are lists of rings using the even-odd rule. The result rings are oriented with orient_polygon's convention.
+    If clip does not overlap subject's area (touching borders included) the subject list itself is returned,
+    so callers can tell nothing was cut with an identity check.
+    """
+    original_subject = subject
+    subject = orient_polygon([normalize_ring(ring, precision) for ring in subject])
+    clip = orient_polygon([normalize_ring(ring, precision) for ring in clip])
+    if not subject:
+        return []
+    if not clip or not bboxes_overlap(polygon_bbox(subject), polygon_bbox(clip)):
+        return original_subject
+
+    subject_starts, subject_ends = polygon_edges(subject)
+    clip_starts, clip_ends = polygon_edges(clip)
+    subject_splits, clip_splits = _split_parameters(subject_starts, subject_ends, clip_starts, clip_ends)
+    subject_edges = _split_edges(subject_starts, subject_ends, subject_splits, precision)
+    clip_edges = _split_edges(clip_starts, clip_ends, clip_splits, precision)
+
+    subject_directed = set(subject_edges)
+    clip_directed = set(clip_edges)
+
+    subject_midpoints = np.array([[(a[0] + b[0]) / 2, (a[1] + b[1]) / 2] for a, b in subject_edges]).reshape(-1, 2)
+    clip_midpoints = np.array([[(a[0] + b[0]) / 2, (a[1] + b[1]) / 2] for a, b in clip_edges]).reshape(-1, 2)
+    subject_inside_clip = points_in_polygon(subject_midpoints, clip)
+    clip_inside_subject = points_in_polygon(clip_midpoints, subject)
+
+    result_edges = []
+    for (start, end), inside in zip(subject_edges, subject_inside_clip):
+        if (start, end) in clip_directed:
+            # shared border with both interiors on the same side, that area is being removed
+            continue
+        if (end, start) in clip_directed or not inside:
+            result_edges.append((start, end))
+    is_cut = len(result_edges) != len(subject_edges)
+    for (start, end), inside in zip(clip_edges, clip_inside_subject):
+        if (start, end) in subject_directed or (end, start) in subject_directed:
+            continue
+        if inside:
+            result_edges.append((end, start))
+            is_cut = True
+
+    if not is_cut:
+        return original_subject
+
+    rings = [remove_collinear_vertices(ring) for ring in _stitch_rings(result_edges)]
+    return [ring for ring in rings if len(ring) >= 3 and abs(signed_area(ring)) > 10 ** (-2 * precision)]
+
+
+def shared_border_length(a: Polygon, b: Polygon, tolerance: float) -> float:
+    """
+    Returns the length of a's outline that runs alongside b's outline, within tolerance of it
+
+    Edges of b count where both their ends lie within tolerance of the line through an edge of a,
+    the shared length being the overlap of their projections onto that edge.
+    Corners that only touch share no length.
+    """
+    if not a or not b:
+        return 0.0
+    a_starts, a_ends = polygon_edges(a)
+    b_starts, b_ends = polygon_edges(b)
+
+    # only edges near the other outline can share a border with it
+    a_bbox, b_bbox = polygon_bbox(a), polygon_bbox(b)
+    a_near = _edges_near_bbox(a_starts, a_ends, b_bbox, tolerance)
+    b_near = _edges_near_bbox(b_starts, b_ends, a_bbox, tolerance)
+    a_starts, a_ends = a_starts[a_near], a_ends[a_near]
+    b_starts, b_ends = b_starts[b_near], b_ends[b_near]
+    directions = a_ends - a_starts
+    lengths = np.hypot(directions[:, 0], directions[:, 1])
+    keep = lengths > 0
+    a_starts, directions, lengths = a_starts[keep], directions[keep], lengths[keep]
+    if len(a_starts) == 0 or len(b_starts) == 0:
+        return 0.0
+    units = directions / lengths[:, None]
+
+    shared = 0.0
+    block = max(1, MAX_BLOCK_CELLS // len(b_starts))
+    for begin in range(0, len(a_starts), block):
+        origin = a_starts[begin:begin + block, None, :]
+        unit = units[begin:begin + block, None, :]
+        length = lengths[begin:begin + block, None]
+        to_starts = b_starts[None, :, :] - origin
+        to_ends = b_ends[None, :, :] - origin
+        near = (np.abs(_cross(unit, to_starts)) <= tolerance) & (np.abs(_cross(unit, to_ends)) <= tolerance)
+        along_starts = np.einsum('ijk,ijk->ij', to_starts, np.broadcast_to(unit, to_starts.shape))
+        along_ends = np.einsum('ijk,ijk->ij', to_ends, np.broadcast_to(unit, to_ends.shape))
+        low = np.clip(np.minimum(along_starts, along_ends), 0, length)
+        high = np.clip(np.maximum(along_starts, along_ends), 0, length)
+        overlap = np.where(near, high - low, 0.0).sum(axis=1)
+        # an edge of a cannot share more than its own length
+        shared += float(np.minimum(overlap, length[:, 0]).sum())
+    return shared
+
+
+def _edges_near_bbox(starts: np.ndarray, ends: np.ndarray, bbox: Sequence[float], tolerance: float) -> np.ndarray:
+    minimum = np.minimum(starts, ends)
+    maximum = np.maximum(starts, ends)
+    return (minimum[:, 0] <= bbox[2] + tolerance) & (maximum[:, 0] >= bbox[0] - tolerance) \
+        & (minimum[:, 1] <= bbox[3] + tolerance) & (maximum[:, 1] >= bbox[1] - tolerance)
+
+
+def signed_distances(points: np.ndarray, polygon: Polygon) -> np.ndarray:
+    """ Distance from each point to the polygon's outline, positive for points inside the polygon and negative outside """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0 or not polygon:
+        return np.full(len(points), -np.inf)
+    starts, ends = polygon_edges(polygon)
+    distances = np.empty(len(points))
+    directions = ends - starts
+    squared_lengths = np.einsum('ij,ij->i', directions, directions)
+    # zero length edges measure to their start point
+    safe_lengths = np.where(squared_lengths == 0, 1.0, squared_lengths)
+    x1, y1 = starts[:, 0][None, :], starts[:, 1][None, :]
+    x2, y2 = ends[:, 0][None, :], ends[:, 1][None, :]
+    block = max(1, MAX_BLOCK_CELLS // len(starts))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for begin in range(0, len(points), block):
+            block_points = points[begin:begin + block]
+            to_points = block_points[:, None, :] - starts[None, :, :]
+            along = np.clip(np.einsum('ijk,jk->ij', to_points, directions) / safe_lengths, 0.0, 1.0)
+            offsets = to_points - along[:, :, None] * directions[None, :, :]
+            nearest = np.sqrt(np.einsum('ijk,ijk->ij', offsets, offsets).min(axis=1))
+            # even-odd crossing count as in points_in_polygon
+            px, py = block_points[:, 0][:, None], block_points[:, 1][:, None]
+            spans = (y1 > py) != (y2 > py)
+            crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside = np.count_nonzero(spans & (px < crossing_x), axis=1) % 2 == 1
+            distances[begin:begin + block] = np.where(inside, nearest, -nearest)
+    return distances
@@ -0,0 +1,120 @@
+###
+#   Inkscape Version Probe
+#
+#   Finds the version of the inkscape the extensions run against without spawning inkscape --version every run.
+#
+#   The version is cached on disk, keyed by the inkscape executable's path, modification time and size,
+#   so it is only probed again when inkscape is installed, upgraded or moved. Within a process it is probed at most once.
+#
+#   Without an inkscape executable (e.g. the headless batch runner) the version is None.
+#
+###
+
+import json
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from inkex import command
+
+from warzone_cache import get_cache_directory, write_json_atomic
+
+Version = Tuple[int, ...]
+
+CACHE_FILE_NAME = 'inkscape_version.json'
+
+MINIMUM_SUPPORTED_VERSION: Version = (1, 2)
+
+_VERSION_PATTERN = re.compile(r'Inkscape (\d+)\.(\d+)(?:\.(\d+))?')
+
+_probed: Dict[str, Optional[Version]] = {}
+
+
+def get_cache_path() -> str:
+    """ Returns the cache file, under WARZONE_CACHE_DIR if set, otherwise the user's local cache folder """
+    return get_cache_directory(CACHE_FILE_NAME)
+
+
+def find_inkscape_executable() -> Optional[str]:
+    """ Returns the full path of the inkscape executable inkex would call, or None if there is none """
+    try:
+        return os.path.realpath(command.which(command.INKSCAPE_EXECUTABLE_NAME))
+    except command.CommandNotFound:
+        return None
+
+
+def parse_inkscape_version(output: str) -> Optional[Version]:
+    """ Parses the output of inkscape --version, e.g. 'Inkscape 1.3.2 (091e20e, 2023-11-25)' gives (1, 3, 2) """
+    match = _VERSION_PATTERN.search(output)
+    if match is None:
+        return None
+    return tuple(int(part) for part in match.groups() if part is not None)
+
+
+def _cache_key(executable: str) -> str:
+    stat = os.stat(executable)
+    return f'{executable}|{stat.st_mtime_ns}|{stat.st_size}'
+
+
+def _read_cache(cache_path: str) -> Dict[str, list]:
+    try:
+        with open(cache_path, encoding='utf-8') as stream:
+            cache = json.load(stream)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path: str, cache: Dict[str, list]) -> None:
+    # a failed write only costs a probe next time, so never fail the extension over it
+    try:
+        write_json_atomic(cache_path, cache)
+    except OSError:
+        pass
+
+
+def _probe(executable: str) -> Optional[Version]:
+    os.environ["SELF_CALL"] = "true"  # needed for version 1.3 and 1.3.1
+    output = command.call(executable, '--version')
+    if isinstance(output, bytes):  # needed prior to 1.1
+        output = output.decode("utf-8")
+    return parse_inkscape_version(output)
+
+
+def get_inkscape_version_info(refresh: bool = False) -> Optional[Version]:
+    """
+    Retrieves the version of the inkscape the extensions are run against, e.g. (1, 3, 2)
+
+    Args:
+        refresh: ignore the cached version and probe inkscape again
+
+    Returns:
+        the version, or None if inkscape cannot be found or reports no version
+    """
+    executable = find_inkscape_executable()
+    if executable is None:
+        return None
+    if not refresh and executable in _probed:
+        return _probed[executable]
+
+    cache_path = get_cache_path()
+    cache = _read_cache(cache_path)
+    key = _cache_key(executable)
+    if not refresh and key in cache:
+        version = tuple(cache[key]) if cache[key] is not None else None
+    else:
+        version = _probe(executable)
+        # drop entries for older installs of the same executable
+        cache = {cached_key: value for cached_key, value in cache.items() if not cached_key.startswith(f'{executable}|')}
+        cache[key] = list(version) if version is not None else None
+        _write_cache(cache_path, cache)
+
+    _probed[executable] = version
+    return version
+
+
+def is_supported_inkscape_version(minimum: Version = MINIMUM_SUPPORTED_VERSION) -> bool:
+    """ True if the installed inkscape is at least the given version, or if no inkscape is installed (headless runs) """
+    version = get_inkscape_version_info()
+    return version is None or version >= minimum
+
@@ -0,0 +1,80 @@
+###
+#   Streaming Command Serializer
+#
+#   Writes SetMapDetails payloads as compact json one command at a time,
+#   instead of building the whole pretty printed payload as one string with json.dumps.
+#
+#   Works with any text stream that has a write method (files, sys.stderr for inkex.debug style output,
+#   socket.makefile('w')) and can also yield utf-8 byte batches for http request bodies.
+#
+###
+
+import json
+from typing import Iterable, Iterator, TextIO
+
+DEFAULT_BATCH_SIZE = 256
+
+_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def command_to_dict(command) -> dict:
+    """ Returns the json serializable fields of a command, a dict or a class instance """
+    if isinstance(command, dict):
+        return command
+    to_dict = getattr(command, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    return command.__dict__
+
+
+def encode_command(command) -> str:
+    """ Encodes a single command as compact json """
+    return _encoder.encode(command_to_dict(command))
+
+
+def iter_commands_json(commands: Iterable, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+    """
+    Yields the comma separated json of the commands in batches of batch_size commands
+
+    Commands can be any iterable, including generators, so the full command list never has to exist at once
+    """
+    batch = []
+    first = True
+    for command in commands:
+        if first:
+            first = False
+        else:
+            batch.append(',')
+        batch.append(encode_command(command))
+        if len(batch) >= batch_size * 2:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def iter_payload_json(email: str, APIToken: str, mapID: int, commands: Iterable, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+    """ Yields the full SetMapDetails payload as compact json fragments """
+    yield f'{{"email":{_encoder.encode(email)},"APIToken":{_encoder.encode(APIToken)},"mapID":{int(mapID)},"commands":['
+    yield from iter_commands_json(commands, batch_size)
+    yield ']}'
+
+
+def iter_payload_bytes(email: str, APIToken: str, mapID: int, commands: Iterable, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+    """ Yields the full SetMapDetails payload as utf-8 encoded batches, suitable for http bodies and sockets """
+    for fragment in iter_payload_json(email, APIToken, mapID, commands, batch_size):
+        yield fragment.encode('utf-8')
+
+
+def write_payload_json(stream: TextIO, email: str, APIToken: str, mapID: int, commands: Iterable, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+    """ Streams the full SetMapDetails payload to a text stream """
+    for fragment in iter_payload_json(email, APIToken, mapID, commands, batch_size):
+        stream.write(fragment)
+
+
+def payload_to_json(email: str, APIToken: str, mapID: int, commands: Iterable) -> str:
+    return ''.join(iter_payload_json(email, APIToken, mapID, commands))
+
+
+def payload_to_bytes(email: str, APIToken: str, mapID: int, commands: Iterable) -> bytes:
+    return b''.join(iter_payload_bytes(email, APIToken, mapID, commands))
@@ -0,0 +1,181 @@
+###
+#   Map Compiler
+#
+#   Compiles the warzone metadata stored in a map svg into the SetMapDetails commands that upload it:
+#       BonusLink_ elements     their inkscape:label is the bonus name, their bonus_value descriptor the armies
+#                               and their fill colour the bonus colour      -> addBonus
+#       Territory_ elements     their bonus_parents descriptor lists the bonuses they belong to -> addTerritoryToBonus
+#                               optionally their inkscape:label is the territory name           -> setTerritoryName
+#
+#   The document is walked once, collecting bonuses and memberships into ordered dicts, which also drops repeats.
+#   Commands are then generated in upload order, every addBonus before the addTerritoryToBonus commands referencing it.
+#
+#   Problems that would make the upload wrong (a bonus without a BonusLink_, a missing bonus value, two BonusLink_
+#   elements with the same name and different values) are collected as errors instead of stopping at the first one,
+#   so a map maker can fix them all in one go. Works on stdlib ElementTree, lxml and inkex trees alike,
+#   and on svg files streamed by warzone_svg_scanner without building their tree.
+#
+###
+
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from warzone_commands import AddBonusCommand, AddTerritoryToBonusCommand, Command, SetTerritoryNameCommand, validate_commands
+from warzone_descriptors import BONUS_PARENTS_KEY, BONUS_VALUE_KEY
+from warzone_svg_index import BONUS_PREFIX, TERRITORY_PREFIX
+from warzone_svg_scanner import ScannedElement, scan_svg, scan_tree
+
+_FILL_COLOUR = re.compile(r'(?:^|;)\s*fill\s*:\s*(#[0-9a-fA-F]{6})\s*(?:;|$)')
+
+
+class CompiledBonus(NamedTuple):
+    name: str
+    armies: Optional[int]
+    color: Optional[str]
+    element_id: Optional[str]
+
+
+def get_fill_colour(element) -> Optional[str]:
+    """ Returns the element's #rrggbb fill from its style or fill attribute, None for anything else """
+    match = _FILL_COLOUR.search(element.get('style') or '')
+    if match:
+        return match.group(1).lower()
+    fill = element.get('fill') or ''
+    return fill.lower() if _FILL_COLOUR.fullmatch(f'fill:{fill}') else None
+
+
+def parse_territory_id(element_id: str) -> Optional[int]:
+    """ Returns N for Territory_N, None for anything else """
+    if not element_id.startswith(TERRITORY_PREFIX):
+        return None
+    suffix = element_id[len(TERRITORY_PREFIX):]
+    return int(suffix) if suffix.isdigit() else None
+
+
+class MapCompilation:
+    """
+    The bonuses, memberships and territory names of a map svg, and the problems found collecting them
+
+    Usage:
+        compilation = compile_map_file('Luthadel.svg')
+        if not compilation.errors:
+            UploadMap(email, token, map_id, list(compilation.commands()))
+    """
+
+    def __init__(self):
+        self.bonuses: Dict[str, CompiledBonus] = {}
+        # bonus name -> territory ids, dicts used as ordered sets
+        self.members: Dict[str, Dict[int, None]] = {}
+        self.territory_names: Dict[int, str] = {}
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self._value_problems: Dict[str, str] = {}
+
+    def commands(self) -> Iterator[Command]:
+        """ Yields the commands in upload order, leaving out memberships of bonuses that could not be compiled """
+        for bonus in self.bonuses.values():
+            if bonus.armies is not None:
+                yield AddBonusCommand(bonus.name, bonus.armies, bonus.color)
+        for bonus_name, territory_ids in self.members.items():
+            bonus = self.bonuses.get(bonus_name)
+            if bonus is None or bonus.armies is None:
+                continue
+            for territory_id in territory_ids:
+                yield AddTerritoryToBonusCommand(territory_id, bonus_name)
+        for territory_id, territory_name in self.territory_names.items():
+            yield SetTerritoryNameCommand(territory_id, territory_name)
+
+    def membership_count(self) -> int:
+        return sum(len(territory_ids) for territory_ids in self.members.values())
+
+    def _add_bonus_link(self, element, element_id: str, bonus_value: Optional[str]) -> None:
+        bonus_name = (element.label or '').strip()
+        if not bonus_name:
+            self.warnings.append(f'{element_id} has no label to use as its bonus name, skipped')
+            return
+        armies = None
+        if bonus_value is None:
+            self._value_problems[bonus_name] = f'{element_id} ({bonus_name}) has no {BONUS_VALUE_KEY} descriptor'
+        else:
+            try:
+                armies = int(bonus_value.strip())
+            except ValueError:
+                self._value_problems[bonus_name] = f'{element_id} ({bonus_name}) has a non integer {BONUS_VALUE_KEY}: {bonus_value!r}'
+        bonus = CompiledBonus(bonus_name, armies, get_fill_colour(element), element_id)
+
+        existing = self.bonuses.get(bonus_name)
+        if existing is None or existing.armies is None:
+            self.bonuses[bonus_name] = bonus
+        elif bonus.armies is not None and bonus.armies != existing.armies:
+            self.errors.append(
+                f'{element_id} and {existing.element_id} are both bonus {bonus_name!r} '
+                f'with different values ({bonus.armies} and {existing.armies})')
+
+    def _add_members(self, element_id: str, bonus_names: List[str]) -> None:
+        territory_id = parse_territory_id(element_id)
+        if territory_id is None:
+            self.warnings.append(f'{element_id or "An element without an id"} has {BONUS_PARENTS_KEY} but is not a territory, skipped')
+            return
+        for bonus_name in bonus_names:
+            self.members.setdefault(bonus_name, {})[territory_id] = None
+
+    def _check_references(self, default_bonus_value: Optional[int]) -> None:
+        for bonus_name in self.members:
+            if bonus_name in self.bonuses:
+                continue
+            if default_bonus_value is None:
+                self.errors.append(f'Bonus {bonus_name!r} has territories but no {BONUS_PREFIX} element')
+            else:
+                self.bonuses[bonus_name] = CompiledBonus(bonus_name, default_bonus_value, None, None)
+                self.warnings.append(f'Bonus {bonus_name!r} has no {BONUS_PREFIX} element, using value {default_bonus_value}')
+        for bonus in self.bonuses.values():
+            # a BonusLink_ without a value is only a problem if territories were added to it
+            if bonus.armies is None and bonus.name in self.members:
+                self.errors.append(self._value_problems[bonus.name])
+            elif bonus.armies is None:
+                self.warnings.append(f'{self._value_problems[bonus.name]}, skipped as it has no territories')
+            elif bonus.name not in self.members:
+                self.warnings.append(f'Bonus {bonus.name!r} ({bonus.element_id}) has no territories')
+
+
+def compile_elements(elements: Iterable[ScannedElement], territory_names: bool = False, default_bonus_value: Optional[int] = None) -> MapCompilation:
+    """
+    Compiles the bonuses and memberships of a map from its scanned elements in one pass
+
+    Args:
+        elements: the document's elements, from scan_svg or scan_tree
+        territory_names: also compile Territory_ labels into setTerritoryName commands
+        default_bonus_value: value for bonuses that have territories but no BonusLink_, which are errors if None
+
+    Returns:
+        MapCompilation: its errors also include validate_commands' errors for the compiled commands
+    """
+    compilation = MapCompilation()
+    for element in elements:
+        element_id = element.element_id or ''
+        if element_id.startswith(BONUS_PREFIX):
+            compilation._add_bonus_link(element, element_id, element.get_descriptor(BONUS_VALUE_KEY))
+        elif territory_names and element_id.startswith(TERRITORY_PREFIX):
+            territory_id = parse_territory_id(element_id)
+            label = (element.label or '').strip()
+            # unnamed territories keep their id as their label
+            if territory_id is not None and label and label != element_id:
+                compilation.territory_names[territory_id] = label
+        # several bonus_parents descriptors on one element are merged, as BonusMembership does
+        bonus_names = element.get_bonus_names()
+        if bonus_names:
+            compilation._add_members(element_id, bonus_names)
+
+    compilation._check_references(default_bonus_value)
+    compilation.errors.extend(validate_commands(compilation.commands()))
+    return compilation
+
+
+def compile_map(root, territory_names: bool = False, default_bonus_value: Optional[int] = None) -> MapCompilation:
+    """ Compiles a document that is already loaded, an ElementTree, lxml or inkex svg root, see compile_elements """
+    return compile_elements(scan_tree(root), territory_names, default_bonus_value)
+
+
+def compile_map_file(svg_path: str, territory_names: bool = False, default_bonus_value: Optional[int] = None) -> MapCompilation:
+    """ Streams the svg without building its tree and compiles it, see compile_elements """
+    return compile_elements(scan_svg(svg_path), territory_names, default_bonus_value)
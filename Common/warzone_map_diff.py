@@ -0,0 +1,283 @@
+###
+#   Map Diff
+#
+#   Works out the fewest SetMapDetails commands that turn the current state of a map into the desired one,
+#   so re-uploading a map after a small change sends a payload the size of the change rather than the size of the map.
+#
+#   The current state is either the snapshot saved after the last successful upload to the map,
+#   or the map of a GameFeed response for a game on it (what the Download Map Details page saves).
+#   The desired state is folded from the full command list the tools already generate.
+#
+#   A state only describes the sections it has commands for, e.g. a map compiled from svg metadata has no
+#   connections, so only the sections of the desired state are compared and everything else on the map is left alone.
+#   A bonus that was removed while another with exactly the same territories was added is renamed with updateBonus
+#   instead of being removed and rebuilt territory by territory.
+#
+###
+
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from warzone_cache import get_cache_directory, write_json_atomic
+from warzone_commands import (
+    AddBonusCommand, AddTerritoryConnectionCommand, AddTerritoryToBonusCommand, Command, RemoveBonusCommand,
+    RemoveTerritoryConnectionCommand, RemoveTerritoryFromBonusCommand, SetTerritoryCenterpointCommand,
+    SetTerritoryNameCommand, UpdateBonusCommand)
+
+SECTION_BONUSES = 'bonuses'
+SECTION_BONUS_COLORS = 'bonus_colors'
+SECTION_CONNECTIONS = 'connections'
+SECTION_NAMES = 'names'
+SECTION_CENTERPOINTS = 'centerpoints'
+
+# centerpoints closer than this are the same, they are uploaded rounded to 2 decimals
+CENTERPOINT_TOLERANCE = 0.01
+
+SNAPSHOT_DIRECTORY_NAME = 'map_snapshots'
+SNAPSHOT_VERSION = 1
+
+Connection = Tuple[int, int]
+
+
+def _connection_key(territory_id: int, territory_id_2: int) -> Connection:
+    return (territory_id, territory_id_2) if territory_id <= territory_id_2 else (territory_id_2, territory_id)
+
+
+class MapState:
+    """
+    The bonuses, memberships, connections, names and centerpoints of a map
+
+    Usage:
+        desired = MapState.from_commands(commands)
+        delta = diff_map_states(load_snapshot(map_id), desired)
+    """
+
+    def __init__(self):
+        # bonus name -> (armies, color)
+        self.bonuses: Dict[str, Tuple[int, Optional[str]]] = {}
+        # bonus name -> territory ids, dicts used as ordered sets
+        self.members: Dict[str, Dict[int, None]] = {}
+        # (lower id, higher id) -> wrap
+        self.connections: Dict[Connection, str] = {}
+        self.names: Dict[int, str] = {}
+        self.centerpoints: Dict[int, Tuple[float, float]] = {}
+        self.sections: Set[str] = set()
+
+    @classmethod
+    def from_commands(cls, commands: Iterable[Command]) -> 'MapState':
+        state = cls()
+        state.apply(commands)
+        return state
+
+    @classmethod
+    def from_game_feed(cls, map_json: dict) -> 'MapState':
+        """ Builds the state of a GameFeed map, or a whole GameFeed response. Bonus colours are not part of it """
+        map_json = map_json.get("map", map_json)
+        state = cls()
+        state.sections.update((SECTION_BONUSES, SECTION_CONNECTIONS, SECTION_NAMES, SECTION_CENTERPOINTS))
+        for bonus in map_json.get("bonuses", []):
+            state.bonuses[bonus["name"]] = (int(bonus["value"]), None)
+            state.members[bonus["name"]] = dict.fromkeys(int(territory_id) for territory_id in bonus["territoryIDs"])
+        for territory in map_json.get("territories", []):
+            territory_id = int(territory["id"])
+            state.names[territory_id] = territory["name"]
+            x, y = territory["coords"].split(",")
+            state.centerpoints[territory_id] = (float(x), float(y))
+            for connected_id in territory["connectedTo"]:
+                state.connections.setdefault(_connection_key(territory_id, int(connected_id)), "Normal")
+        return state
+
+    def apply(self, commands: Iterable[Command]) -> None:
+        """ Folds the commands into the state, in order, marking the sections they touch """
+        for command in commands:
+            command_type = type(command)
+            if command_type is AddTerritoryToBonusCommand:
+                self.members.setdefault(command.bonusName, {})[command.id] = None
+                self.sections.add(SECTION_BONUSES)
+            elif command_type is AddBonusCommand:
+                self.bonuses[command.name] = (command.armies, command.color)
+                self.members.setdefault(command.name, {})
+                self.sections.add(SECTION_BONUSES)
+                if command.color is not None:
+                    self.sections.add(SECTION_BONUS_COLORS)
+            elif command_type is AddTerritoryConnectionCommand:
+                self.connections[_connection_key(command.id1, command.id2)] = command.wrap
+                self.sections.add(SECTION_CONNECTIONS)
+            elif command_type is SetTerritoryNameCommand:
+                self.names[command.id] = command.name
+                self.sections.add(SECTION_NAMES)
+            elif command_type is SetTerritoryCenterpointCommand:
+                self.centerpoints[command.id] = (float(command.x), float(command.y))
+                self.sections.add(SECTION_CENTERPOINTS)
+            elif command_type is UpdateBonusCommand:
+                armies, color = self.bonuses.pop(command.name, (0, None))
+                members = self.members.pop(command.name, {})
+                name = command.newName if command.newName is not None else command.name
+                self.bonuses[name] = (
+                    command.armies if command.armies is not None else armies,
+                    command.color if command.color is not None else color)
+                self.members[name] = members
+            elif command_type is RemoveBonusCommand:
+                self.bonuses.pop(command.name, None)
+                self.members.pop(command.name, None)
+            elif command_type is RemoveTerritoryFromBonusCommand:
+                self.members.get(command.bonusName, {}).pop(command.id, None)
+            elif command_type is RemoveTerritoryConnectionCommand:
+                self.connections.pop(_connection_key(command.id1, command.id2), None)
+
+    def merged(self, other: 'MapState') -> 'MapState':
+        """ Returns this state with the sections other describes replaced by other's """
+        state = MapState()
+        for source, sections in ((self, self.sections - other.sections), (other, other.sections)):
+            if SECTION_BONUSES in sections:
+                state.bonuses = dict(source.bonuses)
+                state.members = {name: dict(members) for name, members in source.members.items()}
+            if SECTION_CONNECTIONS in sections:
+                state.connections = dict(source.connections)
+            if SECTION_NAMES in sections:
+                state.names = dict(source.names)
+            if SECTION_CENTERPOINTS in sections:
+                state.centerpoints = dict(source.centerpoints)
+        state.sections = self.sections | other.sections
+        if SECTION_BONUSES in other.sections and SECTION_BONUS_COLORS not in other.sections:
+            state.sections.discard(SECTION_BONUS_COLORS)
+        return state
+
+    def to_dict(self) -> dict:
+        return {
+            "version": SNAPSHOT_VERSION,
+            "sections": sorted(self.sections),
+            "bonuses": [[name, armies, color, list(self.members.get(name, ()))] for name, (armies, color) in self.bonuses.items()],
+            "connections": [[id1, id2, wrap] for (id1, id2), wrap in self.connections.items()],
+            "names": [[territory_id, name] for territory_id, name in self.names.items()],
+            "centerpoints": [[territory_id, x, y] for territory_id, (x, y) in self.centerpoints.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'MapState':
+        if values.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported map snapshot version {values.get("version")}')
+        state = cls()
+        state.sections = set(values["sections"])
+        for name, armies, color, territory_ids in values["bonuses"]:
+            state.bonuses[name] = (armies, color)
+            state.members[name] = dict.fromkeys(territory_ids)
+        state.connections = {(id1, id2): wrap for id1, id2, wrap in values["connections"]}
+        state.names = {territory_id: name for territory_id, name in values["names"]}
+        state.centerpoints = {territory_id: (x, y) for territory_id, x, y in values["centerpoints"]}
+        return state
+
+
+def _diff_bonuses(current: MapState, desired: MapState, compare_colors: bool) -> List[Command]:
+    removed = [name for name in current.bonuses if name not in desired.bonuses]
+    added = [name for name in desired.bonuses if name not in current.bonuses]
+
+    # a removed and an added bonus with the same territories is a rename
+    removed_by_members: Dict[frozenset, List[str]] = {}
+    for name in removed:
+        members = frozenset(current.members.get(name, ()))
+        if members:
+            removed_by_members.setdefault(members, []).append(name)
+    renames: Dict[str, str] = {}
+    for name in added:
+        candidates = removed_by_members.get(frozenset(desired.members.get(name, ())))
+        if candidates:
+            renames[name] = candidates.pop(0)
+    renamed = set(renames.values())
+
+    leaving, removals, updates, additions, joining = [], [], [], [], []
+    for name in removed:
+        if name not in renamed:
+            removals.append(RemoveBonusCommand(name))
+
+    for name, (armies, color) in desired.bonuses.items():
+        old_name = renames.get(name, name)
+        if old_name not in current.bonuses:
+            additions.append(AddBonusCommand(name, armies, color))
+            joining.extend(AddTerritoryToBonusCommand(territory_id, name) for territory_id in desired.members.get(name, ()))
+            continue
+
+        current_armies, current_color = current.bonuses[old_name]
+        new_armies = armies if armies != current_armies else None
+        new_color = color if compare_colors and color is not None and color != current_color else None
+        if old_name != name or new_armies is not None or new_color is not None:
+            updates.append(UpdateBonusCommand(old_name, name if old_name != name else None, new_armies, new_color))
+
+        current_members = current.members.get(old_name, {})
+        desired_members = desired.members.get(name, {})
+        leaving.extend(
+            RemoveTerritoryFromBonusCommand(territory_id, old_name)
+            for territory_id in current_members if territory_id not in desired_members)
+        joining.extend(
+            AddTerritoryToBonusCommand(territory_id, name)
+            for territory_id in desired_members if territory_id not in current_members)
+
+    # territories leave bonuses before bonuses are removed or renamed, new bonuses exist before territories join them
+    return leaving + removals + updates + additions + joining
+
+
+def diff_map_states(current: MapState, desired: MapState) -> List[Command]:
+    """
+    Returns the commands that turn the current map into the desired one, for the sections the desired state describes
+
+    Args:
+        current: the map as it is now, e.g. from load_snapshot or MapState.from_game_feed
+        desired: the map as it should be, usually MapState.from_commands of a full upload
+
+    Returns:
+        List[Command]: removals, bonus updates and additions, memberships, connections, names then centerpoints
+    """
+    commands: List[Command] = []
+    if SECTION_BONUSES in desired.sections:
+        compare_colors = SECTION_BONUS_COLORS in current.sections and SECTION_BONUS_COLORS in desired.sections
+        commands.extend(_diff_bonuses(current, desired, compare_colors))
+
+    if SECTION_CONNECTIONS in desired.sections:
+        for (id1, id2), wrap in current.connections.items():
+            if desired.connections.get((id1, id2)) != wrap:
+                commands.append(RemoveTerritoryConnectionCommand(id1, id2))
+        for (id1, id2), wrap in desired.connections.items():
+            if current.connections.get((id1, id2)) != wrap:
+                commands.append(AddTerritoryConnectionCommand(id1, id2, wrap))
+
+    if SECTION_NAMES in desired.sections:
+        commands.extend(
+            SetTerritoryNameCommand(territory_id, name)
+            for territory_id, name in desired.names.items() if current.names.get(territory_id) != name)
+
+    if SECTION_CENTERPOINTS in desired.sections:
+        for territory_id, (x, y) in desired.centerpoints.items():
+            current_point = current.centerpoints.get(territory_id)
+            if current_point is None \
+                    or not math.isclose(current_point[0], x, abs_tol=CENTERPOINT_TOLERANCE) \
+                    or not math.isclose(current_point[1], y, abs_tol=CENTERPOINT_TOLERANCE):
+                commands.append(SetTerritoryCenterpointCommand(territory_id, x, y))
+    return commands
+
+
+def get_snapshot_path(map_id: int) -> str:
+    return get_cache_directory(SNAPSHOT_DIRECTORY_NAME, f'{int(map_id)}.json')
+
+
+def load_snapshot(map_id: int) -> Optional[MapState]:
+    """ Returns the state saved after the last successful upload to the map, None if there is none or it is unreadable """
+    path = get_snapshot_path(map_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as stream:
+            return MapState.from_dict(json.load(stream))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_snapshot(map_id: int, state: MapState) -> None:
+    write_json_atomic(get_snapshot_path(map_id), state.to_dict())
+
+
+def remove_snapshot(map_id: int) -> None:
+    path = get_snapshot_path(map_id)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,355 @@
+###
+#   Binary Map Model
+#
+#   A compact columnar file of the territories, bonuses and connections of a map (what the GameFeed api returns for it),
+#   opened with numpy.memmap instead of parsed, so even a huge map is ready as soon as the file is mapped
+#   and every process opening the same file shares the operating system's one copy of it.
+#
+#   Layout: the magic, a little endian uint32 format version and uint32 header length, then a small json header
+#   giving the map id and name and the dtype, shape and offset of every array. Each array starts on a 64 byte boundary.
+#       territory_ids               int32 (n,)       sorted, a territory is referred to by its index in here
+#       territory_centers           float64 (n, 2)
+#       territory_name_offsets      int64 (n + 1,)   utf-8 name of territory i is territory_names[offsets[i]:offsets[i + 1]]
+#       territory_names             uint8
+#       adjacency_offsets           int64 (n + 1,)   CSR adjacency, the neighbours of territory i are
+#       adjacency                   int32            adjacency[offsets[i]:offsets[i + 1]], sorted territory indices
+#       bonus_ids, bonus_values     int32 (b,)
+#       bonus_name_offsets          int64 (b + 1,)
+#       bonus_names                 uint8
+#       bonus_member_offsets        int64 (b + 1,)   the territories of bonus j are
+#       bonus_members               int32            bonus_members[offsets[j]:offsets[j + 1]], territory indices
+#
+#   Connections are stored in both directions. Connection wraps and bonus colours are not part of the model,
+#   as they are not part of a GameFeed map.
+#
+###
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from warzone_map_diff import MapState
+
+MAP_MODEL_EXTENSION = '.wzmap'
+MAP_MODEL_MAGIC = b'WZMAP\x00\r\n'
+MAP_MODEL_VERSION = 1
+ARRAY_ALIGNMENT = 64
+
+_PREAMBLE_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('header_length', '<u4')])
+
+# name -> dtype, in file order
+ARRAY_LAYOUT: Dict[str, str] = {
+    'territory_ids': '<i4',
+    'territory_centers': '<f8',
+    'territory_name_offsets': '<i8',
+    'territory_names': 'u1',
+    'adjacency_offsets': '<i8',
+    'adjacency': '<i4',
+    'bonus_ids': '<i4',
+    'bonus_values': '<i4',
+    'bonus_name_offsets': '<i8',
+    'bonus_names': 'u1',
+    'bonus_member_offsets': '<i8',
+    'bonus_members': '<i4',
+}
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def _encode_strings(strings: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns (offsets, utf-8 bytes) of the strings laid end to end """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def find_indices(sorted_ids: np.ndarray, ids) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns (indices, found) of the ids in sorted_ids, indices of ids that are not found are meaningless """
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.zeros(ids.shape, dtype=np.int64), np.zeros(ids.shape, dtype=bool)
+    indices = np.searchsorted(sorted_ids, ids)
+    found = sorted_ids[np.minimum(indices, len(sorted_ids) - 1)] == ids
+    return indices, found
+
+
+def build_adjacency(territory_count: int, pairs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the CSR adjacency (offsets, neighbours) of undirected connections
+
+    Args:
+        pairs: (m, 2) territory indices, in either or both directions, connections of a territory to itself are left out
+    """
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    pairs = np.unique(np.concatenate([pairs, pairs[:, ::-1]]), axis=0)
+    offsets = np.zeros(territory_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs[:, 0], minlength=territory_count), out=offsets[1:])
+    return offsets, pairs[:, 1].astype(np.int32)
+
+
+class MapModel:
+    """
+    The territories, bonuses and connections of a map as flat arrays, see the header of this module for the layout
+
+    A model opened with load reads from the memory mapped file, and is pickled as its path so worker processes
+    map the same file rather than receiving a copy of the arrays.
+
+    Usage:
+        MapModel.from_game_feed(mapJson).save('123456_map.wzmap')
+        model = MapModel.load('123456_map.wzmap')
+        neighbour_ids = model.territory_ids[model.neighbours(model.index_of(12))]
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], map_id: Optional[int] = None, map_name: Optional[str] = None, path: Optional[str] = None):
+        missing = set(ARRAY_LAYOUT) - set(arrays)
+        if missing:
+            raise ValueError(f'Map model is missing the arrays {", ".join(sorted(missing))}')
+        self.map_id = map_id
+        self.map_name = map_name
+        self.path = path
+        self.territory_ids: np.ndarray = arrays['territory_ids']
+        self.territory_centers: np.ndarray = arrays['territory_centers']
+        self.territory_name_offsets: np.ndarray = arrays['territory_name_offsets']
+        self.territory_names: np.ndarray = arrays['territory_names']
+        self.adjacency_offsets: np.ndarray = arrays['adjacency_offsets']
+        self.adjacency: np.ndarray = arrays['adjacency']
+        self.bonus_ids: np.ndarray = arrays['bonus_ids']
+        self.bonus_values: np.ndarray = arrays['bonus_values']
+        self.bonus_name_offsets: np.ndarray = arrays['bonus_name_offsets']
+        self.bonus_names: np.ndarray = arrays['bonus_names']
+        self.bonus_member_offsets: np.ndarray = arrays['bonus_member_offsets']
+        self.bonus_members: np.ndarray = arrays['bonus_members']
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in ARRAY_LAYOUT}
+
+    @property
+    def territory_count(self) -> int:
+        return len(self.territory_ids)
+
+    @property
+    def bonus_count(self) -> int:
+        return len(self.bonus_ids)
+
+    @classmethod
+    def from_columns(
+            cls,
+            territories: Sequence[Tuple[int, str, float, float]],
+            connections: Iterable[Tuple[int, int]],
+            bonuses: Sequence[Tuple[int, str, int, Sequence[int]]],
+            map_id: Optional[int] = None,
+            map_name: Optional[str] = None) -> 'MapModel':
+        """
+        Builds a model from plain values
+
+        Args:
+            territories: (territory id, name, center x, center y)
+            connections: (territory id, territory id) pairs, in either or both directions
+            bonuses: (bonus id, name, armies, territory ids)
+
+        Raises:
+            ValueError: a connection or bonus refers to a territory that is not in territories
+        """
+        territories = sorted(territories, key=lambda territory: territory[0])
+        territory_ids = np.array([territory[0] for territory in territories], dtype=np.int32)
+        if len(territory_ids) > 1 and np.any(territory_ids[1:] == territory_ids[:-1]):
+            raise ValueError('Map has repeated territory ids')
+        centers = np.array([territory[2:4] for territory in territories], dtype=np.float64).reshape(-1, 2)
+        name_offsets, names = _encode_strings(territory[1] for territory in territories)
+
+        def to_indices(ids, what: str) -> np.ndarray:
+            ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+            indices, found = find_indices(territory_ids, ids)
+            if not np.all(found):
+                raise ValueError(f'{what} refers to territory {int(ids[np.argmin(found)])} which the map does not have')
+            return indices
+
+        pairs = to_indices([territory_id for pair in connections for territory_id in pair], 'A connection')
+        adjacency_offsets, adjacency = build_adjacency(len(territory_ids), pairs)
+
+        bonus_name_offsets, bonus_names = _encode_strings(bonus[1] for bonus in bonuses)
+        members = [to_indices(list(dict.fromkeys(bonus[3])), f'Bonus {bonus[1]}') for bonus in bonuses]
+        member_offsets = np.zeros(len(bonuses) + 1, dtype=np.int64)
+        np.cumsum([len(indices) for indices in members], out=member_offsets[1:])
+
+        return cls({
+            'territory_ids': territory_ids,
+            'territory_centers': centers,
+            'territory_name_offsets': name_offsets,
+            'territory_names': names,
+            'adjacency_offsets': adjacency_offsets,
+            'adjacency': adjacency,
+            'bonus_ids': np.array([bonus[0] for bonus in bonuses], dtype=np.int32),
+            'bonus_values': np.array([bonus[2] for bonus in bonuses], dtype=np.int32),
+            'bonus_name_offsets': bonus_name_offsets,
+            'bonus_names': bonus_names,
+            'bonus_member_offsets': member_offsets,
+            'bonus_members': np.concatenate(members).astype(np.int32) if members else np.zeros(0, dtype=np.int32),
+        }, map_id, map_name)
+
+    @classmethod
+    def from_game_feed(cls, map_json: dict) -> 'MapModel':
+        """ Builds the model of a GameFeed map, or a whole GameFeed response """
+        map_json = map_json.get("map", map_json)
+        territories, connections = [], []
+        for territory in map_json.get("territories", []):
+            territory_id = int(territory["id"])
+            x, y = territory["coords"].split(",")
+            territories.append((territory_id, territory["name"], float(x), float(y)))
+            connections.extend((territory_id, int(connected_id)) for connected_id in territory["connectedTo"])
+        bonuses = [
+            (int(bonus["id"]), bonus["name"], int(bonus["value"]), [int(territory_id) for territory_id in bonus["territoryIDs"]])
+            for bonus in map_json.get("bonuses", [])
+        ]
+        map_id = map_json.get("id")
+        return cls.from_columns(territories, connections, bonuses, int(map_id) if map_id is not None else None, map_json.get("name"))
+
+    @classmethod
+    def from_map_state(cls, state: MapState, map_id: Optional[int] = None, map_name: Optional[str] = None) -> 'MapModel':
+        """ Builds the model of a map state, bonuses are numbered in order and territories without a centerpoint are at 0,0 """
+        territory_ids = set(state.names) | set(state.centerpoints)
+        for members in state.members.values():
+            territory_ids.update(members)
+        for connection in state.connections:
+            territory_ids.update(connection)
+        territories = [
+            (territory_id, state.names.get(territory_id, f'Territory {territory_id}'), *state.centerpoints.get(territory_id, (0.0, 0.0)))
+            for territory_id in territory_ids
+        ]
+        bonuses = [
+            (index, name, armies, list(state.members.get(name, ())))
+            for index, (name, (armies, _)) in enumerate(state.bonuses.items(), start=1)
+        ]
+        return cls.from_columns(territories, state.connections, bonuses, map_id, map_name)
+
+    def save(self, path: str) -> None:
+        """ Writes the model through a temporary file, so a crash mid-write never leaves a corrupt file """
+        arrays = self.arrays()
+        entries = {}
+        offset = 0
+        for name, array in arrays.items():
+            entries[name] = {'dtype': ARRAY_LAYOUT[name], 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.size * array.itemsize)
+        header = json.dumps({'map_id': self.map_id, 'map_name': self.map_name, 'arrays': entries}, separators=(',', ':')).encode('utf-8')
+        data_start = _align(_PREAMBLE_DTYPE.itemsize + len(header))
+        preamble = np.array([(MAP_MODEL_MAGIC, MAP_MODEL_VERSION, len(header))], dtype=_PREAMBLE_DTYPE)
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as stream:
+            stream.write(preamble.tobytes())
+            stream.write(header)
+            for name, array in arrays.items():
+                stream.seek(data_start + entries[name]['offset'])
+                stream.write(np.ascontiguousarray(array, dtype=ARRAY_LAYOUT[name]).tobytes())
+            stream.truncate(data_start + offset)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'MapModel':
+        """
+        Maps the model file read only, the arrays are views into the mapped file and nothing is read until it is used
+
+        Raises:
+            ValueError: the file is not a map model, or of a version this module cannot read
+        """
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        if len(data) < _PREAMBLE_DTYPE.itemsize:
+            raise ValueError(f'{path} is not a map model')
+        preamble = data[:_PREAMBLE_DTYPE.itemsize].view(_PREAMBLE_DTYPE)[0]
+        if bytes(preamble['magic']).ljust(len(MAP_MODEL_MAGIC), b'\x00') != MAP_MODEL_MAGIC:
+            raise ValueError(f'{path} is not a map model')
+        if preamble['version'] != MAP_MODEL_VERSION:
+            raise ValueError(f'Unsupported map model version {int(preamble["version"])}')
+        header_end = _PREAMBLE_DTYPE.itemsize + int(preamble['header_length'])
+        header = json.loads(bytes(data[_PREAMBLE_DTYPE.itemsize:header_end]).decode('utf-8'))
+        data_start = _align(header_end)
+
+        arrays = {}
+        for name, entry in header['arrays'].items():
+            dtype = np.dtype(entry['dtype'])
+            shape = tuple(entry['shape'])
+            start = data_start + entry['offset']
+            length = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            arrays[name] = data[start:start + length].view(dtype).reshape(shape)
+        return cls(arrays, header.get('map_id'), header.get('map_name'), path)
+
+    def __reduce__(self):
+        if self.path is not None:
+            return MapModel.load, (self.path,)
+        return _from_arrays, ({name: np.asarray(array) for name, array in self.arrays().items()}, self.map_id, self.map_name)
+
+    def index_of(self, territory_ids):
+        """
+        Returns the index of a territory id, or an array of indices for an array of ids
+
+        Raises:
+            KeyError: an id is not a territory of the map
+        """
+        ids = np.asarray(territory_ids, dtype=np.int64)
+        indices, found = find_indices(self.territory_ids, ids)
+        if not np.all(found):
+            raise KeyError(int(ids.reshape(-1)[np.argmin(found.reshape(-1))]))
+        return int(indices) if indices.ndim == 0 else indices
+
+    def territory_name(self, index: int) -> str:
+        return bytes(self.territory_names[self.territory_name_offsets[index]:self.territory_name_offsets[index + 1]]).decode('utf-8')
+
+    def bonus_name(self, index: int) -> str:
+        return bytes(self.bonus_names[self.bonus_name_offsets[index]:self.bonus_name_offsets[index + 1]]).decode('utf-8')
+
+    def neighbours(self, index: int) -> np.ndarray:
+        """ Returns the indices of the territories connected to territory index """
+        return self.adjacency[self.adjacency_offsets[index]:self.adjacency_offsets[index + 1]]
+
+    def bonus_territories(self, index: int) -> np.ndarray:
+        """ Returns the indices of the territories in bonus index """
+        return self.bonus_members[self.bonus_member_offsets[index]:self.bonus_member_offsets[index + 1]]
+
+    def to_game_feed(self) -> dict:
+        """ Renders the model in the shape of a GameFeed map, e.g. for ParseResponseForUploadables """
+        territory_ids: List[int] = self.territory_ids.tolist()
+        adjacency = self.adjacency.tolist()
+        adjacency_offsets = self.adjacency_offsets.tolist()
+        territories = [
+            {
+                "id": territory_id,
+                "name": self.territory_name(index),
+                "connectedTo": [territory_ids[neighbour] for neighbour in adjacency[adjacency_offsets[index]:adjacency_offsets[index + 1]]],
+                "coords": f"{x},{y}",
+            }
+            for index, (territory_id, (x, y)) in enumerate(zip(territory_ids, self.territory_centers.tolist()))
+        ]
+        bonuses = [
+            {
+                "id": bonus_id,
+                "name": self.bonus_name(index),
+                "value": value,
+                "territoryIDs": [territory_ids[member] for member in self.bonus_territories(index).tolist()],
+            }
+            for index, (bonus_id, value) in enumerate(zip(self.bonus_ids.tolist(), self.bonus_values.tolist()))
+        ]
+        return {"id": self.map_id, "name": self.map_name, "territories": territories, "bonuses": bonuses}
+
+
+def _from_arrays(arrays: Dict[str, np.ndarray], map_id: Optional[int], map_name: Optional[str]) -> MapModel:
+    return MapModel(arrays, map_id, map_name)
+
+
+def get_map_model_path(map_json_path: str) -> str:
+    """ Returns where the model of a downloaded map json is saved, e.g. 123456_map.wzmap next to 123456_map.json """
+    return os.path.splitext(map_json_path)[0] + MAP_MODEL_EXTENSION
+
+
+def load_map_json(path: str) -> dict:
+    """ Returns the GameFeed map of a downloaded map json or a map model file """
+    if path.lower().endswith(MAP_MODEL_EXTENSION):
+        return MapModel.load(path).to_game_feed()
+    with open(path, 'r', encoding='utf-8') as stream:
+        return json.load(stream)
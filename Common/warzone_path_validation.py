@@ -0,0 +1,367 @@
+###
+#   Path Validation
+#
+#   Checks the path data of every territory of a document at once, instead of one inkex path object per element:
+#       closed              every subpath ends with z or returns to where it started
+#       self intersecting   two edges of the path cross or touch, other than neighbouring edges at their shared vertex
+#       zero area           the path encloses no area
+#       duplicate vertices  vertices repeating the one before them, i.e. zero length segments
+#
+#   The path data is parsed straight into numpy arrays of vertices, curves contributing their end points
+#   (the same points as inkex's end_points), so a curved edge is checked as the straight line between its ends.
+#   Every vertex of every path then goes into one set of arrays and the checks run over all of them together.
+#   Edges are only tested against edges of the same path that overlap them along x, found by sorting once.
+#
+#   Relative path data is summed into absolute vertices, which picks up float error (a path returning to 925.79
+#   ends at 925.7900000000001), so vertices within VERTEX_TOLERANCE of each other count as the same point
+#   and a vertex within it of an edge's line counts as on that line.
+#
+#   Results are keyed by a hash of the path data and the validator version, so unchanged paths are not checked again,
+#   and PathValidator can keep them in the cache folder between runs. Changing the checks means bumping the version.
+#
+###
+
+import hashlib
+import json
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from warzone_cache import get_cache_directory, write_json_atomic
+from warzone_svg_index import TERRITORY_PREFIX
+
+PATH_VALIDATION_CACHE_FILE_NAME = 'path_validation.json'
+PATH_VALIDATION_VERSION = 2
+MAX_CACHED_PATHS = 200_000
+ZERO_AREA_EPSILON = 1e-9
+VERTEX_TOLERANCE = 1e-6
+MAX_BLOCK_PAIRS = 2_000_000
+
+_SEGMENT = re.compile(r'([MmZzLlHhVvCcSsQqTt])([^MmZzLlHhVvCcSsQqTtAa]*)')
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+# numbers taken by one command, the last two are its end point
+_COMMAND_SIZES = {'M': 2, 'L': 2, 'T': 2, 'S': 4, 'Q': 4, 'C': 6}
+
+Subpath = Tuple[np.ndarray, bool]
+
+
+class PathReport(NamedTuple):
+    closed: bool
+    self_intersecting: bool
+    zero_area: bool
+    duplicate_vertices: int
+
+    @property
+    def is_valid(self) -> bool:
+        return self.closed and not self.self_intersecting and not self.zero_area and self.duplicate_vertices == 0
+
+    def problems(self) -> List[str]:
+        problems = []
+        if not self.closed:
+            problems.append('not closed')
+        if self.self_intersecting:
+            problems.append('self intersecting')
+        if self.zero_area:
+            problems.append('zero area')
+        if self.duplicate_vertices:
+            problems.append(f'{self.duplicate_vertices} duplicate vertices')
+        return problems
+
+
+def hash_path_data(path_data: str) -> str:
+    """ The cache key of path data, results of an older validator version are not reused """
+    return hashlib.blake2b(f'{PATH_VALIDATION_VERSION}:{path_data}'.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _parse_with_inkex(path_data: str) -> List[Subpath]:
+    # arcs pack their flags without separators, leave those to inkex's full parser
+    import inkex
+
+    subpaths = []
+    points = []
+    closed = False
+    path = inkex.Path(path_data)
+    for segment, point in zip(path, path.end_points):
+        letter = segment.letter.upper()
+        if letter == 'M':
+            if points:
+                subpaths.append((np.array(points, dtype=float), closed))
+            points, closed = [], False
+        elif letter == 'Z':
+            closed = True
+            continue
+        elif closed:
+            # drawing on after a z starts a new subpath where the last one started
+            subpaths.append((np.array(points, dtype=float), closed))
+            points, closed = [points[0]], False
+        points.append((point.x, point.y))
+    if points:
+        subpaths.append((np.array(points, dtype=float), closed))
+    return subpaths
+
+
+def parse_path_data(path_data: str) -> List[Subpath]:
+    """ Returns the (vertices, ends with z) of every subpath of svg path data, curves contributing their end points """
+    if 'a' in path_data or 'A' in path_data:
+        return _parse_with_inkex(path_data)
+
+    subpaths: List[Subpath] = []
+    blocks: List[np.ndarray] = []
+    current = np.zeros(2)
+    start = current
+    closed = False
+
+    def finish():
+        if blocks:
+            subpaths.append((np.concatenate(blocks), closed))
+
+    for command, arguments in _SEGMENT.findall(path_data):
+        letter = command.upper()
+        relative = command != letter
+        if letter == 'Z':
+            closed = True
+            current = start
+            continue
+        values = np.array(_NUMBER.findall(arguments), dtype=float)
+        if len(values) == 0:
+            continue
+
+        if letter in 'HV':
+            axis = 0 if letter == 'H' else 1
+            if relative:
+                values = current[axis] + np.cumsum(values)
+            points = np.empty((len(values), 2))
+            points[:, axis] = values
+            points[:, 1 - axis] = current[1 - axis]
+        else:
+            size = _COMMAND_SIZES[letter]
+            points = values[:len(values) // size * size].reshape(-1, size)[:, -2:]
+            if len(points) == 0:
+                continue
+            if relative:
+                points = current + np.cumsum(points, axis=0)
+
+        if letter == 'M':
+            finish()
+            blocks, closed = [], False
+            start = points[0]
+        elif closed:
+            finish()
+            blocks, closed = [start[None, :]], False
+        blocks.append(points)
+        current = points[-1]
+    finish()
+    return subpaths
+
+
+def _snap_to_zero(values: np.ndarray, tolerance: np.ndarray) -> np.ndarray:
+    return np.where(np.abs(values) <= tolerance, 0.0, values)
+
+
+def _same_points(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """ Whether each pair of vertices is within VERTEX_TOLERANCE along both axes """
+    return np.all(np.abs(a - b) <= VERTEX_TOLERANCE, axis=1)
+
+
+def _segments_intersect(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray) -> np.ndarray:
+    """ Whether segments a-b and c-d cross or touch, for segments whose bounding boxes are already known to overlap """
+    ab, cd = b - a, d - c
+    # a cross product over the segment's length is the distance from its line, within VERTEX_TOLERANCE it is on the line
+    ab_tolerance = VERTEX_TOLERANCE * np.hypot(ab[:, 0], ab[:, 1])
+    cd_tolerance = VERTEX_TOLERANCE * np.hypot(cd[:, 0], cd[:, 1])
+    d1 = _snap_to_zero(ab[:, 0] * (c - a)[:, 1] - ab[:, 1] * (c - a)[:, 0], ab_tolerance)
+    d2 = _snap_to_zero(ab[:, 0] * (d - a)[:, 1] - ab[:, 1] * (d - a)[:, 0], ab_tolerance)
+    d3 = _snap_to_zero(cd[:, 0] * (a - c)[:, 1] - cd[:, 1] * (a - c)[:, 0], cd_tolerance)
+    d4 = _snap_to_zero(cd[:, 0] * (b - c)[:, 1] - cd[:, 1] * (b - c)[:, 0], cd_tolerance)
+    # collinear segments with overlapping bounding boxes overlap
+    collinear = (d1 == 0) & (d2 == 0)
+    return collinear | ((d1 * d2 <= 0) & (d3 * d4 <= 0))
+
+
+def validate_subpaths(paths: Sequence[List[Subpath]]) -> List[PathReport]:
+    """ Validates parsed paths together, see the module header for the checks """
+    path_count = len(paths)
+    rings = [(path_index, points, closed) for path_index, subpaths in enumerate(paths) for points, closed in subpaths if len(points)]
+    if not rings:
+        return [PathReport(False, False, True, 0) for _ in range(path_count)]
+
+    ring_paths = np.array([path_index for path_index, _, _ in rings])
+    ring_lengths = np.array([len(points) for _, points, _ in rings])
+    vertices = np.concatenate([points for _, points, _ in rings])
+    vertex_rings = np.repeat(np.arange(len(rings)), ring_lengths)
+    ring_starts = np.concatenate([[0], np.cumsum(ring_lengths)[:-1]])
+    ring_ends = ring_starts + ring_lengths - 1
+
+    # a subpath ending where it started is closed, its last vertex only repeats the first
+    returns = (ring_lengths > 2) & _same_points(vertices[ring_ends], vertices[ring_starts])
+    ring_closed = np.array([closed for _, _, closed in rings]) | returns
+    path_closed = np.bincount(ring_paths, minlength=path_count) > 0
+    path_closed[ring_paths[~ring_closed]] = False
+
+    keep = np.ones(len(vertices), dtype=bool)
+    keep[ring_ends[returns]] = False
+    repeats = np.zeros(len(vertices), dtype=bool)
+    repeats[1:] = _same_points(vertices[1:], vertices[:-1]) & (vertex_rings[1:] == vertex_rings[:-1])
+    repeats &= keep
+    duplicate_vertices = np.bincount(ring_paths[vertex_rings[repeats]], minlength=path_count)
+    keep &= ~repeats
+
+    # edges between the remaining vertices, closed rings wrapping back to their first vertex
+    vertices, vertex_rings = vertices[keep], vertex_rings[keep]
+    ring_lengths = np.bincount(vertex_rings, minlength=len(rings))
+    ring_starts = np.concatenate([[0], np.cumsum(ring_lengths)[:-1]])
+    positions = np.arange(len(vertices)) - ring_starts[vertex_rings]
+    is_last = positions == ring_lengths[vertex_rings] - 1
+    following = np.arange(1, len(vertices) + 1)
+    following[is_last] = ring_starts[vertex_rings[is_last]]
+    has_edge = ~is_last | (ring_closed[vertex_rings] & (ring_lengths[vertex_rings] > 2))
+    edge_starts, edge_ends = vertices[has_edge], vertices[following[has_edge]]
+    edge_rings, edge_positions = vertex_rings[has_edge], positions[has_edge]
+    edge_paths = ring_paths[edge_rings]
+
+    # shoelace area of the closed rings
+    ring_areas = np.zeros(len(rings))
+    np.add.at(ring_areas, edge_rings, edge_starts[:, 0] * edge_ends[:, 1] - edge_ends[:, 0] * edge_starts[:, 1])
+    ring_areas = np.where(ring_closed, np.abs(ring_areas) / 2, 0.0)
+    path_areas = np.bincount(ring_paths, weights=ring_areas, minlength=path_count)
+
+    self_intersecting = np.zeros(path_count, dtype=bool)
+    self_intersecting[_find_self_intersections(edge_starts, edge_ends, edge_paths, edge_rings, edge_positions, ring_lengths, ring_closed)] = True
+
+    return [
+        PathReport(bool(path_closed[index]), bool(self_intersecting[index]), bool(path_areas[index] <= ZERO_AREA_EPSILON), int(duplicate_vertices[index]))
+        for index in range(path_count)
+    ]
+
+
+def _find_self_intersections(starts, ends, edge_paths, edge_rings, edge_positions, ring_lengths, ring_closed) -> np.ndarray:
+    """ Returns the paths with two intersecting edges, comparing each edge with the later edges of its path overlapping it along x """
+    if len(starts) == 0:
+        return np.zeros(0, dtype=int)
+    minimum, maximum = np.minimum(starts, ends), np.maximum(starts, ends)
+
+    # sort by path then left edge, with each path's x range mapped into [path, path + 1) so one searchsorted finds the overlaps
+    path_count = int(edge_paths.max()) + 1
+    path_left = np.full(path_count, np.inf)
+    path_right = np.full(path_count, -np.inf)
+    np.minimum.at(path_left, edge_paths, minimum[:, 0])
+    np.maximum.at(path_right, edge_paths, maximum[:, 0])
+    span = np.maximum(path_right + VERTEX_TOLERANCE - path_left, 1e-12) * (1 + 1e-9)
+    keys = edge_paths + (minimum[:, 0] - path_left[edge_paths]) / span[edge_paths]
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    reach = edge_paths[order] + (maximum[order, 0] + VERTEX_TOLERANCE - path_left[edge_paths[order]]) / span[edge_paths[order]]
+    candidates_end = np.searchsorted(keys, reach, side='right')
+    counts = np.maximum(candidates_end - np.arange(1, len(order) + 1), 0)
+
+    found = []
+    boundaries = np.concatenate([[0], np.cumsum(counts)])
+    first = 0
+    while first < len(order):
+        # blocks of edges whose candidate pairs fit in memory
+        last = int(np.searchsorted(boundaries, boundaries[first] + MAX_BLOCK_PAIRS, side='right')) - 1
+        last = max(last, first + 1)
+        block_counts = counts[first:last]
+        total = int(block_counts.sum())
+        if total:
+            left = np.repeat(np.arange(first, last), block_counts)
+            offsets = np.arange(total) - np.repeat(boundaries[first:last] - boundaries[first], block_counts)
+            i, j = order[left], order[left + 1 + offsets]
+            overlap = (minimum[i, 1] <= maximum[j, 1] + VERTEX_TOLERANCE) & (minimum[j, 1] <= maximum[i, 1] + VERTEX_TOLERANCE)
+            i, j = i[overlap], j[overlap]
+
+            # neighbouring edges of a ring share a vertex without intersecting
+            same_ring = edge_rings[i] == edge_rings[j]
+            gap = np.abs(edge_positions[i] - edge_positions[j])
+            length = ring_lengths[edge_rings[i]]
+            neighbours = same_ring & ((gap == 1) | (ring_closed[edge_rings[i]] & (gap == length - 1)))
+            i, j = i[~neighbours], j[~neighbours]
+
+            intersecting = _segments_intersect(starts[i], ends[i], starts[j], ends[j])
+            found.append(edge_paths[i[intersecting]])
+        first = last
+    return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=int)
+
+
+def validate_path_data(path_datas: Sequence[str]) -> List[PathReport]:
+    """ Validates many paths' data in one pass """
+    return validate_subpaths([parse_path_data(path_data) for path_data in path_datas])
+
+
+def get_path_data(element) -> Optional[str]:
+    """ The path data of a path element, or of any inkex shape, None for elements without an outline """
+    path_data = element.get('d')
+    if path_data is None and hasattr(element, 'path'):
+        try:
+            path_data = str(element.path)
+        except (AttributeError, NotImplementedError, ValueError):
+            return None
+    return path_data
+
+
+class PathValidator:
+    """
+    Validates path data, remembering each result by the hash of the data it checked
+
+    Usage:
+        validator = PathValidator.load()
+        reports = validator.validate_elements(SvgIndex(self.svg).territories())
+        validator.save()
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path or get_cache_directory(PATH_VALIDATION_CACHE_FILE_NAME)
+        self.results: Dict[str, PathReport] = {}
+        self._changed = False
+
+    @classmethod
+    def load(cls, cache_path: Optional[str] = None) -> 'PathValidator':
+        """ Returns a validator holding the results saved in the cache folder, or none if they cannot be read """
+        validator = cls(cache_path)
+        try:
+            with open(validator.cache_path, encoding='utf-8') as stream:
+                validator.results = {key: PathReport(*value) for key, value in json.load(stream).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            validator.results = {}
+        return validator
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+        # dicts keep insertion order, so the oldest results are dropped first
+        results = list(self.results.items())[-MAX_CACHED_PATHS:]
+        write_json_atomic(self.cache_path, {key: list(report) for key, report in results})
+        self._changed = False
+
+    def validate(self, path_datas: Iterable[str]) -> List[PathReport]:
+        """ Returns the report of each path data, only checking data not seen before """
+        path_datas = list(path_datas)
+        keys = [hash_path_data(path_data) for path_data in path_datas]
+        unknown = {}
+        for key, path_data in zip(keys, path_datas):
+            if key not in self.results and key not in unknown:
+                unknown[key] = path_data
+        if unknown:
+            self.results.update(zip(unknown, validate_path_data(list(unknown.values()))))
+            self._changed = True
+        return [self.results[key] for key in keys]
+
+    def validate_elements(self, elements: Iterable) -> Dict[str, PathReport]:
+        """ Returns element id -> report for the elements with path data """
+        elements = [(element.get('id'), get_path_data(element)) for element in elements]
+        elements = [(element_id, path_data) for element_id, path_data in elements if path_data is not None]
+        return dict(zip([element_id for element_id, _ in elements], self.validate([path_data for _, path_data in elements])))
+
+
+def validate_territories(root, validator: Optional[PathValidator] = None) -> Dict[str, PathReport]:
+    """ Returns Territory_ id -> report for every Territory_ element of the document with path data """
+    validator = validator or PathValidator()
+    territories = [element for element in root.iter() if (element.get('id') or '').startswith(TERRITORY_PREFIX)]
+    return validator.validate_elements(territories)
+
+
+def is_closed_path(element) -> bool:
+    """ Whether every subpath of the element ends with z or returns to where it started """
+    path_data = get_path_data(element)
+    return path_data is not None and validate_path_data([path_data])[0].closed
@@ -0,0 +1,101 @@
+###
+#   Inkex Path Conversion
+#
+#   Converts inkex path elements to and from the numpy rings used by warzone_geometry.
+#
+#   Curves and arcs are flattened into line segments with inkex's bezier subdivision,
+#   flatness being the maximum distance the segments may deviate from the curve.
+#
+###
+
+from typing import List, Optional, Tuple
+
+import inkex
+import inkex.bezier
+import numpy as np
+
+from warzone_geometry import DEFAULT_PRECISION, Polygon, normalize_ring
+from warzone_svg_index import TERRITORY_PREFIX, SvgIndex
+
+DEFAULT_FLATNESS = 0.1
+
+
+def path_to_rings(path: inkex.Path, flatness: float = DEFAULT_FLATNESS, precision: int = DEFAULT_PRECISION) -> Polygon:
+    """ Flattens a path into one ring per subpath """
+    superpath = path.to_superpath()
+    inkex.bezier.cspsubdiv(superpath, flatness)
+    rings = []
+    for subpath in superpath:
+        ring = normalize_ring([node[1] for node in subpath], precision)
+        if len(ring) >= 3:
+            rings.append(ring)
+    return rings
+
+
+def element_to_rings(
+        element: inkex.ShapeElement,
+        flatness: float = DEFAULT_FLATNESS,
+        transform: Optional[inkex.Transform] = None,
+        precision: int = DEFAULT_PRECISION) -> Polygon:
+    """
+    Flattens an element's outline
+
+    Args:
+        transform: applied to the path before flattening, defaults to the element's composed transform (document coordinates)
+    """
+    if transform is None:
+        transform = element.composed_transform()
+    return path_to_rings(element.path.transform(transform), flatness, precision)
+
+
+def path_to_polylines(path: inkex.Path, flatness: float = DEFAULT_FLATNESS, precision: int = DEFAULT_PRECISION) -> List[Tuple[np.ndarray, bool]]:
+    """ Flattens a path into one (vertices, closed) polyline per subpath, closed subpaths end where they start """
+    superpath = path.to_superpath()
+    inkex.bezier.cspsubdiv(superpath, flatness)
+    polylines = []
+    for subpath in superpath:
+        points = np.round(np.array([node[1] for node in subpath], dtype=float).reshape(-1, 2), precision)
+        if len(points) == 0:
+            continue
+        closed = len(points) > 2 and bool(np.all(points[0] == points[-1]))
+        polylines.append((points, closed))
+    return polylines
+
+
+def element_to_polylines(
+        element: inkex.ShapeElement,
+        flatness: float = DEFAULT_FLATNESS,
+        transform: Optional[inkex.Transform] = None,
+        precision: int = DEFAULT_PRECISION) -> List[Tuple[np.ndarray, bool]]:
+    """ Flattens an element's line, see element_to_rings for the transform """
+    if transform is None:
+        transform = element.composed_transform()
+    return path_to_polylines(element.path.transform(transform), flatness, precision)
+
+
+def rings_to_path(rings: Polygon, precision: int = DEFAULT_PRECISION) -> inkex.Path:
+    """ Builds a closed polygonal path from rings """
+    segments: List[str] = []
+    for ring in rings:
+        points = [f'{round(float(x), precision)},{round(float(y), precision)}' for x, y in np.asarray(ring)]
+        segments.append(f'M {points[0]} L {" ".join(points[1:])} Z')
+    return inkex.Path(' '.join(segments))
+
+
+def set_element_rings(element: inkex.ShapeElement, rings: Polygon, precision: int = DEFAULT_PRECISION) -> None:
+    """ Writes document coordinate rings back to an element, undoing its composed transform """
+    element.path = rings_to_path(rings, precision).transform(-element.composed_transform())
+
+
+def get_territory_outlines(svg, flatness: float = DEFAULT_FLATNESS) -> List[Tuple[int, Polygon]]:
+    """ Flattens every Territory_ shape of the document into (territory id, outline) in document coordinates """
+    territories = []
+    for element in SvgIndex(svg).territories():
+        if not isinstance(element, inkex.ShapeElement) or isinstance(element, inkex.Group):
+            continue
+        try:
+            territory_id = int(element.get_id()[len(TERRITORY_PREFIX):])
+        except ValueError:
+            continue
+        territories.append((territory_id, element_to_rings(element, flatness)))
+    return territories
@@ -0,0 +1,101 @@
+###
+#   Bounding Box Spatial Index
+#
+#   A uniform grid over cached bounding boxes, built once per run, for finding which shapes can touch.
+#
+#   Every box is registered in each grid cell it covers. A pair of boxes is only reported from the one cell
+#   that holds the corner where their overlap starts, so pairs are never reported twice and no set of seen pairs is needed.
+#   With cells sized to the typical box, each box only meets its neighbours and finding all pairs is roughly linear.
+#
+###
+
+import math
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+BoundingBox = Tuple[float, float, float, float]
+
+
+class BoundingBoxGrid:
+    """
+    Uniform grid of (min x, min y, max x, max y) bounding boxes
+
+    Args:
+        bboxes: the boxes to index, referred to by their position in this sequence
+        tolerance: boxes closer than this count as overlapping, an absolute distance so it behaves the same for negative coordinates
+        cell_size: grid cell size, defaults to the median box size
+    """
+
+    def __init__(self, bboxes: Sequence[BoundingBox], tolerance: float = 0.0, cell_size: float = None):
+        self.tolerance = tolerance
+        self.bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        # grow every box by half the tolerance so tolerance-close boxes overlap
+        self.expanded = self.bboxes + np.array([-tolerance, -tolerance, tolerance, tolerance]) / 2
+        # plain tuples are much faster than numpy rows for the per pair checks below
+        self._boxes = [tuple(box) for box in self.expanded.tolist()]
+
+        if cell_size is None:
+            if len(self.bboxes):
+                sizes = np.concatenate([self.expanded[:, 2] - self.expanded[:, 0], self.expanded[:, 3] - self.expanded[:, 1]])
+                cell_size = float(np.median(sizes))
+            cell_size = cell_size if cell_size and cell_size > 0 else 1.0
+        self.cell_size = cell_size
+
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for index, (min_x, min_y, max_x, max_y) in enumerate(self._boxes):
+            for cell in self._cells_covering(min_x, min_y, max_x, max_y):
+                self.cells.setdefault(cell, []).append(index)
+
+    def _cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _cells_covering(self, min_x: float, min_y: float, max_x: float, max_y: float) -> Iterator[Tuple[int, int]]:
+        first_x, first_y = self._cell_of(min_x, min_y)
+        last_x, last_y = self._cell_of(max_x, max_y)
+        for cell_x in range(first_x, last_x + 1):
+            for cell_y in range(first_y, last_y + 1):
+                yield cell_x, cell_y
+
+    def _overlaps(self, a: int, b: int) -> bool:
+        box_a, box_b = self._boxes[a], self._boxes[b]
+        return box_a[0] <= box_b[2] and box_b[0] <= box_a[2] and box_a[1] <= box_b[3] and box_b[1] <= box_a[3]
+
+    def overlapping_pairs(self) -> List[Tuple[int, int]]:
+        """ Returns every (i, j) with i < j whose boxes overlap, sorted """
+        pairs = []
+        boxes = self._boxes
+        for cell, members in self.cells.items():
+            for position, a in enumerate(members):
+                for b in members[position + 1:]:
+                    if not self._overlaps(a, b):
+                        continue
+                    # only report from the cell holding the start corner of the overlap
+                    corner = self._cell_of(max(boxes[a][0], boxes[b][0]), max(boxes[a][1], boxes[b][1]))
+                    if corner == cell:
+                        pairs.append((a, b) if a < b else (b, a))
+        pairs.sort()
+        return pairs
+
+    def neighbours(self) -> List[List[int]]:
+        """ Returns, for every box, the sorted indices of the other boxes it overlaps """
+        neighbours = [[] for _ in range(len(self.bboxes))]
+        for a, b in self.overlapping_pairs():
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+        for entries in neighbours:
+            entries.sort()
+        return neighbours
+
+    def query(self, bbox: BoundingBox) -> List[int]:
+        """ Returns the indices of the boxes overlapping the given box, sorted """
+        min_x, min_y, max_x, max_y = (
+            bbox[0] - self.tolerance / 2, bbox[1] - self.tolerance / 2,
+            bbox[2] + self.tolerance / 2, bbox[3] + self.tolerance / 2)
+        found = set()
+        for cell in self._cells_covering(min_x, min_y, max_x, max_y):
+            for index in self.cells.get(cell, ()):
+                box = self._boxes[index]
+                if box[0] <= max_x and min_x <= box[2] and box[1] <= max_y and min_y <= box[3]:
+                    found.add(index)
+        return sorted(found)
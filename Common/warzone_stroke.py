@@ -0,0 +1,138 @@
+###
+#   Stroke Outlines
+#
+#   Turns stroked polylines into the area their stroke covers and cuts that area out of polygons,
+#   in process, instead of inkscape's object-stroke-to-path followed by path-difference.
+#
+#   A stroke is not built as one outline, which loops back on itself at every bend sharper than the stroke is wide.
+#   It is built as convex pieces, one per segment: the convex hull of the shapes drawn around the segment's two ends.
+#   Around a bend (and a round cap) that shape is a regular polygon circumscribing the stroke's circle, oriented the same
+#   way at every vertex, so neighbouring pieces meet exactly and together cover every point within half the width
+#   of the line, as a round join does. Butt and square caps are the two corners of the stroke's end.
+#   Cutting the union of the pieces out of a polygon is cutting the pieces out one after the other,
+#   and each polygon is only cut by the pieces whose bounding boxes reach it.
+#
+###
+
+import math
+from typing import List, Sequence
+
+import numpy as np
+
+from warzone_geometry import DEFAULT_PRECISION, Polygon, Ring, polygon_bbox, polygon_difference
+from warzone_spatial_index import BoundingBoxGrid
+
+CAP_BUTT = 'butt'
+CAP_ROUND = 'round'
+CAP_SQUARE = 'square'
+DEFAULT_JOIN_SIDES = 16
+
+
+def convex_hull(points: np.ndarray) -> Ring:
+    """ Monotone chain convex hull, counter-clockwise in a y-up coordinate system and without collinear vertices """
+    points = sorted(set(map(tuple, np.asarray(points, dtype=float).reshape(-1, 2).tolist())))
+    if len(points) < 3:
+        return np.array(points, dtype=float).reshape(-1, 2)
+
+    def half(ordered):
+        chain = []
+        for point in ordered:
+            while len(chain) >= 2 and (chain[-1][0] - chain[-2][0]) * (point[1] - chain[-2][1]) \
+                    - (chain[-1][1] - chain[-2][1]) * (point[0] - chain[-2][0]) <= 0:
+                chain.pop()
+            chain.append(point)
+        return chain
+
+    lower = half(points)
+    upper = half(reversed(points))
+    return np.array(lower[:-1] + upper[:-1], dtype=float)
+
+
+def join_polygon(radius: float, sides: int = DEFAULT_JOIN_SIDES) -> np.ndarray:
+    """ Regular polygon around the origin whose edges are all at least radius away from it """
+    circumscribed = radius / math.cos(math.pi / sides)
+    angles = np.arange(sides) * (2 * math.pi / sides)
+    return np.column_stack([np.cos(angles), np.sin(angles)]) * circumscribed
+
+
+def _cap_points(point: np.ndarray, direction: np.ndarray, radius: float, cap: str, join: np.ndarray) -> np.ndarray:
+    """ The shape drawn around an end of the line, direction pointing out of the line """
+    if cap == CAP_ROUND:
+        return point + join
+    normal = np.array([-direction[1], direction[0]]) * radius
+    if cap == CAP_SQUARE:
+        point = point + direction * radius
+    return np.array([point + normal, point - normal])
+
+
+def stroke_pieces(
+        points: np.ndarray,
+        width: float,
+        closed: bool = False,
+        cap: str = CAP_BUTT,
+        sides: int = DEFAULT_JOIN_SIDES) -> List[Ring]:
+    """
+    Returns convex rings which together cover the stroke of a polyline
+
+    Args:
+        points: (n, 2) vertices of the line
+        width: full stroke width, in the same units as the points
+        closed: the line returns to its first vertex, so it has joins instead of caps there
+        cap: butt, round or square line cap for open lines
+        sides: sides of the polygon approximating round joins and caps
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0 or width <= 0:
+        return []
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    points = points[keep]
+    if closed and len(points) > 1 and np.all(points[0] == points[-1]):
+        points = points[:-1]
+
+    radius = width / 2
+    join = join_polygon(radius, sides)
+    if len(points) == 1:
+        return [points[0] + join] if cap == CAP_ROUND else []
+
+    starts = points if closed else points[:-1]
+    ends = np.roll(points, -1, axis=0) if closed else points[1:]
+    pieces = []
+    last = len(starts) - 1
+    for index, (start, end) in enumerate(zip(starts, ends)):
+        direction = (end - start) / math.hypot(*(end - start))
+        start_shape = start + join if closed or index > 0 else _cap_points(start, -direction, radius, cap, join)
+        end_shape = end + join if closed or index < last else _cap_points(end, direction, radius, cap, join)
+        pieces.append(convex_hull(np.concatenate([start_shape, end_shape])))
+    return pieces
+
+
+def cut_pieces_out_of_polygons(
+        polygons: Sequence[Polygon],
+        pieces: Sequence[Ring],
+        precision: int = DEFAULT_PRECISION) -> List[Polygon]:
+    """
+    Returns each polygon minus the union of the pieces
+
+    A polygon no piece overlaps is returned as the same list object, so callers can tell nothing was cut with an identity check.
+    A polygon that is cut away entirely becomes an empty list.
+
+    Usage:
+        pieces = [piece for line in lines for piece in stroke_pieces(line, width)]
+        outlines = cut_pieces_out_of_polygons(outlines, pieces)
+    """
+    pieces = [piece for piece in pieces if len(piece) >= 3]
+    results = list(polygons)
+    if not pieces:
+        return results
+    grid = BoundingBoxGrid([polygon_bbox([piece]) for piece in pieces])
+    for index, polygon in enumerate(polygons):
+        if not polygon:
+            continue
+        outline = polygon
+        for piece_index in grid.query(polygon_bbox(polygon)):
+            outline = polygon_difference(outline, [pieces[piece_index]], precision)
+            if not outline:
+                break
+        results[index] = outline
+    return results
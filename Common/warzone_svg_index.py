@@ -0,0 +1,88 @@
+###
+#   Svg Document Index
+#
+#   A one pass index over an svg document so ids can be looked up without an xpath tree walk per id.
+#
+#   Holds exact id -> element, plus prefix -> elements for the warzone id prefixes
+#   (everything up to and including the first underscore, e.g. Territory_, BonusLink_, TC_).
+#
+#   Lookups are exact, so Territory_11 never matches Territory_1105 like an xpath contains() does.
+#   The index is a snapshot, call reindex after changing ids in the document.
+#
+###
+
+from typing import Dict, List, Optional
+
+TERRITORY_PREFIX = 'Territory_'
+BONUS_PREFIX = 'BonusLink_'
+PREFIX_SEPARATOR = '_'
+
+
+def get_id_prefix(element_id: str) -> Optional[str]:
+    """ Returns the warzone prefix of an id including its separator, e.g. Territory_ for Territory_12 """
+    position = element_id.find(PREFIX_SEPARATOR)
+    if position < 1:
+        return None
+    return element_id[:position + 1]
+
+
+class SvgIndex:
+    """
+    Exact id and id prefix index over an lxml/inkex element tree
+
+    Usage:
+        svg_index = SvgIndex(self.svg)
+        territory = svg_index.get('Territory_1105')
+        bonus_links = svg_index.with_prefix(BONUS_PREFIX)
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.by_id: Dict[str, object] = {}
+        self.by_prefix: Dict[str, List[object]] = {}
+        self.reindex()
+
+    def reindex(self) -> None:
+        """ Rebuilds the index with a single walk of the tree """
+        by_id = {}
+        by_prefix = {}
+        for element in self.root.iter():
+            element_id = element.get('id')
+            if element_id is None:
+                continue
+            # keep the first element like getElementById would if an id is duplicated
+            if element_id in by_id:
+                continue
+            by_id[element_id] = element
+            prefix = get_id_prefix(element_id)
+            if prefix is not None:
+                by_prefix.setdefault(prefix, []).append(element)
+        self.by_id = by_id
+        self.by_prefix = by_prefix
+
+    def get(self, element_id: str, default=None):
+        return self.by_id.get(element_id, default)
+
+    def __getitem__(self, element_id: str):
+        return self.by_id[element_id]
+
+    def __contains__(self, element_id: str) -> bool:
+        return element_id in self.by_id
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def with_prefix(self, prefix: str) -> List[object]:
+        """ Returns the elements whose id starts with the given warzone prefix, in document order """
+        if get_id_prefix(prefix) == prefix:
+            return list(self.by_prefix.get(prefix, []))
+        return [element for element_id, element in self.by_id.items() if element_id.startswith(prefix)]
+
+    def get_territory(self, territory_id: int):
+        return self.by_id.get(f'{TERRITORY_PREFIX}{territory_id}')
+
+    def territories(self) -> List[object]:
+        return self.with_prefix(TERRITORY_PREFIX)
+
+    def bonus_links(self) -> List[object]:
+        return self.with_prefix(BONUS_PREFIX)
@@ -0,0 +1,146 @@
+###
+#   Streaming Svg Scanner
+#
+#   Reads the warzone metadata of a map svg without building its element tree, for questions that only read:
+#   which Territory_ ids and labels are there, which bonuses does each territory belong to, what is the path data.
+#
+#   lxml's iterparse hands over each element once its end tag is read. Its attributes and the key=value descriptors of
+#   its <desc> children are copied into a ScannedElement, then the element is cleared and removed from its parent,
+#   so memory stays bounded by the depth of the document rather than its size.
+#   The elements come out in end tag order: children before the group holding them.
+#
+#   scan_tree produces the same records from a tree that is already loaded (inkex, lxml or ElementTree),
+#   so code written against ScannedElement works on both.
+#
+###
+
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from lxml import etree
+
+from warzone_descriptors import BONUS_PARENTS_KEY, DESC_TAG, LABEL_ATTRIBUTE, parse_bonus_names, parse_descriptor
+from warzone_svg_index import TERRITORY_PREFIX
+
+
+def get_local_name(tag: str) -> str:
+    """ Returns the tag without its namespace, e.g. path for {http://www.w3.org/2000/svg}path """
+    return tag.rsplit('}', 1)[-1]
+
+
+class ScannedElement(NamedTuple):
+    """ The attributes of an element and the descriptors of its <desc> children, read like an element with get() """
+    tag: str
+    attributes: Dict[str, str]
+    descriptors: List[Tuple[str, str]]
+
+    def get(self, name: str, default=None):
+        return self.attributes.get(name, default)
+
+    @property
+    def element_id(self) -> Optional[str]:
+        return self.attributes.get('id')
+
+    @property
+    def label(self) -> Optional[str]:
+        return self.attributes.get(LABEL_ATTRIBUTE)
+
+    @property
+    def path_data(self) -> Optional[str]:
+        return self.attributes.get('d')
+
+    def get_descriptor(self, key: str) -> Optional[str]:
+        """ Returns the value of the first descriptor with the key """
+        for descriptor_key, value in self.descriptors:
+            if descriptor_key == key:
+                return value
+        return None
+
+    def get_bonus_names(self) -> List[str]:
+        """ Returns the bonuses of every bonus_parents descriptor of the element, merged as BonusMembership does """
+        names = []
+        for key, value in self.descriptors:
+            if key == BONUS_PARENTS_KEY:
+                names.extend(parse_bonus_names(value))
+        return list(dict.fromkeys(names))
+
+
+def _is_wanted(tag: str, attributes, id_prefixes: Optional[Tuple[str, ...]], tags: Optional[Iterable[str]]) -> bool:
+    if tags is not None and tag not in tags:
+        return False
+    if id_prefixes is not None and not (attributes.get('id') or '').startswith(id_prefixes):
+        return False
+    return True
+
+
+def scan_svg(source, id_prefixes: Optional[Iterable[str]] = None, tags: Optional[Iterable[str]] = None) -> Iterator[ScannedElement]:
+    """
+    Streams the elements of an svg file
+
+    Args:
+        source: file path or binary file object
+        id_prefixes: only yield elements whose id starts with one of these, e.g. (TERRITORY_PREFIX, BONUS_PREFIX)
+        tags: only yield elements with these local tag names, e.g. {'path'}
+
+    Usage:
+        for element in scan_svg('Luthadel.svg', id_prefixes=(TERRITORY_PREFIX,)):
+            print(element.element_id, element.label, element.get_bonus_names())
+    """
+    id_prefixes = tuple(id_prefixes) if id_prefixes is not None else None
+    tags = set(tags) if tags is not None else None
+    # descriptors of the elements whose end tag has not been read yet, innermost last
+    pending: List[List[Tuple[str, str]]] = []
+    for event, element in etree.iterparse(source, events=('start', 'end'), remove_comments=True, remove_pis=True, huge_tree=True):
+        if event == 'start':
+            pending.append([])
+            continue
+
+        descriptors = pending.pop()
+        if element.tag == DESC_TAG:
+            descriptor = parse_descriptor(element.text)
+            if descriptor is not None and pending:
+                pending[-1].append(descriptor)
+        else:
+            tag = get_local_name(element.tag)
+            if _is_wanted(tag, element.attrib, id_prefixes, tags):
+                yield ScannedElement(tag, dict(element.attrib), descriptors)
+
+        # everything before this element has been read, so it and its earlier siblings can go
+        element.clear(keep_tail=False)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+
+def scan_tree(root, id_prefixes: Optional[Iterable[str]] = None, tags: Optional[Iterable[str]] = None) -> Iterator[ScannedElement]:
+    """ Yields the elements of an already loaded tree as scan_svg would, in document order rather than end tag order """
+    id_prefixes = tuple(id_prefixes) if id_prefixes is not None else None
+    tags = set(tags) if tags is not None else None
+    for element in root.iter():
+        if not isinstance(element.tag, str) or element.tag == DESC_TAG:
+            continue
+        tag = get_local_name(element.tag)
+        if not _is_wanted(tag, element.attrib, id_prefixes, tags):
+            continue
+        descriptors = []
+        for child in element:
+            if child.tag == DESC_TAG:
+                descriptor = parse_descriptor(child.text)
+                if descriptor is not None:
+                    descriptors.append(descriptor)
+        yield ScannedElement(tag, dict(element.attrib), descriptors)
+
+
+def scan_labels(source, id_prefixes: Iterable[str] = (TERRITORY_PREFIX,)) -> Dict[str, Optional[str]]:
+    """ Returns id -> inkscape:label of the elements whose id starts with one of the prefixes """
+    return {element.element_id: element.label for element in scan_svg(source, id_prefixes)}
+
+
+def scan_bonus_parents(source) -> Dict[str, List[str]]:
+    """ Returns id -> bonus names of every element with an id and a bonus_parents descriptor """
+    bonus_parents = {}
+    for element in scan_svg(source):
+        names = element.get_bonus_names()
+        if names and element.element_id is not None:
+            bonus_parents[element.element_id] = names
+    return bonus_parents
@@ -0,0 +1,258 @@
+###
+#   Territory Graph
+#
+#   Analyses the connections of a map for balancing: how far territories are from the starting spots,
+#   whether the map falls apart into separate components, which territories cut it in two when taken (articulation points),
+#   which territories of each bonus have to be defended, and how connected territories are overall.
+#
+#   The graph is the CSR adjacency of the map model: the neighbours of territory i are neighbours[offsets[i]:offsets[i + 1]],
+#   with territories referred to by their index in the sorted territory ids. A graph of a memory mapped model shares its arrays.
+#
+#   Breadth first searches run level by level on arrays rather than territory by territory: every (source, territory) pair
+#   of the frontier is expanded into its neighbours at once, so searching from every starting spot costs a few numpy calls
+#   per level rather than a python loop per territory.
+#
+###
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from warzone_map_diff import MapState
+from warzone_map_model import MapModel, build_adjacency, find_indices
+
+UNREACHABLE = -1
+
+
+class BonusBorders(NamedTuple):
+    """ Territory indices of a bonus split by whether they touch the rest of the map """
+    # members with a neighbour outside the bonus
+    border: np.ndarray
+    # members whose neighbours are all in the bonus
+    interior: np.ndarray
+    # territories outside the bonus next to one of its members
+    outside: np.ndarray
+
+
+def nearest_sources(distances: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (distance to the nearest source, row of it) for every territory of a bfs_distances result,
+    UNREACHABLE and -1 for territories no source reaches. Ties go to the earlier source
+    """
+    if distances.shape[0] == 0:
+        return np.full(distances.shape[1], UNREACHABLE, dtype=np.int32), np.full(distances.shape[1], -1, dtype=np.int64)
+    nearest = np.argmin(np.where(distances == UNREACHABLE, np.iinfo(np.int32).max, distances), axis=0)
+    nearest_distances = distances[nearest, np.arange(distances.shape[1])]
+    nearest[nearest_distances == UNREACHABLE] = -1
+    return nearest_distances, nearest
+
+
+class TerritoryGraph:
+    """
+    The undirected connection graph of a map, with the territory indices of its bonuses
+
+    Usage:
+        graph = TerritoryGraph.from_game_feed(mapJson)
+        distances = graph.bfs_distances(graph.index_of(starting_spot_ids))
+        count, labels = graph.connected_components()
+    """
+
+    def __init__(
+            self,
+            territory_ids: np.ndarray,
+            offsets: np.ndarray,
+            neighbours: np.ndarray,
+            bonuses: Optional[Dict[str, np.ndarray]] = None,
+            bonus_values: Optional[Dict[str, int]] = None):
+        self.territory_ids = territory_ids
+        self.offsets = offsets
+        self.neighbours = neighbours
+        # bonus name -> territory indices
+        self.bonuses: Dict[str, np.ndarray] = bonuses or {}
+        self.bonus_values: Dict[str, int] = bonus_values or {}
+        self.degrees = np.diff(offsets)
+
+    @property
+    def territory_count(self) -> int:
+        return len(self.territory_ids)
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.neighbours) // 2
+
+    @classmethod
+    def from_map_model(cls, model: MapModel) -> 'TerritoryGraph':
+        bonuses, bonus_values = {}, {}
+        for index, value in enumerate(model.bonus_values.tolist()):
+            name = model.bonus_name(index)
+            bonuses[name] = model.bonus_territories(index)
+            bonus_values[name] = value
+        return cls(model.territory_ids, model.adjacency_offsets, model.adjacency, bonuses, bonus_values)
+
+    @classmethod
+    def from_game_feed(cls, map_json: dict) -> 'TerritoryGraph':
+        """ Builds the graph of a GameFeed map, or a whole GameFeed response """
+        return cls.from_map_model(MapModel.from_game_feed(map_json))
+
+    @classmethod
+    def from_connections(
+            cls,
+            connections: Iterable[Tuple[int, int]],
+            territory_ids: Optional[Iterable[int]] = None,
+            bonuses: Optional[Dict[str, Iterable[int]]] = None,
+            bonus_values: Optional[Dict[str, int]] = None) -> 'TerritoryGraph':
+        """
+        Builds the graph of connections between territory ids, e.g. those derived from the territory outlines
+
+        Args:
+            connections: (territory id, territory id) pairs, in either or both directions
+            territory_ids: territories of the map, including those without connections. Defaults to the connected territories
+            bonuses: bonus name -> territory ids
+
+        Usage:
+            commands = territory_connection_commands(get_territory_outlines(svg))
+            graph = TerritoryGraph.from_connections([(command.id1, command.id2) for command in commands], [id for id, _ in outlines])
+        """
+        pairs = np.array(list(connections), dtype=np.int64).reshape(-1, 2)
+        members = {name: np.array(list(dict.fromkeys(ids)), dtype=np.int64) for name, ids in (bonuses or {}).items()}
+        ids = np.unique(np.concatenate(
+            [pairs.reshape(-1), np.fromiter(territory_ids or (), dtype=np.int64)] + list(members.values())))
+        offsets, neighbours = build_adjacency(len(ids), np.searchsorted(ids, pairs))
+        return cls(
+            ids.astype(np.int32), offsets, neighbours,
+            {name: np.searchsorted(ids, bonus_ids).astype(np.int32) for name, bonus_ids in members.items()},
+            bonus_values)
+
+    @classmethod
+    def from_map_state(cls, state: MapState) -> 'TerritoryGraph':
+        territory_ids = set(state.names) | set(state.centerpoints)
+        return cls.from_connections(
+            state.connections, territory_ids, state.members, {name: armies for name, (armies, _) in state.bonuses.items()})
+
+    def index_of(self, territory_ids):
+        """
+        Returns the index of a territory id, or an array of indices for an array of ids
+
+        Raises:
+            KeyError: an id is not a territory of the map
+        """
+        ids = np.asarray(territory_ids, dtype=np.int64)
+        indices, found = find_indices(self.territory_ids, ids)
+        if not np.all(found):
+            raise KeyError(int(ids.reshape(-1)[np.argmin(found.reshape(-1))]))
+        return int(indices) if indices.ndim == 0 else indices
+
+    def _expand(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns (position in nodes, neighbour) for every neighbour of every node """
+        counts = self.degrees[nodes]
+        total = int(counts.sum())
+        positions = np.repeat(np.arange(len(nodes)), counts)
+        # index of each neighbour within its node's run, added to where that run starts
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return positions, self.neighbours[self.offsets[nodes][positions] + within]
+
+    def bfs_distances(self, sources) -> np.ndarray:
+        """
+        Returns the number of connections between each source and every territory
+
+        Args:
+            sources: territory indices, e.g. graph.index_of(starting_spot_ids)
+
+        Returns:
+            np.ndarray: (len(sources), territory count) int32, UNREACHABLE for territories in another component
+        """
+        sources = np.atleast_1d(np.asarray(sources, dtype=np.int64))
+        count = self.territory_count
+        distances = np.full(len(sources) * count, UNREACHABLE, dtype=np.int32)
+        # flat (source row, territory) positions of the territories reached at the current distance
+        frontier = np.arange(len(sources), dtype=np.int64) * count + sources
+        distances[frontier] = 0
+        # scratch for dropping repeats without sorting, the last write of a repeated position is the one kept
+        last = np.empty(len(distances), dtype=np.int64)
+        distance = 0
+        while len(frontier):
+            distance += 1
+            rows, nodes = np.divmod(frontier, count)
+            positions, reached = self._expand(nodes)
+            reached = rows[positions] * count + reached
+            reached = reached[distances[reached] == UNREACHABLE]
+            order = np.arange(len(reached))
+            last[reached] = order
+            reached = reached[last[reached] == order]
+            distances[reached] = distance
+            frontier = reached
+        return distances.reshape(len(sources), count)
+
+    def connected_components(self) -> Tuple[int, np.ndarray]:
+        """ Returns (component count, component of each territory), components numbered by their lowest territory index """
+        labels = np.arange(self.territory_count, dtype=np.int64)
+        sources = np.repeat(labels, self.degrees)
+        targets = self.neighbours.astype(np.int64)
+        while True:
+            # every territory takes the lowest label among its neighbours, then follows labels to their roots
+            updated = labels.copy()
+            np.minimum.at(updated, sources, labels[targets])
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+        roots, components = np.unique(labels, return_inverse=True)
+        return len(roots), components.astype(np.int32)
+
+    def articulation_points(self) -> np.ndarray:
+        """ Returns the sorted indices of the territories whose removal splits their component """
+        offsets: List[int] = self.offsets.tolist()
+        neighbours: List[int] = self.neighbours.tolist()
+        count = self.territory_count
+        discovered = [-1] * count
+        low = [0] * count
+        is_articulation = [False] * count
+        order = 0
+        for root in range(count):
+            if discovered[root] != -1:
+                continue
+            discovered[root] = low[root] = order
+            order += 1
+            root_children = 0
+            # iterative depth first search, (territory, parent, next neighbour position)
+            stack = [(root, -1, offsets[root])]
+            while stack:
+                node, parent, position = stack[-1]
+                if position < offsets[node + 1]:
+                    stack[-1] = (node, parent, position + 1)
+                    neighbour = neighbours[position]
+                    if discovered[neighbour] == -1:
+                        discovered[neighbour] = low[neighbour] = order
+                        order += 1
+                        if node == root:
+                            root_children += 1
+                        stack.append((neighbour, node, offsets[neighbour]))
+                    elif neighbour != parent:
+                        low[node] = min(low[node], discovered[neighbour])
+                    continue
+                stack.pop()
+                if parent != -1:
+                    low[parent] = min(low[parent], low[node])
+                    if parent != root and low[node] >= discovered[parent]:
+                        is_articulation[parent] = True
+            if root_children > 1:
+                is_articulation[root] = True
+        return np.flatnonzero(is_articulation)
+
+    def bonus_borders(self, bonus_names: Optional[Sequence[str]] = None) -> Dict[str, BonusBorders]:
+        """ Returns the border, interior and outside territories of the bonuses, all of them by default """
+        borders = {}
+        inside = np.zeros(self.territory_count, dtype=bool)
+        for name in (self.bonuses if bonus_names is None else bonus_names):
+            members = np.unique(np.asarray(self.bonuses[name], dtype=np.int64))
+            inside[members] = True
+            positions, reached = self._expand(members)
+            leaving = ~inside[reached]
+            on_border = np.bincount(positions[leaving], minlength=len(members)) > 0
+            borders[name] = BonusBorders(members[on_border], members[~on_border], np.unique(reached[leaving]))
+            inside[members] = False
+        return borders
+
+    def degree_histogram(self) -> np.ndarray:
+        """ Returns the number of territories with each number of connections, indexed by that number """
+        return np.bincount(self.degrees, minlength=1)
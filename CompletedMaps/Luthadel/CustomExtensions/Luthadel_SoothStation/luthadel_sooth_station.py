@@ -1,26 +1,14 @@
 #!/usr/bin/env python
 
 from operator import le
-import inkex, json, os, sys, re
+import inkex, os, sys, re
 from typing import List
-from abc import ABC
-
-def get_inkscape_version() -> float:
-    """ Retrieves the inkscape version that this script is being run against """
-    ink = inkex.command.INKSCAPE_EXECUTABLE_NAME
-    os.environ["SELF_CALL"] = "true"  # needed for version 1.3 and 1.3.1
-    try: # needed prior to 1.1
-        ink_version = inkex.command.call(ink, '--version').decode("utf-8")
-    except AttributeError: # needed starting from 1.1
-        ink_version = inkex.command.call(ink, '--version')
-
-    pos = ink_version.find("Inkscape ")
-    if pos != -1:
-        pos += 9
-    else:
-        return None
-    v_num = ink_version[pos:pos+3]
-    return(float(v_num))
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "Common"))
+from warzone_commands import AddBonusCommand, AddTerritoryToBonusCommand, WarzoneSetDetailsPostRequestModel, validate_commands
+from warzone_svg_index import SvgIndex
+from warzone_inkscape import is_supported_inkscape_version
+from warzone_path_validation import is_closed_path
 
 def halting_message(message: str) -> None:
     """ Displays an error message to inkscape and exits the program """
@@ -28,14 +16,13 @@ def halting_message(message: str) -> None:
     sys.exit()
     
 def get_warzone_identifiable_path(
-        type: str,
-        root: inkex.BaseElement,
-        is_recursive: bool = True) -> List[inkex.PathElement]:
-    slash = '//' if is_recursive else '/'
-    return root.xpath(
-        f".{slash}{Svg.PATH}[contains(@{Svg.ID}, '{type}')]",
-        namespaces=inkex.NSS
-    )
+        element_id: str,
+        svg_index: SvgIndex) -> inkex.PathElement:
+    """ Looks up an element by its exact id in the document index, halting if it does not exist """
+    element = svg_index.get(element_id)
+    if element is None:
+        halting_message(f'Unable to locate {element_id}')
+    return element
 
 BONUS_PREFIX = 'BonusLink_'
 TERRITORY_IDENTIFIER = 'Territory_'
@@ -56,71 +43,6 @@ class Svg:
     STROKE = 'stroke'
     STROKE_WIDTH = 'stroke-width'
     
-class WarzoneSetDetailsPostRequestModel:
-    email = ""
-    APIToken = ""
-    mapID = 0
-    commands = None
-
-    def __init__(self, email, APIToken, mapID, commands):
-        self.email = email
-        self.APIToken = APIToken
-        self.mapID = int(mapID)
-        self.commands = commands
-    
-    def to_JSON(self):
-        return json.dumps(self, default = lambda o: o.__dict__, indent = 4)
-
-class Command(ABC):
-    command = ""
-
-    def to_JSON(self):
-        return json.dumps(self, default = lambda o: o.__dict__, sort_keys=True, indent=4)
-    
-    def validate(self):
-        pass
-
-    def get_error_string(self, field):
-        return f"Invalid {field} for Command {self.command}: {self.to_JSON()}"
-    
-class AddBonusCommand(Command):
-    name = ""
-    armies = None
-
-    def __init__(self, bonus_name, armies):
-        self.command = "addBonus"
-        self.name = bonus_name
-        self.armies = int(armies)
-
-    def validate(self):
-        errors = []
-        if(self.armies == None):
-            errors.append(self.get_error_string("armies"))
-        if(self.name == None or self.name == ""):
-            errors.append(self.get_error_string("name"))
-        
-        if(len(errors)>0):
-            return errors
-
-class AddTerritoryToBonusCommand(Command):
-    id = None
-    bonusName = ""
-
-    def __init__(self, territory_id, bonus_name):
-        self.command = "addTerritoryToBonus"
-        self.id = int(territory_id)
-        self.bonusName = bonus_name
-    
-    def validate(self):
-        errors = []
-        if(self.id == None):
-            errors.append(self.get_error_string("id"))
-        if(self.bonusName == None or self.bonusName == ""):
-            errors.append(self.get_error_string("bonusName"))
-        
-        if(len(errors)>0):
-            return errors
-
 class LuthadelSoothStation(inkex.EffectExtension):
     """Main code for the extension"""
     
@@ -132,25 +54,6 @@ class LuthadelSoothStation(inkex.EffectExtension):
         pars.add_argument("--contractId", type=str, default="CHANGEME",\
                           help="Please specify")
     
-    def is_closed_path_naive(self, path: inkex.Path) -> bool:
-        """
-        A naive approach to determining if a given path is closed
-        Naive as assuming presence of duplicate points means it is closed
-        This is technically not true but is a lazy way of detection the truthful cases we currently care about
-        
-        Args:
-            path (inkex.Path): The path to check
-
-        Returns:
-            bool: if the path is closed
-        """
-        points: List[float, float] = []
-        for point in path.get_path().end_points:
-            points.append([point.x,point.y])
-      
-        points_with_no_duplicates = list(set(map(tuple,points)))
-        return len(points_with_no_duplicates) != len(points)
-    
     def get_elements(self):
         """
         Gets the elements required for this script and returns an error if insufficient elements are found\n
@@ -166,20 +69,21 @@ class LuthadelSoothStation(inkex.EffectExtension):
         effected_territories = None
 
         for territory in polygons_selection:
-            if(not self.is_closed_path_naive(territory)):
+            if(not is_closed_path(territory)):
                 halting_message(f'Territory {territory.get_id()} is not a closed path')
 
         station_territory = polygons_selection[0]
         effected_territories = list(polygons_selection)[1:]
+        svg_index = SvgIndex(self.svg)
         contract_territories = []
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1159', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1117', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1152', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1162', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1124', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1153', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1107', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1142', self.svg, True)[0])
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1159', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1117', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1152', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1162', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1124', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1153', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1107', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1142', svg_index))
         
         if(len(contract_territories) != 8):
             halting_message('Unable to locate contract territory')
@@ -213,9 +117,13 @@ class LuthadelSoothStation(inkex.EffectExtension):
             commands.append(AddTerritoryToBonusCommand(territory.get_id().replace(TERRITORY_IDENTIFIER,""), soothing_station_and_territory_cancelling_out_bonus_name))
             commands.append(AddTerritoryToBonusCommand(station_territory.get_id().replace(TERRITORY_IDENTIFIER,""), soothing_station_and_territory_cancelling_out_bonus_name))
         
+        errors = validate_commands(commands)
+        if(len(errors) > 0):
+            halting_message("\n".join(errors))
+
         json_model = WarzoneSetDetailsPostRequestModel('ignore', 'ignore', 0, commands)
-        json_string = json_model.to_JSON()
-        inkex.debug(json_string)
+        json_model.write_JSON(sys.stderr)
+        sys.stderr.write("\n")
 
     def get_territory_name(self, territory: inkex.BaseElement) -> str:
         try:
@@ -224,8 +132,7 @@ class LuthadelSoothStation(inkex.EffectExtension):
             halting_message(f'exception encountered: {territory.get_id()}')
 
     def effect(self):
-        inkscape_version = get_inkscape_version()
-        if(inkscape_version < 1.2):
+        if(not is_supported_inkscape_version()):
             halting_message('This extension only supports inkscape versions >=1.2')
     
         station_territory, contract_territories, effected_territories = self.get_elements()
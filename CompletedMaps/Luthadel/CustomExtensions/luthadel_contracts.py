@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 
-from math import prod
-import inkex, os, sys, tempfile, re, json, itertools
+import inkex, os, sys, tempfile, re
 from inkex import command
-from typing import List
-from abc import ABC
+from typing import List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "Common"))
+from warzone_commands import WarzoneSetDetailsPostRequestModel, validate_commands
+from warzone_svg_index import SvgIndex
+from warzone_inkscape import is_supported_inkscape_version
+from warzone_bonus_combinations import CombinationBonuses
 
 
 # from svgpath2mpl import parse_path
@@ -12,37 +16,19 @@ from abc import ABC
 # import matplotlib.transforms as transforms
 # import numpy as np
 
-def get_inkscape_version() -> float:
-    """ Retrieves the inkscape version that this script is being run against """
-    ink = inkex.command.INKSCAPE_EXECUTABLE_NAME
-    os.environ["SELF_CALL"] = "true"  # needed for version 1.3 and 1.3.1
-    try: # needed prior to 1.1
-        ink_version = inkex.command.call(ink, '--version').decode("utf-8")
-    except AttributeError: # needed starting from 1.1
-        ink_version = inkex.command.call(ink, '--version')
-
-    pos = ink_version.find("Inkscape ")
-    if pos != -1:
-        pos += 9
-    else:
-        return None
-    v_num = ink_version[pos:pos+3]
-    return(float(v_num))
-
 def halting_message(message: str) -> None:
     """ Displays an error message to inkscape and exits the program """
     inkex.errormsg(message)
     sys.exit()
     
 def get_warzone_identifiable_path(
-        type: str,
-        root: inkex.BaseElement,
-        is_recursive: bool = True) -> List[inkex.PathElement]:
-    slash = '//' if is_recursive else '/'
-    return root.xpath(
-        f".{slash}{Svg.PATH}[contains(@{Svg.ID}, '{type}')]",
-        namespaces=inkex.NSS
-    )
+        element_id: str,
+        svg_index: SvgIndex) -> inkex.PathElement:
+    """ Looks up an element by its exact id in the document index, halting if it does not exist """
+    element = svg_index.get(element_id)
+    if element is None:
+        halting_message(f'Unable to locate {element_id}')
+    return element
 
 BONUS_PREFIX = 'BonusLink_'
 TERRITORY_IDENTIFIER = 'Territory_'
@@ -63,71 +49,6 @@ class Svg:
     STROKE = 'stroke'
     STROKE_WIDTH = 'stroke-width'
     
-class WarzoneSetDetailsPostRequestModel:
-    email = ""
-    APIToken = ""
-    mapID = 0
-    commands = None
-
-    def __init__(self, email, APIToken, mapID, commands):
-        self.email = email
-        self.APIToken = APIToken
-        self.mapID = int(mapID)
-        self.commands = commands
-    
-    def to_JSON(self):
-        return json.dumps(self, default = lambda o: o.__dict__, indent = 4)
-
-class Command(ABC):
-    command = ""
-
-    def to_JSON(self):
-        return json.dumps(self, default = lambda o: o.__dict__, sort_keys=True, indent=4)
-    
-    def validate(self):
-        pass
-
-    def get_error_string(self, field):
-        return f"Invalid {field} for Command {self.command}: {self.to_JSON()}"
-    
-class AddBonusCommand(Command):
-    name = ""
-    armies = None
-
-    def __init__(self, bonus_name, armies):
-        self.command = "addBonus"
-        self.name = bonus_name
-        self.armies = int(armies)
-
-    def validate(self):
-        errors = []
-        if(self.armies == None):
-            errors.append(self.get_error_string("armies"))
-        if(self.name == None or self.name == ""):
-            errors.append(self.get_error_string("name"))
-        
-        if(len(errors)>0):
-            return errors
-
-class AddTerritoryToBonusCommand(Command):
-    id = None
-    bonusName = ""
-
-    def __init__(self, territory_id, bonus_name):
-        self.command = "addTerritoryToBonus"
-        self.id = int(territory_id)
-        self.bonusName = bonus_name
-    
-    def validate(self):
-        errors = []
-        if(self.id == None):
-            errors.append(self.get_error_string("id"))
-        if(self.bonusName == None or self.bonusName == ""):
-            errors.append(self.get_error_string("bonusName"))
-        
-        if(len(errors)>0):
-            return errors
-
 BONUS_PREFIX = 'BonusLink_'
 
 def create_selection_action(element_id) -> str:
@@ -138,6 +59,10 @@ def create_selection_action(element_id) -> str:
 ACTION_PATH_COMBINE = 'path-combine'
 ACTION_DESELECT = 'select-clear'
 
+CONTRACT_COMBINATION_SIZE = 3
+CONTRACT_PENALTY = -999
+CONTRACT_GROUP_DIGITS = str.maketrans('', '', '12345678')
+
 class LabelToIdExtension(inkex.EffectExtension):
     """Main code for the extension"""
     
@@ -146,6 +71,8 @@ class LabelToIdExtension(inkex.EffectExtension):
         
     def add_arguments(self, pars):
         pars.add_argument("--tab", type=str, default='Controls')
+        pars.add_argument("--summary_only", type=inkex.Boolean, default=False,
+                          help="Only report the number of bonuses and commands and the payload size")
 
     def get_elements(self) -> (tuple[List[inkex.BaseElement], List[inkex.BaseElement]]):
         """
@@ -196,37 +123,43 @@ class LabelToIdExtension(inkex.EffectExtension):
         except:
             halting_message(f'exception encountered: {territory.get_id()}')
             
+    def get_territory_id(self, territory: inkex.BaseElement) -> int:
+        return int(territory.get_id().replace(TERRITORY_IDENTIFIER, ""))
+
+    def get_contract_bonus_name(self, territories: Tuple[inkex.BaseElement, ...]) -> str:
+        territory_a_name = self.get_territory_name(territories[0])
+        # the group number is only kept on the first territory to fit the bonus name length
+        other_names = [self.get_territory_name(territory).translate(CONTRACT_GROUP_DIGITS) for territory in territories[1:]]
+        return f'0Ctr{territory_a_name}{"".join(other_names)}'
+
     def modify_elements(self, contract_territory_groups: List[List[inkex.BaseElement]]):
         """
-        Sets the ids of the given elements
+        Outputs a penalty bonus for every 3 territory combination within each contract group
         """
-        commands = []
-        permutations_to_process = []
-        for group in contract_territory_groups:
-            permutations = list(itertools.combinations(group, 3))
-            permutations_to_process.extend(permutations)
-        permutations_to_process_b = list(set(permutations_to_process))
-        debug_list = []
-        for permutation in permutations_to_process_b:
-                territory_a_name = self.get_territory_name(permutation[0])
-                territory_b_name = self.get_territory_name(permutation[1]).replace('1','').replace('2','').replace('3','').replace('4','').replace('5','').replace('6','').replace('7','').replace('8','')
-                territory_c_name = self.get_territory_name(permutation[2]).replace('1','').replace('2','').replace('3','').replace('4','').replace('5','').replace('6','').replace('7','').replace('8','')
-                penalty_bonus_name = f'0Ctr{territory_a_name}{territory_b_name}{territory_c_name}'
-                # debug_list.append(penalty_bonus_name)
-                commands.append(AddBonusCommand(penalty_bonus_name,-999))
-                commands.append(AddTerritoryToBonusCommand(permutation[0].get_id().replace(TERRITORY_IDENTIFIER,""), penalty_bonus_name))
-                commands.append(AddTerritoryToBonusCommand(permutation[1].get_id().replace(TERRITORY_IDENTIFIER,""), penalty_bonus_name))
-                commands.append(AddTerritoryToBonusCommand(permutation[2].get_id().replace(TERRITORY_IDENTIFIER,""), penalty_bonus_name))
-
-        # halting_message(debug_list)
-        json_model = WarzoneSetDetailsPostRequestModel('ignore', 'ignore', 0, commands)
-        json_string = json_model.to_JSON()
-        inkex.debug(json_string)
+        bonuses = CombinationBonuses(
+            contract_territory_groups,
+            CONTRACT_COMBINATION_SIZE,
+            self.get_territory_id,
+            self.get_contract_bonus_name,
+            CONTRACT_PENALTY)
+
+        if(self.options.summary_only):
+            halting_message(
+                f'{bonuses.count()} bonuses, {bonuses.command_count()} commands, '
+                f'about {bonuses.estimate_payload_bytes() / 1024 / 1024:.1f} MiB of json')
+
+        # the commands are generated lazily for validation and again for the output, so they are never all held at once
+        errors = validate_commands(bonuses.commands())
+        if(len(errors) > 0):
+            halting_message("\n".join(errors))
+
+        json_model = WarzoneSetDetailsPostRequestModel('ignore', 'ignore', 0, bonuses.commands())
+        json_model.write_JSON(sys.stderr)
+        sys.stderr.write("\n")
 
     def effect(self):
 
-        inkscape_version = get_inkscape_version()
-        if(inkscape_version < 1.2):
+        if(not is_supported_inkscape_version()):
             halting_message('This extension only supports inkscape versions >=1.2')
     
         contract_territories = []
@@ -1,46 +1,32 @@
 #!/usr/bin/env python
 
-import inkex, os, sys, tempfile, re, json
+import inkex, os, sys, tempfile, re
 from inkex import command
 from typing import List
-from abc import ABC
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "Common"))
+from warzone_commands import AddBonusCommand, AddTerritoryToBonusCommand, WarzoneSetDetailsPostRequestModel, validate_commands
+from warzone_svg_index import SvgIndex
+from warzone_inkscape import is_supported_inkscape_version
 
 # from svgpath2mpl import parse_path
 # from matplotlib.path import Path
 # import matplotlib.transforms as transforms
 # import numpy as np
 
-def get_inkscape_version() -> float:
-    """ Retrieves the inkscape version that this script is being run against """
-    ink = inkex.command.INKSCAPE_EXECUTABLE_NAME
-    os.environ["SELF_CALL"] = "true"  # needed for version 1.3 and 1.3.1
-    try: # needed prior to 1.1
-        ink_version = inkex.command.call(ink, '--version').decode("utf-8")
-    except AttributeError: # needed starting from 1.1
-        ink_version = inkex.command.call(ink, '--version')
-
-    pos = ink_version.find("Inkscape ")
-    if pos != -1:
-        pos += 9
-    else:
-        return None
-    v_num = ink_version[pos:pos+3]
-    return(float(v_num))
-
 def halting_message(message: str) -> None:
     """ Displays an error message to inkscape and exits the program """
     inkex.errormsg(message)
     sys.exit()
     
 def get_warzone_identifiable_path(
-        type: str,
-        root: inkex.BaseElement,
-        is_recursive: bool = True) -> List[inkex.PathElement]:
-    slash = '//' if is_recursive else '/'
-    return root.xpath(
-        f".{slash}{Svg.PATH}[contains(@{Svg.ID}, '{type}')]",
-        namespaces=inkex.NSS
-    )
+        element_id: str,
+        svg_index: SvgIndex) -> inkex.PathElement:
+    """ Looks up an element by its exact id in the document index, halting if it does not exist """
+    element = svg_index.get(element_id)
+    if element is None:
+        halting_message(f'Unable to locate {element_id}')
+    return element
 
 BONUS_PREFIX = 'BonusLink_'
 TERRITORY_IDENTIFIER = 'Territory_'
@@ -61,71 +47,6 @@ class Svg:
     STROKE = 'stroke'
     STROKE_WIDTH = 'stroke-width'
     
-class WarzoneSetDetailsPostRequestModel:
-    email = ""
-    APIToken = ""
-    mapID = 0
-    commands = None
-
-    def __init__(self, email, APIToken, mapID, commands):
-        self.email = email
-        self.APIToken = APIToken
-        self.mapID = int(mapID)
-        self.commands = commands
-    
-    def to_JSON(self):
-        return json.dumps(self, default = lambda o: o.__dict__, indent = 4)
-
-class Command(ABC):
-    command = ""
-
-    def to_JSON(self):
-        return json.dumps(self, default = lambda o: o.__dict__, sort_keys=True, indent=4)
-    
-    def validate(self):
-        pass
-
-    def get_error_string(self, field):
-        return f"Invalid {field} for Command {self.command}: {self.to_JSON()}"
-    
-class AddBonusCommand(Command):
-    name = ""
-    armies = None
-
-    def __init__(self, bonus_name, armies):
-        self.command = "addBonus"
-        self.name = bonus_name
-        self.armies = int(armies)
-
-    def validate(self):
-        errors = []
-        if(self.armies == None):
-            errors.append(self.get_error_string("armies"))
-        if(self.name == None or self.name == ""):
-            errors.append(self.get_error_string("name"))
-        
-        if(len(errors)>0):
-            return errors
-
-class AddTerritoryToBonusCommand(Command):
-    id = None
-    bonusName = ""
-
-    def __init__(self, territory_id, bonus_name):
-        self.command = "addTerritoryToBonus"
-        self.id = int(territory_id)
-        self.bonusName = bonus_name
-    
-    def validate(self):
-        errors = []
-        if(self.id == None):
-            errors.append(self.get_error_string("id"))
-        if(self.bonusName == None or self.bonusName == ""):
-            errors.append(self.get_error_string("bonusName"))
-        
-        if(len(errors)>0):
-            return errors
-
 BONUS_PREFIX = 'BonusLink_'
 
 def create_selection_action(element_id) -> str:
@@ -210,35 +131,39 @@ class LabelToIdExtension(inkex.EffectExtension):
                 commands.append(AddTerritoryToBonusCommand(contract_territory.get_id().replace(TERRITORY_IDENTIFIER,""), penalty_bonus_name))
                 commands.append(AddTerritoryToBonusCommand(keep_territory.get_id().replace(TERRITORY_IDENTIFIER,""), penalty_bonus_name))
         
+        errors = validate_commands(commands)
+        if(len(errors) > 0):
+            halting_message("\n".join(errors))
+
         json_model = WarzoneSetDetailsPostRequestModel('ignore', 'ignore', 0, commands)
-        json_string = json_model.to_JSON()
-        inkex.debug(json_string)
+        json_model.write_JSON(sys.stderr)
+        sys.stderr.write("\n")
 
     def effect(self):
 
-        inkscape_version = get_inkscape_version()
-        if(inkscape_version < 1.2):
+        if(not is_supported_inkscape_version()):
             halting_message('This extension only supports inkscape versions >=1.2')
     
+        svg_index = SvgIndex(self.svg)
         contract_territories = []
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1157', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1131', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1151', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1158', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1145', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1154', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1120', self.svg, True)[0])
-        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1148', self.svg, True)[0])
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1157', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1131', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1151', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1158', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1145', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1154', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1120', svg_index))
+        contract_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1148', svg_index))
         
         
         rioter_territories = []
-        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}549', self.svg, True)[0])
-        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}981', self.svg, True)[0])
-        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}829', self.svg, True)[0])
-        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}424', self.svg, True)[0])
-        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1244', self.svg, True)[0])
-        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}73', self.svg, True)[0])
-        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}96', self.svg, True)[0])
+        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}549', svg_index))
+        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}981', svg_index))
+        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}829', svg_index))
+        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}424', svg_index))
+        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}1244', svg_index))
+        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}73', svg_index))
+        rioter_territories.append(get_warzone_identifiable_path(f'{TERRITORY_IDENTIFIER}96', svg_index))
         
         self.modify_elements(contract_territories, rioter_territories)
         
@@ -1,39 +1,26 @@
 #!/usr/bin/env python
 
-import inkex, os, sys, tempfile
-from inkex import command
-from typing import List
-
-def get_inkscape_version() -> float:
-    """ Retrieves the inkscape version that this script is being run against """
-    ink = inkex.command.INKSCAPE_EXECUTABLE_NAME
-    os.environ["SELF_CALL"] = "true"  # needed for version 1.3 and 1.3.1
-    try: # needed prior to 1.1
-        ink_version = inkex.command.call(ink, '--version').decode("utf-8")
-    except AttributeError: # needed starting from 1.1
-        ink_version = inkex.command.call(ink, '--version')
-
-    pos = ink_version.find("Inkscape ")
-    if pos != -1:
-        pos += 9
-    else:
-        return None
-    v_num = ink_version[pos:pos+3]
-    return(float(v_num))
+import inkex, math, os, sys
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_geometry import Polygon, Ring
+from warzone_inkscape import is_supported_inkscape_version
+from warzone_paths import DEFAULT_FLATNESS, element_to_polylines, element_to_rings, set_element_rings
+from warzone_path_validation import is_closed_path
+from warzone_stroke import CAP_BUTT, cut_pieces_out_of_polygons, stroke_pieces
 
 def halting_message(message: str) -> None:
     """ Displays an error message to inkscape and exits the program """
     inkex.errormsg(message)
     sys.exit()
 
-def create_selection_action(element_id) -> str:
-    """ creates the select action for a given element id"""
-    return f'select-by-id:{element_id}'
+def get_transform_scale(element: inkex.ShapeElement) -> float:
+    """ How much the element's composed transform scales lengths, such as its stroke width, on average """
+    transform = element.composed_transform()
+    return math.sqrt(abs(transform.a * transform.d - transform.b * transform.c))
 
 
-ACTION_PATH_DIFFERENCE = 'path-difference'
-ACTION_DESELECT = 'select-clear'
-ACTION_OBJECT_STROKE_TO_PATH = 'object-stroke-to-path'
 DEFAULT_STROKE_WIDTH = 1
 
 class CutLineOutOfClosedPolygonWithRespectToBordersExtension(inkex.EffectExtension):
@@ -44,140 +31,102 @@ class CutLineOutOfClosedPolygonWithRespectToBordersExtension(inkex.EffectExtensi
         
     def add_arguments(self, pars):
         pars.add_argument("--margin", type=int, default=1)
+        pars.add_argument("--flatness", type=float, default=DEFAULT_FLATNESS)
         pars.add_argument("--tab", type=str, default='Controls')
         
-    def create_cutting_path(self, closed_polygon: inkex.PathElement, original_line: inkex.PathElement) -> inkex.Path:
-        """
-        Creates the path that is used to cut through the closed polygon
-
-        Args:
-            closed_polygon (inkex.Path): The polygon to be cut through
-            original_line (inkex.Path): The line that should be visible through the cut
+    def get_stroke_width(self, element: inkex.ShapeElement) -> float:
+        """ The element's stroke width in document units """
+        style = element.effective_style()
+        stroke_width = float(style["stroke-width"]) if "stroke-width" in style else DEFAULT_STROKE_WIDTH
+        return stroke_width * get_transform_scale(element)
 
-        Returns:
-            inkex.Path: The cutting line
+    def get_border_width(self, closed_polygon: inkex.PathElement) -> float:
         """
-        cutting_line = original_line.duplicate()
-
-        closed_polygon_style = closed_polygon.effective_style()
-        original_line_style = original_line.effective_style()
-        cutting_line_style = cutting_line.effective_style()
-        
-        closed_polygon_stroke_width = float(closed_polygon_style["stroke-width"]) if "stroke-width" in closed_polygon_style else DEFAULT_STROKE_WIDTH
-        original_line_stroke_width = float(original_line_style["stroke-width"]) if "stroke-width" in original_line_style else DEFAULT_STROKE_WIDTH
-
+        The part of the cut's width taken by the closed polygon's border, so the line stays visible through the border too
+        """
+        closed_polygon_stroke_width = self.get_stroke_width(closed_polygon)
         if(closed_polygon.style["fill"] != None and closed_polygon_stroke_width != 0):
-            cutting_line_style["stroke-width"] = closed_polygon_stroke_width + original_line_stroke_width + self.options.margin
-        else:
-            cutting_line_style["stroke-width"] = original_line_stroke_width + self.options.margin
-
-        cutting_line_style["fill"] = None
-        cutting_line_style["stroke"] = '#ffffff'
+            return closed_polygon_stroke_width
+        return 0.0
 
-        original_line.ancestors()[0].add(cutting_line)
-        
-        return cutting_line
-    
-    def is_closed_path_naive(self, path: inkex.Path) -> bool:
+    def create_cutting_pieces(self, lines: List[inkex.PathElement], border_width: float) -> List[Ring]:
         """
-        A naive approach to determining if a given path is closed
-        Naive as assuming presence of duplicate points means it is closed
-        This is technically not true but is a lazy way of detection the truthful cases we currently care about
-        
+        Creates the convex pieces covering the lines' strokes, widened by the border width and the margin
+
         Args:
-            path (inkex.Path): The path to check
+            lines (List[inkex.PathElement]): The lines that should be visible through the cut
+            border_width (float): The border width of the polygons being cut
 
         Returns:
-            bool: if the path is closed
-        """
-        points: List[float, float] = []
-        for point in path.get_path().end_points:
-            points.append([point.x,point.y])
-      
-        points_with_no_duplicates = list(set(map(tuple,points)))
-        return len(points_with_no_duplicates) != len(points)
-
-    def get_elements(self) -> (tuple[inkex.Path, inkex.Path]):
+            List[Ring]: The pieces to cut out, in document coordinates
         """
-        Overkill selection checks
-        :return: The line and polygon from the selection
-        """
-        if (len(self.svg.selection.ids) != 2):
-            halting_message('Please select the path and line you wish to cut out of it')
-        
-        polygons_selection: List[inkex.PathElement] = self.svg.selection.filter(inkex.PathElement)
-
-        line_polygon = None
-        closed_polygon = None
-
-        if(self.is_closed_path_naive(polygons_selection[0])):
-            closed_polygon = polygons_selection[0]
-            line_polygon = polygons_selection[1]
-        elif(self.is_closed_path_naive(polygons_selection[1])):
-            line_polygon = polygons_selection[0]
-            closed_polygon = polygons_selection[1]
-        else:
-            halting_message('You have not selected a closed polygon and a line')
-
-        return (closed_polygon, line_polygon)
-
-    def construct_actions(
-            self,
-            closed_polygon_id: str,
-            path_id: str,
-            temp_file: str) -> str:
+        pieces: List[Ring] = []
+        for line in lines:
+            width = border_width + self.get_stroke_width(line) + self.options.margin
+            cap = line.effective_style().get("stroke-linecap") or CAP_BUTT
+            for points, closed in element_to_polylines(line, self.options.flatness):
+                pieces.extend(stroke_pieces(points, width, closed, cap))
+        return pieces
+    
+    def get_elements(self) -> (tuple[List[inkex.PathElement], List[inkex.PathElement]]):
         """
-        Generates the actions to cut the given line out of the given closed polygon
+        Splits the selection into the closed polygons and the lines to cut out of them
+        :return: The closed polygons and the lines from the selection
         """
-        actions_list = []
-
-        actions_list.append(create_selection_action(path_id))
-        actions_list.append(ACTION_OBJECT_STROKE_TO_PATH)
+        polygons_selection: List[inkex.PathElement] = list(self.svg.selection.filter(inkex.PathElement))
 
-        actions_list.append(ACTION_DESELECT)
+        closed_polygons = []
+        lines = []
+        for element in polygons_selection:
+            if(is_closed_path(element)):
+                closed_polygons.append(element)
+            else:
+                lines.append(element)
 
-        actions_list.append(create_selection_action(path_id))
-        actions_list.append(create_selection_action(closed_polygon_id))
-        actions_list.append(ACTION_PATH_DIFFERENCE)
+        if (len(closed_polygons) < 1 or len(lines) < 1):
+            halting_message('Please select the paths and the lines you wish to cut out of them')
 
-        actions_list.append(f"export-filename:{temp_file};export-overwrite;export-do")
+        return (closed_polygons, lines)
 
-        actions_list.append(ACTION_DESELECT)
-        actions = ";".join(actions_list)
+    def cut_lines(self, closed_polygons: List[inkex.PathElement], lines: List[inkex.PathElement]) -> List[inkex.PathElement]:
+        """
+        Cuts every line out of every closed polygon it crosses, in one pass
 
-        return actions
+        Polygons with the same border width share the same cutting pieces, so the lines' strokes are only built once per border width
 
-    def cleanup(self, temp_file: str) -> None:
-        """ Deletes the temporary file used for modifying the svg without causing permanent damage if it fails poorly """
-        try:
-            os.remove(temp_file)
-        except Exception:  # pylint: disable=broad-except
-            inkex.errormsg(f'Error removing temporary file: {tempfile}\n\n')
+        Returns:
+            List[inkex.PathElement]: polygons that would have been cut away entirely and so were left unchanged
+        """
+        polygons_by_border_width: Dict[float, List[inkex.PathElement]] = {}
+        for closed_polygon in closed_polygons:
+            polygons_by_border_width.setdefault(self.get_border_width(closed_polygon), []).append(closed_polygon)
+
+        emptied_polygons: List[inkex.PathElement] = []
+        for border_width, polygons in polygons_by_border_width.items():
+            pieces = self.create_cutting_pieces(lines, border_width)
+            outlines: List[Polygon] = [element_to_rings(polygon, self.options.flatness) for polygon in polygons]
+            for polygon, original_outline, outline in zip(polygons, outlines, cut_pieces_out_of_polygons(outlines, pieces)):
+                # untouched polygons keep their original (possibly curved) path data
+                if outline is original_outline:
+                    continue
+                if not outline:
+                    emptied_polygons.append(polygon)
+                    continue
+                set_element_rings(polygon, outline)
+
+        return emptied_polygons
 
     def effect(self):
 
-        inkscape_version = get_inkscape_version()
-        if(inkscape_version < 1.2):
+        if(not is_supported_inkscape_version()):
             halting_message('This extension only supports inkscape versions >=1.2')
     
-        closed_polygon_element, line_element = self.get_elements()
-        cutting_path_element = self.create_cutting_path(closed_polygon_element, line_element)
-        
-        # create a temp SVG document
-        # this has to be after the create cutting path for them to exist in it
-        temp_file = tempfile.mktemp('temp.svg')
-        self.document.write(temp_file)
-        
-        actions = self.construct_actions(
-            closed_polygon_element.get_id(),
-            cutting_path_element.get_id(),
-            temp_file)		
-
-        command.inkscape(temp_file, actions=actions)
-
-        self.document = inkex.load_svg(temp_file)
+        closed_polygons, lines = self.get_elements()
 
-        self.cleanup(temp_file)
+        emptied_polygons = self.cut_lines(closed_polygons, lines)
+        if emptied_polygons:
+            inkex.errormsg('These paths are entirely covered by the lines and were left unchanged: ' \
+                + ', '.join(polygon.get_id() for polygon in emptied_polygons))
 
 
 if __name__ == '__main__':
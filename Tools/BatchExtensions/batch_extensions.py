@@ -0,0 +1,247 @@
+###
+#   Batch Extensions
+#
+#   Runs the warzone inkscape extensions from the command line, without the inkscape GUI.
+#
+#   Each svg is parsed once, every configured extension step is applied to the same in memory document
+#   and the result is written once at the end, instead of reparsing and rewriting the svg for every extension run.
+#
+#   The pipeline is a json file:
+#   {
+#       "files": [
+#           {"input": "../../CompletedMaps/Luthadel/Luthadel.svg", "output": "Luthadel.out.svg"}
+#       ],
+#       "steps": [
+#           {
+#               "extension": "../../Extensions/ElementsIdAssigner/elements_id_assigner.py",
+#               "select": ["label:Territories"],
+#               "options": {"prefix": "Territory_", "start_from": 1}
+#           }
+#       ]
+#   }
+#
+#   Paths are relative to the pipeline file. A file entry may have its own "steps" which replace the shared ones.
+#   "select" replaces the inkscape selection, in the given order:
+#       "id:Layer_Territories" or "Layer_Territories"   the element with exactly that id
+#       "label:Territories"                              every element with exactly that label
+#       "prefix:BonusLink_"                              every element whose id starts with the prefix
+#   "options" are passed to the extension as its --name=value arguments.
+#   "stderr" optionally writes what the step prints (e.g. the command json of the Luthadel contracts) to a file.
+#
+#   Usage: python batch_extensions.py pipeline.json [--dry-run]
+#
+###
+
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import inkex
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_svg_index import SvgIndex
+
+ID_SELECTOR = 'id:'
+LABEL_SELECTOR = 'label:'
+PREFIX_SELECTOR = 'prefix:'
+
+LABEL_ATTRIBUTE = inkex.addNS('label', 'inkscape')
+
+
+class PipelineError(Exception):
+    pass
+
+
+_extension_classes: Dict[str, type] = {}
+
+
+def load_extension_class(path: str) -> type:
+    """
+    Imports an extension script and returns the inkex.EffectExtension subclass it defines
+
+    Each script is imported once per run, however many steps or files use it
+    """
+    path = os.path.abspath(path)
+    if path in _extension_classes:
+        return _extension_classes[path]
+
+    if not os.path.isfile(path):
+        raise PipelineError(f'Extension not found: {path}')
+
+    # several extension scripts share file and class names, so key the module on the full path
+    module_name = f'batch_extension_{hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]}'
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    extension_classes = [
+        value for value in vars(module).values()
+        if isinstance(value, type) and issubclass(value, inkex.EffectExtension) and value.__module__ == module_name
+    ]
+    if len(extension_classes) != 1:
+        raise PipelineError(f'Expected one extension class in {path}, found {len(extension_classes)}')
+
+    _extension_classes[path] = extension_classes[0]
+    return extension_classes[0]
+
+
+def options_to_arguments(options: Dict[str, object]) -> List[str]:
+    """ Converts a step's options into the command line arguments inkscape would pass the extension """
+    arguments = []
+    for name, value in options.items():
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        arguments.append(f'--{name}={value}')
+    return arguments
+
+
+def resolve_selectors(svg_index: SvgIndex, selectors: List[str]) -> List[inkex.BaseElement]:
+    """
+    Finds the elements matching the selectors, in selector order then document order
+
+    Args:
+        svg_index: index of the current document, its tree is walked once for any label selectors
+        selectors: id:, label: or prefix: selectors, a selector without a known prefix is an id
+
+    Returns:
+        the matched elements without duplicates, a PipelineError is raised for a selector with no match
+    """
+    labels = None
+    elements = []
+    seen = set()
+    for selector in selectors:
+        if selector.startswith(LABEL_SELECTOR):
+            if labels is None:
+                labels = {}
+                for element in svg_index.root.iter():
+                    label = element.get(LABEL_ATTRIBUTE)
+                    if label is not None:
+                        labels.setdefault(label, []).append(element)
+            matches = labels.get(selector[len(LABEL_SELECTOR):], [])
+        elif selector.startswith(PREFIX_SELECTOR):
+            matches = svg_index.with_prefix(selector[len(PREFIX_SELECTOR):])
+        else:
+            element_id = selector[len(ID_SELECTOR):] if selector.startswith(ID_SELECTOR) else selector
+            element = svg_index.get(element_id)
+            matches = [element] if element is not None else []
+
+        if len(matches) == 0:
+            raise PipelineError(f'Selector matched nothing: {selector}')
+
+        for element in matches:
+            if id(element) not in seen:
+                seen.add(id(element))
+                elements.append(element)
+    return elements
+
+
+class ExtensionStep:
+    """
+    One configured extension run
+
+    Args:
+        extension: path to the extension script
+        select: selectors for the elements the extension is run on, see resolve_selectors
+        options: the extension's arguments without the leading --
+        stderr: file to write the step's output to, defaults to this script's stderr
+    """
+
+    def __init__(self, extension: str, select: List[str] = None, options: Dict[str, object] = None, stderr: str = None):
+        self.extension = extension
+        self.select = select or []
+        self.options = options or {}
+        self.stderr = stderr
+
+    @classmethod
+    def from_config(cls, config: dict, base_directory: str) -> 'ExtensionStep':
+        if 'extension' not in config:
+            raise PipelineError(f'Step is missing an extension: {config}')
+        stderr = config.get('stderr')
+        return cls(
+            os.path.normpath(os.path.join(base_directory, config['extension'])),
+            config.get('select'),
+            config.get('options'),
+            os.path.normpath(os.path.join(base_directory, stderr)) if stderr else None)
+
+    def __str__(self) -> str:
+        return f'{os.path.basename(self.extension)} {" ".join(self.select)}'.strip()
+
+    def run(self, document):
+        """ Applies the extension to the document in memory and returns the document, which the extension may have replaced """
+        extension = load_extension_class(self.extension)()
+        extension.parse_arguments(options_to_arguments(self.options))
+        extension.document = document
+        extension.svg = document.getroot()
+        extension.svg.selection.set(*resolve_selectors(SvgIndex(extension.svg), self.select))
+
+        with contextlib.ExitStack() as stack:
+            if self.stderr:
+                os.makedirs(os.path.dirname(os.path.abspath(self.stderr)), exist_ok=True)
+                stack.enter_context(contextlib.redirect_stderr(stack.enter_context(open(self.stderr, 'w', encoding='utf-8'))))
+            try:
+                extension.effect()
+            except SystemExit:
+                # halting_message exits after reporting the problem to stderr
+                raise PipelineError(f'Step halted: {self}')
+
+        return extension.document
+
+
+def run_file(input_path: str, output_path: str, steps: List[ExtensionStep], dry_run: bool = False) -> None:
+    start = time.perf_counter()
+    document = inkex.load_svg(input_path)
+    print(f'{input_path}: parsed in {time.perf_counter() - start:.2f}s')
+
+    for step in steps:
+        step_start = time.perf_counter()
+        document = step.run(document)
+        print(f'    {step}: {time.perf_counter() - step_start:.2f}s')
+
+    if dry_run:
+        return
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'wb') as stream:
+        document.write(stream)
+    print(f'{output_path}: written in {time.perf_counter() - start:.2f}s')
+
+
+def run_pipeline(pipeline_path: str, dry_run: bool = False) -> int:
+    """ Runs every file of a pipeline, returning the number of files that failed """
+    with open(pipeline_path, encoding='utf-8') as stream:
+        pipeline = json.load(stream)
+    base_directory = os.path.dirname(os.path.abspath(pipeline_path))
+
+    shared_steps = [ExtensionStep.from_config(step, base_directory) for step in pipeline.get('steps', [])]
+    failures = 0
+    for file in pipeline.get('files', []):
+        input_path = os.path.normpath(os.path.join(base_directory, file['input']))
+        output_path = os.path.normpath(os.path.join(base_directory, file.get('output', file['input'])))
+        try:
+            steps = shared_steps
+            if 'steps' in file:
+                steps = [ExtensionStep.from_config(step, base_directory) for step in file['steps']]
+            run_file(input_path, output_path, steps, dry_run)
+        except (PipelineError, OSError) as error:
+            failures += 1
+            print(f'{input_path}: {error}', file=sys.stderr)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs warzone inkscape extensions over svg files without the inkscape GUI")
+    parser.add_argument("pipeline", help="pipeline json file")
+    parser.add_argument("--dry-run", action="store_true", help="run every step but do not write the output files")
+    args = parser.parse_args()
+
+    sys.exit(1 if run_pipeline(args.pipeline, args.dry_run) else 0)
+
+
+if __name__ == "__main__":
+    main()
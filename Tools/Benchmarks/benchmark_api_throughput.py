@@ -0,0 +1,77 @@
+###
+#   Api Throughput Benchmark
+#
+#   Uploads the commands compiled from a map svg to the local mock Warzone API with the chunked uploader,
+#   downloads the map back through the GameFeed client and checks nothing was lost on the way.
+#
+#   The mock server adds --latency per request and can inject 503s (--http-error-rate) to exercise the retries,
+#   so the numbers show how chunk size and latency bound the upload rate rather than the cost of serialization.
+#
+#   Usage: python benchmark_api_throughput.py [--svg CompletedMaps/Luthadel/Luthadel.svg] [--chunk-sizes 100 500 2000]
+#                                             [--latency 0.05] [--http-error-rate 0.05]
+#
+###
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DuplicateExistingMap"))
+from game_feed_client import GAME_FEED_ENDPOINT, fetch_game_feed
+from map_uploader import SET_MAP_DETAILS_ENDPOINT, ChunkedMapUploader, get_api_url
+from mock_warzone_api import SET_MAP_DETAILS_PATH, MockWarzoneApiServer
+from warzone_map_compiler import compile_map_file
+from warzone_map_diff import SECTION_BONUS_COLORS, MapState, diff_map_states
+
+DEFAULT_SVG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "CompletedMaps", "Luthadel", "Luthadel.svg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times uploads and downloads against the local mock Warzone API")
+    parser.add_argument("--svg", default=DEFAULT_SVG)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--http-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # bonuses without a BonusLink_ get a value so the whole membership set is uploaded
+    compilation = compile_map_file(args.svg, territory_names=True, default_bonus_value=1)
+    commands = list(compilation.commands())
+    desired = MapState.from_commands(commands)
+    print(f"{len(commands)} commands compiled from {os.path.basename(args.svg)}")
+
+    with MockWarzoneApiServer(latency=args.latency, http_error_rate=args.http_error_rate, seed=args.seed) as server:
+        for mapId, chunk_size in enumerate(args.chunk_sizes, start=1):
+            server.api.reset_stats()
+            server.api.http_error_rate = args.http_error_rate
+            uploader = ChunkedMapUploader(
+                "benchmark@example.com", "token", mapId, chunk_size=chunk_size, backoff_seconds=0.01,
+                url=get_api_url(SET_MAP_DETAILS_ENDPOINT, server.base_url))
+            start = time.perf_counter()
+            error, _ = uploader.upload(commands)
+            seconds = time.perf_counter() - start
+            stats = server.api.stats_to_dict()["endpoints"][SET_MAP_DETAILS_PATH]
+            print(f"chunk size {chunk_size:>5}: {seconds:6.2f}s, {len(commands) / seconds:8.0f} commands/s, "
+                  f"{stats['requests']} requests ({stats['failures']} injected failures), "
+                  f"{stats['bytes_in'] / 1024:.0f} KB sent{', error: ' + error if error else ''}")
+
+            # the GameFeed client does not retry, so the round trip check runs without injected failures
+            server.api.http_error_rate = 0.0
+            start = time.perf_counter()
+            jsonData = fetch_game_feed(mapId, "benchmark@example.com", "token", url=get_api_url(GAME_FEED_ENDPOINT, server.base_url))
+            seconds = time.perf_counter() - start
+            if "error" in jsonData:
+                print(f"{'':17} download failed: {jsonData['error']}")
+                continue
+            downloaded = MapState.from_game_feed(jsonData)
+            # GameFeed maps have no bonus colours
+            desired.sections.discard(SECTION_BONUS_COLORS)
+            missing = diff_map_states(downloaded, desired)
+            print(f"{'':17} downloaded back in {seconds:.2f}s, {len(missing)} commands differ")
+
+
+if __name__ == "__main__":
+    main()
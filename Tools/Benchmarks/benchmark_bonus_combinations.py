@@ -0,0 +1,84 @@
+###
+#   Bonus Combinations Benchmark
+#
+#   Compares the peak memory and time of the original luthadel_contracts.py approach
+#   (every combination in a list, deduplicated with set(), every command in a list before output)
+#   against the lazy CombinationBonuses generator in Common/warzone_bonus_combinations.py.
+#
+#   Both validate the commands and stream the payload to os.devnull, so only the generation approach differs.
+#
+#   Usage: python benchmark_bonus_combinations.py [--groups 8] [--group-size 40] [--size 3]
+#
+###
+
+import argparse
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_bonus_combinations import CombinationBonuses
+from warzone_commands import AddBonusCommand, AddTerritoryToBonusCommand, WarzoneSetDetailsPostRequestModel, validate_commands
+
+
+def bonus_name(territories) -> str:
+    return '0Ctr' + '_'.join(str(territory) for territory in territories)
+
+
+def legacy(groups, size, stream) -> int:
+    combinations = []
+    for group in groups:
+        combinations.extend(itertools.combinations(group, size))
+    commands = []
+    for territories in list(set(combinations)):
+        name = bonus_name(territories)
+        commands.append(AddBonusCommand(name, -999))
+        for territory in territories:
+            commands.append(AddTerritoryToBonusCommand(territory, name))
+    validate_commands(commands)
+    WarzoneSetDetailsPostRequestModel('ignore', 'ignore', 0, commands).write_JSON(stream)
+    return len(commands)
+
+
+def generator(groups, size, stream) -> int:
+    bonuses = CombinationBonuses(groups, size, lambda territory: territory, bonus_name, -999)
+    validate_commands(bonuses.commands())
+    WarzoneSetDetailsPostRequestModel('ignore', 'ignore', 0, bonuses.commands()).write_JSON(stream)
+    return bonuses.command_count()
+
+
+def measure(label: str, run, groups, size) -> int:
+    with open(os.devnull, 'w', encoding='utf-8') as stream:
+        tracemalloc.start()
+        start = time.perf_counter()
+        command_count = run(groups, size, stream)
+        seconds = time.perf_counter() - start
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{label:<10} {command_count:>9} commands  peak {peak_bytes / 1024 / 1024:8.1f} MiB  {seconds * 1000:8.1f} ms")
+    return peak_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks combination bonus generation")
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--group-size", type=int, default=40)
+    parser.add_argument("--size", type=int, default=3)
+    args = parser.parse_args()
+
+    groups = [list(range(group * args.group_size, (group + 1) * args.group_size)) for group in range(args.groups)]
+
+    start = time.perf_counter()
+    bonuses = CombinationBonuses(groups, args.size, lambda territory: territory, bonus_name, -999)
+    print(f"counted {bonuses.count()} bonuses, {bonuses.command_count()} commands, "
+          f"about {bonuses.estimate_payload_bytes() / 1024 / 1024:.1f} MiB in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    legacy_bytes = measure("legacy", legacy, groups, args.size)
+    generator_bytes = measure("generator", generator, groups, args.size)
+    print(f"peak memory reduced by a factor of {legacy_bytes / generator_bytes:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+###
+#   Command Memory Benchmark
+#
+#   Compares the memory and serialization time of the original __dict__ based command classes
+#   against the shared __slots__ commands in Common/warzone_commands.py.
+#
+#   The command list mirrors luthadel_contracts.py: every 3 territory combination of each contract group
+#   becomes one AddBonusCommand and three AddTerritoryToBonusCommands.
+#
+#   Usage: python benchmark_command_memory.py [--groups 8] [--group-size 40]
+#
+###
+
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from abc import ABC
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+import warzone_commands
+from warzone_json import write_payload_json
+
+
+class LegacyCommand(ABC):
+    command = ""
+
+
+class LegacyAddBonusCommand(LegacyCommand):
+    def __init__(self, bonus_name, armies):
+        self.command = "addBonus"
+        self.name = bonus_name
+        self.armies = int(armies)
+
+
+class LegacyAddTerritoryToBonusCommand(LegacyCommand):
+    def __init__(self, territory_id, bonus_name):
+        self.command = "addTerritoryToBonus"
+        self.id = int(territory_id)
+        self.bonusName = bonus_name
+
+
+def generate_contract_commands(groups: int, group_size: int, add_bonus, add_territory_to_bonus) -> list:
+    commands = []
+    for group in range(groups):
+        territory_ids = range(group * group_size, (group + 1) * group_size)
+        for a, b, c in itertools.combinations(territory_ids, 3):
+            bonus_name = f'0Ctr{a}_{b}_{c}'
+            commands.append(add_bonus(bonus_name, -999))
+            commands.append(add_territory_to_bonus(a, bonus_name))
+            commands.append(add_territory_to_bonus(b, bonus_name))
+            commands.append(add_territory_to_bonus(c, bonus_name))
+    return commands
+
+
+def measure(label: str, generate, serialize) -> int:
+    tracemalloc.start()
+    start = time.perf_counter()
+    commands = generate()
+    generate_seconds = time.perf_counter() - start
+    generated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    payload_length = serialize(commands)
+    serialize_seconds = time.perf_counter() - start
+
+    print(f"{label:<8} {len(commands):>9} commands  {generated_bytes / 1024 / 1024:8.1f} MiB  "
+          f"generate {generate_seconds * 1000:8.1f} ms  serialize {serialize_seconds * 1000:8.1f} ms  "
+          f"({payload_length / 1024 / 1024:.1f} MiB json)")
+    return generated_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks command list memory")
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--group-size", type=int, default=40)
+    args = parser.parse_args()
+
+    def legacy_serialize(commands):
+        return len(json.dumps({"email": "ignore", "APIToken": "ignore", "mapID": 0, "commands": commands},
+                              default=lambda o: o.__dict__, indent=4))
+
+    def shared_serialize(commands):
+        stream = io.StringIO()
+        write_payload_json(stream, "ignore", "ignore", 0, commands)
+        return stream.tell()
+
+    legacy_bytes = measure(
+        "legacy",
+        lambda: generate_contract_commands(args.groups, args.group_size, LegacyAddBonusCommand, LegacyAddTerritoryToBonusCommand),
+        legacy_serialize)
+    shared_bytes = measure(
+        "slots",
+        lambda: generate_contract_commands(args.groups, args.group_size, warzone_commands.AddBonusCommand, warzone_commands.AddTerritoryToBonusCommand),
+        shared_serialize)
+
+    print(f"memory reduced by a factor of {legacy_bytes / shared_bytes:.2f}")
+
+
+if __name__ == "__main__":
+    main()
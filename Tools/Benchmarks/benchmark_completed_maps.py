@@ -0,0 +1,326 @@
+###
+#   Completed Maps Benchmark
+#
+#   Times the hot paths of the extensions and tools on the real maps under CompletedMaps:
+#       parse           inkex.load_svg of the map
+#       index           building the SvgIndex
+#       lookup          looking up every Territory_ and BonusLink_ id in the index
+#       validate        checking every path of the map for closure, self intersections, zero area and duplicate vertices
+#       compile         compiling the bonuses, memberships and names into commands (warzone_map_compiler)
+#       stream          compiling the same commands from the file, streamed by warzone_svg_scanner instead of parsed
+#       outlines        flattening the Territory_ paths into outlines
+#       connections     territory connections from the outlines
+#       centerpoints    territory centerpoints from the outlines
+#       serialize       writing the compiled commands as a SetMapDetails payload
+#       convert         ConvertClassesToCommands on the map in the shape the GameFeed api returns it
+#       model           building, saving and memory mapping the binary map model of the GameFeed map (warzone_map_model)
+#       graph           distances from 50 starting spots, components, articulation points and bonus borders (warzone_territory_graph)
+#       extension       AddTerritoryToBonus get_elements and modify_elements on the linked bonus with the most territories
+#
+#   Each operation runs --repeat times and its fastest time is kept. Every run is appended to a json history file
+#   in the cache folder (the timings are machine specific, so they stay out of the repository) with the commit it ran on, and compared with the median of the previous --baseline-runs runs on the same machine.
+#   An operation more than --threshold times slower than its baseline (and slower by at least --min-seconds,
+#   so noise on fast operations is ignored) is a regression, and the script exits with 1.
+#
+#   Usage: python benchmark_completed_maps.py [--maps Luthadel ShatteredPlains] [--operations parse compile convert]
+#                                             [--repeat 3] [--threshold 1.25] [--history history.json] [--no-save]
+#
+###
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import inkex
+import numpy as np
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "..", "..")
+sys.path.append(os.path.join(REPOSITORY_DIRECTORY, "Common"))
+sys.path.append(os.path.join(REPOSITORY_DIRECTORY, "Tools", "BatchExtensions"))
+sys.path.append(os.path.join(REPOSITORY_DIRECTORY, "Tools", "DuplicateExistingMap"))
+from batch_extensions import load_extension_class
+from DuplicateExistingMap import ConvertClassesToCommands, ParseResponseForUploadables
+from mock_warzone_api import map_state_to_game_feed
+from warzone_adjacency import territory_connection_commands
+from warzone_cache import get_cache_directory, write_json_atomic
+from warzone_centerpoints import territory_centerpoint_commands
+from warzone_json import write_payload_json
+from warzone_map_compiler import compile_map, compile_map_file
+from warzone_map_diff import MapState
+from warzone_map_model import MAP_MODEL_EXTENSION, MapModel
+from warzone_path_validation import validate_path_data
+from warzone_paths import get_territory_outlines
+from warzone_svg_index import SvgIndex
+from warzone_territory_graph import TerritoryGraph
+
+COMPLETED_MAPS = {
+    "Luthadel": os.path.join("Luthadel", "Luthadel.svg"),
+    "ShatteredPlains": os.path.join("ShatteredPlains", "shatteredplains.svg"),
+    "VengeancePact": os.path.join("VengeancePact", "vengeance_pact_simplified.svg"),
+    "ArrakisGF9": os.path.join("ArrakisGF9", "Arrakis_DuneGF9_Boardgame.svg"),
+}
+ADD_TERRITORY_TO_BONUS_EXTENSION = os.path.join(REPOSITORY_DIRECTORY, "Extensions", "AddTerritoryToBonus", "add_territory_to_bonus.py")
+DEFAULT_HISTORY = get_cache_directory("benchmark_history.json")
+HISTORY_VERSION = 1
+STARTING_SPOTS = 50
+
+
+class MapBenchmark:
+    """ The state the operations of one map share, each operation fills in what the later ones need """
+
+    def __init__(self, svg_path: str):
+        self.svg_path = svg_path
+        self.document = None
+        self.index: Optional[SvgIndex] = None
+        self.compilation = None
+        self.commands: list = []
+        self.outlines: list = []
+        self.connections: list = []
+        self.centerpoints: list = []
+        self.game_feed: Optional[dict] = None
+
+    @property
+    def svg(self):
+        return self.document.getroot()
+
+    def parse(self) -> None:
+        self.document = inkex.load_svg(self.svg_path)
+
+    def build_index(self) -> None:
+        self.index = SvgIndex(self.svg)
+
+    def lookup(self) -> None:
+        element_ids = [element.get_id() for element in self.index.territories() + self.index.bonus_links()]
+        for element_id in element_ids:
+            self.index.get(element_id)
+
+    def run_extension(self) -> Optional[bool]:
+        """ Returns False on maps without a BonusLink_ whose bonus has territories, where there is nothing to select """
+        linked = [name for name, bonus in self.compilation.bonuses.items() if bonus.element_id and self.compilation.members.get(name)]
+        if not linked:
+            return False
+        bonus = self.compilation.bonuses[max(linked, key=lambda name: len(self.compilation.members[name]))]
+        elements = [self.index.get_territory(territory_id) for territory_id in self.compilation.members[bonus.name]]
+        extension = load_extension_class(ADD_TERRITORY_TO_BONUS_EXTENSION)()
+        extension.parse_arguments([])
+        extension.document = self.document
+        extension.svg = self.svg
+        extension.svg.selection.set(self.index.get(bonus.element_id), *[element for element in elements if element is not None])
+        extension.modify_elements(*extension.get_elements())
+
+    def validate_paths(self) -> None:
+        validate_path_data([element.get("d") for element in self.svg.iter(inkex.addNS("path", "svg")) if element.get("d")])
+
+    def compile(self) -> None:
+        self.compilation = compile_map(self.svg, territory_names=True, default_bonus_value=1)
+        self.commands = list(self.compilation.commands())
+
+    def stream_compile(self) -> None:
+        compile_map_file(self.svg_path, territory_names=True, default_bonus_value=1)
+
+    def serialize(self) -> None:
+        write_payload_json(io.StringIO(), "benchmark@example.com", "token", 1, self.commands)
+
+    def convert(self) -> None:
+        state = MapState.from_commands(self.commands + self.connections + self.centerpoints)
+        self.game_feed = map_state_to_game_feed(state, 1)
+        ConvertClassesToCommands(*ParseResponseForUploadables(self.game_feed))
+
+    def build_model(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"map{MAP_MODEL_EXTENSION}")
+            MapModel.from_game_feed(self.game_feed).save(path)
+            model = MapModel.load(path)
+            model.adjacency.sum()
+            del model
+
+    def analyse_graph(self) -> None:
+        graph = TerritoryGraph.from_game_feed(self.game_feed)
+        graph.bfs_distances(np.linspace(0, graph.territory_count - 1, min(STARTING_SPOTS, graph.territory_count), dtype=np.int64))
+        graph.connected_components()
+        graph.articulation_points()
+        graph.bonus_borders()
+
+    def flatten_outlines(self) -> None:
+        self.outlines = get_territory_outlines(self.svg)
+
+    def find_connections(self) -> None:
+        self.connections = list(territory_connection_commands(self.outlines))
+
+    def find_centerpoints(self) -> None:
+        self.centerpoints = list(territory_centerpoint_commands(self.outlines))
+
+
+# in the order they run, each operation relies on the state left by the operations it depends on
+# an operation returning False does not apply to the map and is left out of its results
+OPERATIONS: Dict[str, Callable[[MapBenchmark], Optional[bool]]] = {
+    "parse": MapBenchmark.parse,
+    "index": MapBenchmark.build_index,
+    "lookup": MapBenchmark.lookup,
+    "validate": MapBenchmark.validate_paths,
+    "compile": MapBenchmark.compile,
+    "stream": MapBenchmark.stream_compile,
+    "outlines": MapBenchmark.flatten_outlines,
+    "connections": MapBenchmark.find_connections,
+    "centerpoints": MapBenchmark.find_centerpoints,
+    "serialize": MapBenchmark.serialize,
+    "convert": MapBenchmark.convert,
+    "model": MapBenchmark.build_model,
+    "graph": MapBenchmark.analyse_graph,
+    "extension": MapBenchmark.run_extension,
+}
+DEPENDENCIES: Dict[str, List[str]] = {
+    "index": ["parse"],
+    "lookup": ["index"],
+    "validate": ["parse"],
+    "compile": ["parse"],
+    "outlines": ["parse"],
+    "connections": ["outlines"],
+    "centerpoints": ["outlines"],
+    "serialize": ["compile"],
+    "convert": ["compile", "connections", "centerpoints"],
+    "model": ["convert"],
+    "graph": ["convert"],
+    "extension": ["index", "compile"],
+}
+
+
+def get_required_operations(operations: List[str]) -> Set[str]:
+    required = set()
+    pending = list(operations)
+    while pending:
+        operation = pending.pop()
+        if operation not in required:
+            required.add(operation)
+            pending.extend(DEPENDENCIES.get(operation, []))
+    return required
+
+
+def benchmark_map(svg_path: str, operations: List[str], repeat: int) -> Dict[str, float]:
+    """ Returns the fastest of repeat runs of each operation in seconds, the operations they depend on run once untimed """
+    benchmark = MapBenchmark(svg_path)
+    required = get_required_operations(operations)
+    results = {}
+    for name, operation in OPERATIONS.items():
+        if name not in required:
+            continue
+        if name not in operations:
+            operation(benchmark)
+            continue
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            applies = operation(benchmark) is not False
+            times.append(time.perf_counter() - start)
+        if applies:
+            results[name] = min(times)
+    return results
+
+
+def get_commit() -> (Optional[str], bool):
+    """ Returns the current commit and whether the working tree has uncommitted changes, None outside a git checkout """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status.strip())
+
+
+def get_machine() -> str:
+    """ Identifies the machine and python the timings were taken on, timings are only compared on the same machine """
+    return f"{platform.node()} {platform.machine()} python {platform.python_version()}"
+
+
+def load_history(path: str) -> List[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            history = json.load(f)
+    except FileNotFoundError:
+        return []
+    return history.get("runs", [])
+
+
+def save_history(path: str, runs: List[dict]) -> None:
+    write_json_atomic(path, {"version": HISTORY_VERSION, "runs": runs})
+
+
+def get_baselines(runs: List[dict], machine: str, baseline_runs: int) -> Dict[str, Dict[str, float]]:
+    """ Returns the median of each map's operation over the last baseline_runs runs on the machine """
+    samples: Dict[str, Dict[str, List[float]]] = {}
+    for run in [run for run in runs if run.get("machine") == machine][-baseline_runs:]:
+        for map_name, results in run["results"].items():
+            for operation, seconds in results.items():
+                samples.setdefault(map_name, {}).setdefault(operation, []).append(seconds)
+    return {
+        map_name: {operation: statistics.median(values) for operation, values in operations.items()}
+        for map_name, operations in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the extension and tool hot paths on the completed maps and tracks regressions")
+    parser.add_argument("--maps", nargs="+", choices=list(COMPLETED_MAPS), default=list(COMPLETED_MAPS))
+    parser.add_argument("--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--baseline-runs", type=int, default=5, help="previous runs on this machine whose median is the baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio over the baseline reported as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="slowdowns smaller than this are never regressions")
+    parser.add_argument("--no-save", action="store_true", help="compare with the history without adding this run to it")
+    args = parser.parse_args()
+
+    commit, dirty = get_commit()
+    machine = get_machine()
+    runs = load_history(args.history)
+    baselines = get_baselines(runs, machine, args.baseline_runs)
+
+    results: Dict[str, Dict[str, float]] = {}
+    regressions = []
+    for map_name in args.maps:
+        print(f"{map_name}:")
+        results[map_name] = benchmark_map(os.path.join(REPOSITORY_DIRECTORY, "CompletedMaps", COMPLETED_MAPS[map_name]), args.operations, args.repeat)
+        for operation, seconds in results[map_name].items():
+            baseline = baselines.get(map_name, {}).get(operation)
+            comparison = ""
+            if baseline:
+                ratio = seconds / baseline
+                regressed = ratio > args.threshold and seconds - baseline > args.min_seconds
+                comparison = f"  {ratio:5.2f}x baseline {baseline:8.4f}s{'  REGRESSION' if regressed else ''}"
+                if regressed:
+                    regressions.append(f"{map_name} {operation}: {seconds:.4f}s, {ratio:.2f}x its baseline of {baseline:.4f}s")
+            print(f"    {operation:<13} {seconds:8.4f}s{comparison}")
+
+    if not args.no_save:
+        runs.append({
+            "commit": commit,
+            "dirty": dirty,
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "machine": machine,
+            "repeat": args.repeat,
+            "results": {map_name: {operation: round(seconds, 6) for operation, seconds in operations.items()} for map_name, operations in results.items()},
+        })
+        save_history(args.history, runs)
+        print(f"Recorded the run on {commit or 'an unknown commit'}{' with uncommitted changes' if dirty else ''} in {args.history}")
+
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.threshold}x:")
+        for regression in regressions:
+            print(f"    {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+###
+#   Connection De-duplication Benchmark
+#
+#   Compares the original list based cantor pairing de-duplication used by ConvertClassesToCommands
+#   against the set based ConnectionIndex on a synthetic territory graph.
+#
+#   The synthetic graph is a grid where every territory connects to its 8 neighbours,
+#   with both directions listed as the GameFeed api does.
+#
+#   The list based approach is quadratic so it is only run on a smaller graph by default.
+#
+#   Usage: python benchmark_connection_index.py [--territories 10000] [--legacy-territories 1500]
+#
+###
+
+import argparse
+import math
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_connections import ConnectionIndex
+
+
+def build_grid_graph(territory_count: int) -> Dict[int, List[int]]:
+    """ Builds a square-ish grid where every territory is connected to its 8 neighbours in both directions """
+    width = int(math.ceil(math.sqrt(territory_count)))
+    graph = {}
+    for territory_id in range(territory_count):
+        row, column = divmod(territory_id, width)
+        neighbours = []
+        for d_row in (-1, 0, 1):
+            for d_column in (-1, 0, 1):
+                if d_row == 0 and d_column == 0:
+                    continue
+                n_row, n_column = row + d_row, column + d_column
+                neighbour = n_row * width + n_column
+                if 0 <= n_column < width and 0 <= neighbour < territory_count:
+                    neighbours.append(neighbour)
+        graph[territory_id] = neighbours
+    return graph
+
+
+def legacy_dedup(graph: Dict[int, List[int]]) -> int:
+    """ The original ConvertClassesToCommands approach """
+    def CantorPairingFunction(a: int, b: int) -> int:
+        intA, intB = int(a), int(b)
+        return int((intA + intB) * (intA + intB + 1) / 2 + intA)
+
+    connectionHashes = []
+    emitted = 0
+    for territory_id, connected in graph.items():
+        for connectionId in connected:
+            hash_val = CantorPairingFunction(territory_id, connectionId)
+            if hash_val not in connectionHashes:
+                emitted += 1
+                connectionHashes.append(hash_val)
+    return emitted
+
+
+def index_dedup(graph: Dict[int, List[int]]) -> int:
+    connections = ConnectionIndex()
+    emitted = 0
+    for territory_id, connected in graph.items():
+        for connectionId in connected:
+            if connections.add(territory_id, connectionId):
+                emitted += 1
+    return emitted
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks connection de-duplication")
+    parser.add_argument("--territories", type=int, default=10000)
+    parser.add_argument("--legacy-territories", type=int, default=1500,
+                        help="graph size for the quadratic list based approach, 0 to skip")
+    args = parser.parse_args()
+
+    graph = build_grid_graph(args.territories)
+    directed_edges = sum(len(connected) for connected in graph.values())
+    emitted, seconds = time_call(index_dedup, graph)
+    print(f"ConnectionIndex: {args.territories} territories, {directed_edges} listed connections "
+          f"-> {emitted} commands in {seconds * 1000:.1f} ms")
+
+    if args.legacy_territories:
+        legacy_graph = build_grid_graph(args.legacy_territories)
+        legacy_directed_edges = sum(len(connected) for connected in legacy_graph.values())
+        legacy_emitted, legacy_seconds = time_call(legacy_dedup, legacy_graph)
+        emitted_small, seconds_small = time_call(index_dedup, legacy_graph)
+        print(f"Legacy list:     {args.legacy_territories} territories, {legacy_directed_edges} listed connections "
+              f"-> {legacy_emitted} commands in {legacy_seconds * 1000:.1f} ms")
+        print(f"ConnectionIndex: {args.legacy_territories} territories, {legacy_directed_edges} listed connections "
+              f"-> {emitted_small} commands in {seconds_small * 1000:.1f} ms "
+              f"({legacy_seconds / max(seconds_small, 1e-9):.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
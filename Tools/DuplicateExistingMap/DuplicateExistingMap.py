@@ -18,15 +18,27 @@
 
 from dis import Instruction
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 import os
+import sys
 import json
-import requests
-from traceback import format_exc
 from typing import List
-from abc import ABC
 import webbrowser
-import threading
+from map_uploader import ChunkedMapUploader, DEFAULT_CHUNK_SIZE, is_upload_uncertain
+from game_feed_cache import GameFeedCache
+from game_feed_client import STATUS_CACHED, STATUS_DOWNLOADED, DownloadCancelled, download_games, get_game_map, get_map_save_path, parse_game_ids, validate_map_response
+from task_runner import TaskCancelled, TkTaskRunner
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_connections import ConnectionIndex
+from warzone_commands import Command, AddBonusCommand, AddTerritoryToBonusCommand, AddTerritoryConnectionCommand, \
+    SetTerritoryNameCommand, SetTerritoryCenterpointCommand, validate_commands
+from warzone_map_compiler import compile_map_file
+from warzone_map_diff import MapState, diff_map_states, load_snapshot, save_snapshot
+from warzone_map_model import load_map_json
+
+UPLOAD_FILETYPES = [("Map Files", "*.json *.svg *.wzmap"), ("JSON Files", "*.json"), ("SVG Files", "*.svg"), ("Map Model Files", "*.wzmap")]
+COMPARE_FILETYPES = [("Map Files", "*.json *.wzmap"), ("JSON Files", "*.json"), ("Map Model Files", "*.wzmap")]
 
 
 # =====================================================
@@ -145,6 +157,69 @@ class MapDuplicateSuccessWindow(tk.Toplevel):
         self.destroy()
 
 
+class TaskError(Exception):
+    """An expected failure of a background task, shown to the user in an ErrorWindow."""
+    def __init__(self, title, message, raw_response=None):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+        self.raw_response = raw_response
+
+
+def show_task_error(parent, error, details, title="Exception"):
+    if isinstance(error, TaskError):
+        ErrorWindow(parent, error.title, error.message, raw_response=error.raw_response)
+    else:
+        ErrorWindow(parent, title, details)
+
+
+# =====================================================
+# ==================  TASK PROGRESS ===================
+# =====================================================
+
+class TaskProgress(tk.Frame):
+    """Progress bar, status and cancel button for the background task of a page."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.handle = None
+        self.status = tk.Label(self, text="", anchor="w", width=45)
+        self.status.pack(side="top", fill="x")
+        self.bar = ttk.Progressbar(self, length=300, mode="determinate")
+        self.bar.pack(side="left", pady=2)
+        self.cancel_button = tk.Button(self, text="Cancel", state="disabled", command=self.cancel)
+        self.cancel_button.pack(side="left", padx=5)
+
+    @property
+    def running(self):
+        return self.handle is not None and not self.handle.done
+
+    def start(self, handle, message):
+        self.handle = handle
+        self.cancel_button.configure(state="normal")
+        self.update_progress(0, None, message)
+
+    def update_progress(self, completed, total, message=None):
+        if total:
+            self.bar.stop()
+            self.bar.configure(mode="determinate", maximum=total, value=completed)
+        elif str(self.bar.cget("mode")) != "indeterminate":
+            self.bar.configure(mode="indeterminate")
+            self.bar.start(15)
+        if message:
+            self.status.configure(text=message)
+
+    def finish(self, message=""):
+        self.bar.stop()
+        self.bar.configure(mode="determinate", value=0)
+        self.status.configure(text=message)
+        self.cancel_button.configure(state="disabled")
+
+    def cancel(self):
+        if self.running:
+            self.handle.cancel()
+            self.status.configure(text="Cancelling...")
+
+
 # =====================================================
 # ===============  WARZONE MODEL CLASSES ==============
 # =====================================================
@@ -165,61 +240,6 @@ class QueryGameBonus:
         self.territoryIDs = territoryIDs
 
 
-class Command(ABC):
-    command = ""
-    def to_JSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
-
-
-class WarzoneSetDetailsPostRequestModel:
-    def __init__(self, email, APIToken, mapID, commands):
-        self.email = email
-        self.APIToken = APIToken
-        self.mapID = int(mapID)
-        self.commands = commands
-
-    def to_JSON(self):
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
-
-
-class SetTerritoryNameCommand(Command):
-    def __init__(self, id, territoryName):
-        self.command = "setTerritoryName"
-        self.id = int(id)
-        self.name = territoryName
-
-
-class SetTerritoryCenterpointCommand(Command):
-    def __init__(self, id, x, y):
-        self.command = "setTerritoryCenterPoint"
-        self.id = int(id)
-        self.x = str(x)
-        self.y = str(y)
-
-
-class AddBonusCommand(Command):
-    def __init__(self, bonusName, armies, color="#000000"):
-        self.command = "addBonus"
-        self.name = bonusName
-        self.armies = int(armies)
-        self.color = color
-
-
-class AddTerritoryToBonusCommand(Command):
-    def __init__(self, territoryId, bonusName):
-        self.command = "addTerritoryToBonus"
-        self.id = int(territoryId)
-        self.bonusName = bonusName
-
-
-class AddTerritoryConnectionCommand(Command):
-    def __init__(self, territoryId, territoryId2, wrap="Normal"):
-        self.command = "addTerritoryConnection"
-        self.id1 = int(territoryId)
-        self.id2 = int(territoryId2)
-        self.wrap = wrap
-
-
 # =====================================================
 # =================  HELPER FUNCTIONS =================
 # =====================================================
@@ -236,11 +256,6 @@ def center_window(window):
     window.geometry(f"{width}x{height}+{x}+{y}")
 
 
-def CantorPairingFunction(a: int, b: int) -> int:
-    intA, intB = int(a), int(b)
-    return int((intA + intB) * (intA + intB + 1) / 2 + intA)
-
-
 def ParseResponseForUploadables(mapJson: dict):
     territories = [QueryGameTerritory(**t) for t in mapJson["territories"]]
     bonuses = [QueryGameBonus(**b) for b in mapJson["bonuses"]]
@@ -250,10 +265,10 @@ def ParseResponseForUploadables(mapJson: dict):
 def ConvertClassesToCommands(territories: List[QueryGameTerritory], bonuses: List[QueryGameBonus]) -> List[Command]:
     addBonusCommands, addTerritoryToBonusCommands, addTerritoryConnectionCommands = [], [], []
     setTerritoryNameCommands, setTerritoryCenterpointCommands = [], []
-    connectionHashes = []
+    connections = ConnectionIndex()
 
     for bonus in bonuses:
-        addBonusCommands.append(AddBonusCommand(bonus.name, bonus.value))
+        addBonusCommands.append(AddBonusCommand(bonus.name, bonus.value, "#000000"))
         for territoryId in bonus.territoryIDs:
             addTerritoryToBonusCommands.append(AddTerritoryToBonusCommand(territoryId, bonus.name))
 
@@ -263,20 +278,51 @@ def ConvertClassesToCommands(territories: List[QueryGameTerritory], bonuses: Lis
         setTerritoryCenterpointCommands.append(SetTerritoryCenterpointCommand(territory.id, x, y))
 
         for connectionId in territory.connectedTo:
-            hash_val = CantorPairingFunction(territory.id, connectionId)
-            if hash_val not in connectionHashes:
+            if connections.add(territory.id, connectionId):
                 addTerritoryConnectionCommands.append(AddTerritoryConnectionCommand(territory.id, connectionId))
-                connectionHashes.append(hash_val)
 
     return addBonusCommands + addTerritoryToBonusCommands + addTerritoryConnectionCommands + setTerritoryNameCommands + setTerritoryCenterpointCommands
 
 
-def UploadMap(email: str, token: str, mapId: int, commands: List[Command]) -> str:
-    model = WarzoneSetDetailsPostRequestModel(email, token, mapId, commands)
-    json_string = model.to_JSON()
-    response = requests.post('https://www.warzone.com/API/SetMapDetails', data=json_string)
-    responseJson = response.json()
-    return responseJson.get('error', None), responseJson
+def LoadUploadCommands(file_path: str) -> (List[Command], List[str]):
+    """Returns the commands to upload from a downloaded map JSON or map model, or an annotated map SVG, and any errors that should stop the upload."""
+    if file_path.lower().endswith(".svg"):
+        compilation = compile_map_file(file_path, territory_names=True)
+        return list(compilation.commands()), compilation.errors
+
+    mapJson = load_map_json(file_path)
+    territories, bonuses = ParseResponseForUploadables(mapJson)
+    commands = ConvertClassesToCommands(territories, bonuses)
+    return commands, validate_commands(commands)
+
+
+def LoadCurrentMapState(mapId, compare_path: str = None) -> MapState:
+    """Returns the current state of the map from a downloaded GameFeed map JSON or map model if given, otherwise the snapshot of the last upload to it (None if there is none)."""
+    if compare_path:
+        return MapState.from_game_feed(load_map_json(compare_path))
+    return load_snapshot(mapId)
+
+
+def LoadLiveMapState(compare_path: str, checkpoint_path: str) -> MapState:
+    """Returns the state of the map from a map JSON downloaded after the upload that left checkpoint_path uncertain."""
+    if not compare_path:
+        raise TaskError("Upload Uncertain", "The last upload to this map failed at a chunk that may or may not have been applied.\n"
+                        "Download a game on the new map and select its map JSON in 'Compare With' to upload only what is missing.")
+    if os.path.getmtime(compare_path) < os.path.getmtime(checkpoint_path):
+        raise TaskError("Upload Uncertain", "The map selected in 'Compare With' was downloaded before the last upload failed.\n"
+                        "Download it again so it shows what that upload applied.")
+    return MapState.from_game_feed(load_map_json(compare_path))
+
+
+def UploadMap(email: str, token: str, mapId: int, commands: List[Command], chunk_size: int = DEFAULT_CHUNK_SIZE, checkpoint_path: str = None,
+              on_progress=None, is_cancelled=None) -> str:
+    """Uploads the commands in ordered chunks, resuming from checkpoint_path if a previous upload was interrupted."""
+    uploader = ChunkedMapUploader(email, token, mapId, chunk_size=chunk_size, checkpoint_path=checkpoint_path)
+    return uploader.upload(commands, on_progress=on_progress, is_cancelled=is_cancelled)
+
+
+def GetUploadCheckpointPath(file_path: str, mapId) -> str:
+    return f"{file_path}.{mapId}.upload_checkpoint.json"
 
 
 # =====================================================
@@ -310,13 +356,24 @@ class InstructionsPage(tk.Frame):
             "   - Provide the email and API key for the paid membership account.\n"
             "   - Instructions on where to find the API key will be provided.\n"
             "     Example API token: $z8RMaH0*$tF!q2WELoVu7^9cpBnKsGyZm4\n"
-            "   - This will generate a JSON file with the old map details.\n\n"
+            "   - This will generate a JSON file with the old map details.\n"
+            "   - Several game ids separated by commas, or loaded from a text file with 'File',\n"
+            "     are downloaded at once, with a summary in batch_summary.json.\n\n"
             "Step 4: Duplicate the map.\n"
             "   - Provide the New Map ID where the duplicated map should be uploaded.\n"
             "   - Open the new map in the map designer and get the public link for sharing.\n"
             "   - Extract the numeric ID from the link, e.g., www.warzone.com/SinglePlayer?PreviewMap=108468\n\n"
             "Step 5: Upload the map using the email and API token for the account where the map should be created.\n"
-            "   - Select the JSON file downloaded in Step 3.\n\n"
+            "   - Select the JSON file downloaded in Step 3.\n"
+            "   - Or select a map SVG annotated with the extensions (BonusLink_ labels, bonus_value and\n"
+            "     bonus_parents descriptions) to upload its bonuses and territory names without an old map.\n"
+            "   - Large maps are uploaded in chunks. If an upload is interrupted, uploading the\n"
+            "     same file to the same map again resumes from the first unfinished chunk.\n"
+            "   - If a chunk fails in a way that leaves it unclear whether warzone applied it, download a\n"
+            "     game on the new map again and select it in 'Compare With' to upload only what is missing.\n"
+            "   - After changing the map, tick 'Only upload changes' to send only what changed since\n"
+            "     the last upload to that map. To compare with the map as it is on warzone instead,\n"
+            "     select a map JSON downloaded from a game on the new map in 'Compare With'.\n\n"
             "Step 6: Enjoy your duplicated map!"
         )
 
@@ -342,8 +399,9 @@ class DownloadMapPage(tk.Frame):
         tk.Label(self, text="Download Old Map Details", font=("Arial", 14, "bold")).grid(row=0, column=0, columnspan=3, pady=(0,15))
 
         tk.Label(self, text="Old Map Game ID").grid(row=1, column=0, sticky="w")
-        self.old_map_id = tk.Entry(self, width=45)
-        self.old_map_id.grid(row=1, column=1, columnspan=2, pady=2, sticky="w")
+        self.old_map_id = tk.Entry(self, width=37)
+        self.old_map_id.grid(row=1, column=1, pady=2, sticky="w")
+        tk.Button(self, text="File", width=5, command=self.load_game_ids).grid(row=1, column=2, sticky="w", padx=5)
 
         # Email
         tk.Label(self, text="Email").grid(row=2, column=0, sticky="w")
@@ -365,9 +423,16 @@ class DownloadMapPage(tk.Frame):
         self.download_path.grid(row=4, column=1, pady=2, sticky="w")
         tk.Button(self, text="Browse", command=lambda: self.download_path.insert(0, filedialog.askdirectory())).grid(row=4, column=2, sticky="w", padx=5)
 
+        # Cache
+        self.game_feed_cache = GameFeedCache()
+        self.refresh_cache = tk.BooleanVar(value=False)
+        tk.Checkbutton(self, text="Download again even if the map is cached", variable=self.refresh_cache).grid(row=5, column=0, columnspan=3, sticky="w")
+
         # Buttons
-        tk.Button(self, text="Download", command=self.download_file, width=20).grid(row=5, column=0, columnspan=3, pady=10)
-        tk.Button(self, text="Back", command=lambda: controller.show_frame(MainMenu), width=20).grid(row=6, column=0, columnspan=3)
+        tk.Button(self, text="Download", command=self.download_file, width=20).grid(row=6, column=0, columnspan=3, pady=10)
+        self.progress = TaskProgress(self)
+        self.progress.grid(row=7, column=0, columnspan=3, pady=5)
+        tk.Button(self, text="Back", command=lambda: controller.show_frame(MainMenu), width=20).grid(row=8, column=0, columnspan=3)
 
     def add_entry(self, label_text, show=None):
         tk.Label(self, text=label_text).pack()
@@ -390,32 +455,82 @@ class DownloadMapPage(tk.Frame):
             return False
         return True
 
-    def GetMap(self, gameId: int, email: str, apiToken: str) -> dict:
-        response = requests.get(f'https://www.warzone.com/API/GameFeed?GameID={gameId}&Email={email}&APIToken={apiToken}')
-        return response.json()
-
-    def DownloadMapDetails(self, oldMapGameId: int, email: str, apiKey: str, save_folder: str):
+    def GetMap(self, gameId: int, email: str, apiToken: str, refresh: bool = False, on_progress=None, is_cancelled=None) -> dict:
+        """Returns the GameFeed response for the game, just its map when the map is already cached. Safe to call off the main thread."""
         try:
-            jsonData = self.GetMap(oldMapGameId, email, apiKey)
-            error = jsonData.get("error")
-            if error:
-                ErrorWindow(self, "Error from Warzone API", error, raw_response=json.dumps(jsonData, indent=4))
-                return
-            mapJson = jsonData.get("map")
-            if not mapJson or "territories" not in mapJson or "bonuses" not in mapJson:
-                ErrorWindow(self, "Invalid Map Data", "Map JSON missing 'territories' or 'bonuses'.")
-                return
-            save_path = os.path.join(save_folder, f"{oldMapGameId}_map.json")
-            with open(save_path, "w", encoding="utf-8") as f:
-                json.dump(mapJson, f, indent=4)
-            messagebox.showinfo("Download Complete", f"Map details saved:\n{save_path}")
-        except Exception:
-            ErrorWindow(self, "Download Exception", format_exc())
+            jsonData, _ = get_game_map(gameId, email, apiToken, self.game_feed_cache, refresh, on_progress=on_progress, is_cancelled=is_cancelled)
+        except DownloadCancelled:
+            raise TaskCancelled()
+        return jsonData
+
+    def DownloadMapDetails(self, context, oldMapGameId: int, email: str, apiKey: str, save_folder: str, refresh: bool = False) -> str:
+        """Downloads and saves the map of the game on a worker thread, returning the saved path."""
+        def report(received, total):
+            context.report_progress(received, total, f"Downloading game {oldMapGameId}: {received // 1024} KB")
+
+        jsonData = self.GetMap(oldMapGameId, email, apiKey, refresh=refresh, on_progress=report, is_cancelled=context.is_cancelled)
+        error = validate_map_response(jsonData)
+        if error:
+            raise TaskError("Error from Warzone API" if jsonData.get("error") else "Invalid Map Data", error, raw_response=json.dumps(jsonData, indent=4))
+        save_path = get_map_save_path(save_folder, oldMapGameId)
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(jsonData["map"], f, indent=4)
+        return save_path
+
+    def DownloadManyMapDetails(self, context, gameIds: List[str], email: str, apiKey: str, save_folder: str, refresh: bool = False):
+        """Downloads the maps of several games concurrently on a worker thread, returning the batch summary."""
+        def report(result, finished, total):
+            context.report_progress(finished, total, f"Game {result.gameId} {result.status} ({finished} of {total})")
+
+        return download_games(gameIds, email, apiKey, save_folder, cache=self.game_feed_cache, refresh=refresh,
+                              on_result=report, is_cancelled=context.is_cancelled)
+
+    def load_game_ids(self):
+        path = filedialog.askopenfilename(filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")])
+        if not path:
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            gameIds = parse_game_ids(f.read())
+        self.old_map_id.delete(0, tk.END)
+        self.old_map_id.insert(0, ", ".join(gameIds))
 
     def download_file(self):
+        if self.progress.running:
+            messagebox.showinfo("Download Running", "Wait for the current download to finish or cancel it.")
+            return
         if not self.validate_fields():
             return
-        self.DownloadMapDetails(self.old_map_id.get().strip(), self.email_entry.get().strip(), self.api_key_entry.get().strip(), self.download_path.get().strip())
+
+        gameIds = parse_game_ids(self.old_map_id.get())
+        if not gameIds:
+            ErrorWindow(self, "Invalid Game ID", "Please enter a numeric game id.")
+            return
+
+        def on_success(result):
+            if len(gameIds) == 1:
+                self.progress.finish("Download complete")
+                messagebox.showinfo("Download Complete", f"Map details saved:\n{result}")
+                return
+            # a cancelled batch still reports the games it finished
+            self.progress.finish(f"Downloaded {result.count(STATUS_DOWNLOADED) + result.count(STATUS_CACHED)} of {len(gameIds)} maps")
+            summary = result.format_text()
+            if result.failed:
+                ErrorWindow(self, "Batch Download Finished With Errors", summary, raw_response=json.dumps(result.to_dict(), indent=4))
+            else:
+                messagebox.showinfo("Batch Download Complete", summary)
+
+        def on_error(error, details):
+            self.progress.finish("Download failed")
+            show_task_error(self, error, details, "Download Exception")
+
+        # several ids (typed or loaded from a file) download as a batch
+        work = self.DownloadMapDetails if len(gameIds) == 1 else self.DownloadManyMapDetails
+        handle = self.controller.task_runner.submit(
+            work, gameIds[0] if len(gameIds) == 1 else gameIds, self.email_entry.get().strip(), self.api_key_entry.get().strip(),
+            self.download_path.get().strip(), self.refresh_cache.get(),
+            on_success=on_success, on_error=on_error, on_progress=self.progress.update_progress,
+            on_cancel=lambda: self.progress.finish("Download cancelled"))
+        self.progress.start(handle, "Downloading...")
 
 
 # =====================================================
@@ -452,11 +567,21 @@ class DuplicateMapPage(tk.Frame):
         tk.Label(self, text="File").grid(row=4, column=0, sticky="w")
         self.file_path = tk.Entry(self, width=37)
         self.file_path.grid(row=4, column=1, pady=2, sticky="w")
-        tk.Button(self, text="Browse", command=lambda: self.file_path.insert(0, filedialog.askopenfilename(filetypes=[("JSON Files","*.json")]))).grid(row=4, column=2, sticky="w", padx=5)
+        tk.Button(self, text="Browse", command=lambda: self.file_path.insert(0, filedialog.askopenfilename(filetypes=UPLOAD_FILETYPES))).grid(row=4, column=2, sticky="w", padx=5)
+
+        # Incremental upload
+        self.changes_only = tk.BooleanVar(value=False)
+        tk.Checkbutton(self, text="Only upload changes", variable=self.changes_only).grid(row=5, column=0, columnspan=3, sticky="w")
+        tk.Label(self, text="Compare With").grid(row=6, column=0, sticky="w")
+        self.compare_path = tk.Entry(self, width=37)
+        self.compare_path.grid(row=6, column=1, pady=2, sticky="w")
+        tk.Button(self, text="Browse", command=lambda: self.compare_path.insert(0, filedialog.askopenfilename(filetypes=COMPARE_FILETYPES))).grid(row=6, column=2, sticky="w", padx=5)
 
         # Buttons
-        tk.Button(self, text="Upload", command=self.upload_file, width=20).grid(row=5, column=0, columnspan=3, pady=10)
-        tk.Button(self, text="Back", command=lambda: controller.show_frame(MainMenu), width=20).grid(row=6, column=0, columnspan=3)
+        tk.Button(self, text="Upload", command=self.upload_file, width=20).grid(row=7, column=0, columnspan=3, pady=10)
+        self.progress = TaskProgress(self)
+        self.progress.grid(row=8, column=0, columnspan=3, pady=5)
+        tk.Button(self, text="Back", command=lambda: controller.show_frame(MainMenu), width=20).grid(row=9, column=0, columnspan=3)
 
     def add_entry(self, label_text, show=None):
         tk.Label(self, text=label_text).pack()
@@ -470,7 +595,7 @@ class DuplicateMapPage(tk.Frame):
         frame.pack(pady=3)
         entry = tk.Entry(frame, width=60)
         entry.pack(side="left")
-        tk.Button(frame, text="Browse", command=lambda: entry.insert(0, filedialog.askopenfilename(filetypes=[("JSON Files", "*.json")]))).pack(side="left")
+        tk.Button(frame, text="Browse", command=lambda: entry.insert(0, filedialog.askopenfilename(filetypes=UPLOAD_FILETYPES))).pack(side="left")
         return entry
 
     def validate_fields(self):
@@ -479,33 +604,70 @@ class DuplicateMapPage(tk.Frame):
             return False
         return True
 
+    def UploadMapFile(self, context, new_map_id, email: str, api_key: str, file_path: str, changes_only: bool, compare_path: str):
+        """Compiles, diffs and uploads the file on a worker thread, returning the number of commands uploaded (0 if the map was up to date)."""
+        context.report_progress(0, None, "Reading map file...")
+        commands, validation_errors = LoadUploadCommands(file_path)
+        if validation_errors:
+            raise TaskError("Invalid Commands", "\n".join(validation_errors), raw_response="\n".join(validation_errors))
+        context.raise_if_cancelled()
+
+        # without a snapshot or a map to compare with, everything is uploaded and becomes the first snapshot
+        desired = MapState.from_commands(commands)
+        checkpoint_path = GetUploadCheckpointPath(file_path, new_map_id)
+        uncertain = is_upload_uncertain(checkpoint_path, new_map_id)
+        if uncertain:
+            # posting the failed chunk again could apply its commands twice, only the live map says what is missing
+            current = LoadLiveMapState(compare_path, checkpoint_path)
+        else:
+            current = LoadCurrentMapState(new_map_id, compare_path) if changes_only else None
+        if current is not None:
+            commands = diff_map_states(current, desired)
+        if uncertain:
+            os.remove(checkpoint_path)
+        if current is not None and not commands:
+            save_snapshot(new_map_id, current.merged(desired))
+            return 0
+
+        def report(completed_chunks, total_chunks):
+            context.report_progress(completed_chunks, total_chunks, f"Uploaded chunk {completed_chunks} of {total_chunks}")
+
+        context.report_progress(0, None, f"Uploading {len(commands)} commands...")
+        error, raw_response = UploadMap(email, api_key, new_map_id, commands, checkpoint_path=checkpoint_path,
+                                        on_progress=report, is_cancelled=context.is_cancelled)
+        if error:
+            raise TaskError("Upload Error", error, raw_response=json.dumps(raw_response, indent=4))
+
+        save_snapshot(new_map_id, current.merged(desired) if current is not None else desired)
+        return len(commands)
+
     def upload_file(self):
+        if self.progress.running:
+            messagebox.showinfo("Upload Running", "Wait for the current upload to finish or cancel it.")
+            return
         if not self.validate_fields():
             return
 
         new_map_id = self.new_map_id.get().strip()
-        email = self.email_entry.get().strip()
-        api_key = self.api_key_entry.get().strip()
-        file_path = self.file_path.get().strip()
-
-        def run_upload():
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    mapJson = json.load(f)
 
-                territories, bonuses = ParseResponseForUploadables(mapJson)
-                commands = ConvertClassesToCommands(territories, bonuses)
-                error, raw_response = UploadMap(email, api_key, new_map_id, commands)
-
-                if error:
-                    ErrorWindow(self, "Upload Error", error, raw_response=json.dumps(raw_response, indent=4))
-                    return
+        def on_success(uploaded):
+            if uploaded == 0:
+                self.progress.finish("Map already up to date")
+                messagebox.showinfo("Up To Date", "The map already matches the selected file, nothing was uploaded.")
+                return
+            self.progress.finish(f"Uploaded {uploaded} commands")
+            MapDuplicateSuccessWindow(self, new_map_id)
 
-                MapDuplicateSuccessWindow(self, new_map_id)
-            except Exception:
-                ErrorWindow(self, "Upload Exception", format_exc())
+        def on_error(error, details):
+            self.progress.finish("Upload failed")
+            show_task_error(self, error, details, "Upload Exception")
 
-        threading.Thread(target=run_upload, daemon=True).start()
+        handle = self.controller.task_runner.submit(
+            self.UploadMapFile, new_map_id, self.email_entry.get().strip(), self.api_key_entry.get().strip(),
+            self.file_path.get().strip(), self.changes_only.get(), self.compare_path.get().strip(),
+            on_success=on_success, on_error=on_error, on_progress=self.progress.update_progress,
+            on_cancel=lambda: self.progress.finish("Upload cancelled, uploading again resumes where it stopped"))
+        self.progress.start(handle, "Starting upload...")
 
 
 # =====================================================
@@ -544,6 +706,10 @@ class WarzoneApp(tk.Tk):
         self.title("Warzone Map Tool")
         self.geometry("700x600")  # Wider to fit buttons nicely
 
+        # network calls and uploads run on worker threads so the window stays responsive
+        self.task_runner = TkTaskRunner(self)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
         container = tk.Frame(self)
         container.pack(fill="both", expand=True)
 
@@ -559,6 +725,10 @@ class WarzoneApp(tk.Tk):
         frame = self.frames[page]
         frame.tkraise()
 
+    def on_close(self):
+        self.task_runner.shutdown()
+        self.destroy()
+
 
 if __name__ == "__main__":
     app = WarzoneApp()
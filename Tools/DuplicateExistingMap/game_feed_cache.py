@@ -0,0 +1,155 @@
+###
+#   GameFeed Map Cache
+#
+#   Keeps the maps downloaded from the GameFeed api on disk, so downloading the details of the same game again,
+#   or of another game on the same map, is read from disk instead of the api.
+#
+#   Only the "map" of a response is cached, the rest of a GameFeed response is game state that changes every turn.
+#   Maps are stored once per content hash as gzipped compact json, games point at the map they were played on:
+#       index.json              {"games": {game id: {"mapId", "hash"}}, "maps": {hash: {"bytes", "used"}}, "clock"}
+#       maps/<sha256>.json.gz
+#   When the maps take more than max_bytes the least recently used ones are evicted, along with the games using them.
+#
+###
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_cache import get_cache_directory, write_json_atomic
+
+GAME_FEED_CACHE_DIRECTORY_NAME = 'game_feed'
+INDEX_FILE_NAME = 'index.json'
+MAPS_DIRECTORY_NAME = 'maps'
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+_encoder = json.JSONEncoder(separators=(',', ':'), sort_keys=True)
+
+
+def hash_map(map_json: dict) -> str:
+    """ Hashes the map's content, the same map downloaded through different games hashes the same """
+    return hashlib.sha256(_encoder.encode(map_json).encode('utf-8')).hexdigest()
+
+
+class GameFeedCache:
+    """
+    Size bounded, least recently used on disk cache of GameFeed maps, safe to share between threads
+
+    Usage:
+        cache = GameFeedCache()
+        mapJson = cache.get(gameId)
+        if mapJson is None:
+            mapJson = download(gameId)["map"]
+            cache.put(gameId, mapJson)
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_CACHE_BYTES):
+        self.directory = directory or get_cache_directory(GAME_FEED_CACHE_DIRECTORY_NAME)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional[Dict] = None
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE_NAME)
+
+    def get_map_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, MAPS_DIRECTORY_NAME, f'{content_hash}.json.gz')
+
+    def _load_index(self) -> Dict:
+        if self._index is None:
+            try:
+                with open(self.index_path, encoding='utf-8') as stream:
+                    self._index = json.load(stream)
+                if not isinstance(self._index.get("games"), dict) or not isinstance(self._index.get("maps"), dict):
+                    raise ValueError('Malformed game feed cache index')
+            except (OSError, ValueError, AttributeError):
+                self._index = {"games": {}, "maps": {}, "clock": 0}
+        return self._index
+
+    def _save_index(self) -> None:
+        write_json_atomic(self.index_path, self._index)
+
+    def _touch(self, content_hash: str) -> None:
+        index = self._index
+        index["clock"] = index.get("clock", 0) + 1
+        index["maps"][content_hash]["used"] = index["clock"]
+
+    def get(self, game_id) -> Optional[dict]:
+        """ Returns the cached map of the game, None if it is not cached or its file is unreadable """
+        game_id = str(game_id)
+        with self._lock:
+            index = self._load_index()
+            game = index["games"].get(game_id)
+            if game is None or game["hash"] not in index["maps"]:
+                return None
+            try:
+                with gzip.open(self.get_map_path(game["hash"]), 'rb') as stream:
+                    map_json = json.loads(stream.read().decode('utf-8'))
+            except (OSError, ValueError, EOFError):
+                self._remove_map(game["hash"])
+                self._save_index()
+                return None
+            self._touch(game["hash"])
+            self._save_index()
+            return map_json
+
+    def put(self, game_id, map_json: dict) -> str:
+        """ Caches the map of the game, evicting the least recently used maps beyond max_bytes, returns the map's hash """
+        content_hash = hash_map(map_json)
+        with self._lock:
+            index = self._load_index()
+            if content_hash not in index["maps"]:
+                map_path = self.get_map_path(content_hash)
+                os.makedirs(os.path.dirname(map_path), exist_ok=True)
+                temp_path = f'{map_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with gzip.open(temp_path, 'wb') as stream:
+                    stream.write(_encoder.encode(map_json).encode('utf-8'))
+                os.replace(temp_path, map_path)
+                index["maps"][content_hash] = {"bytes": os.path.getsize(map_path), "used": 0}
+            index["games"][str(game_id)] = {"mapId": map_json.get("id"), "hash": content_hash}
+            self._touch(content_hash)
+            self._evict(keep=content_hash)
+            self._save_index()
+        return content_hash
+
+    def _remove_map(self, content_hash: str) -> None:
+        self._index["maps"].pop(content_hash, None)
+        self._index["games"] = {game_id: game for game_id, game in self._index["games"].items() if game["hash"] != content_hash}
+        try:
+            os.remove(self.get_map_path(content_hash))
+        except OSError:
+            pass
+
+    def _evict(self, keep: str) -> None:
+        maps = self._index["maps"]
+        total = sum(entry["bytes"] for entry in maps.values())
+        for content_hash in sorted(maps, key=lambda cached: maps[cached]["used"]):
+            if total <= self.max_bytes:
+                break
+            if content_hash == keep:
+                continue
+            total -= maps[content_hash]["bytes"]
+            self._remove_map(content_hash)
+
+    def remove(self, game_id) -> None:
+        """ Forgets the game, its map stays cached for other games on the same map until it is evicted """
+        with self._lock:
+            if self._load_index()["games"].pop(str(game_id), None) is not None:
+                self._save_index()
+
+    def clear(self) -> None:
+        with self._lock:
+            for content_hash in list(self._load_index()["maps"]):
+                self._remove_map(content_hash)
+            self._index = {"games": {}, "maps": {}, "clock": 0}
+            self._save_index()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._load_index()["maps"].values())
@@ -0,0 +1,285 @@
+###
+#   GameFeed Client
+#
+#   Downloads the maps of games from the GameFeed api, one at a time for the download page
+#   or many at once for archiving a batch of source maps.
+#
+#   A batch runs on a bounded thread pool sharing one pooled requests session, so connections to the api are reused.
+#   Requests to a host are spaced by a token bucket rate limiter shared by the workers, maps already in the
+#   GameFeedCache skip the api (and the limiter) entirely. Each map is written as soon as it arrives,
+#   and a summary of every game's outcome is written next to them as batch_summary.json.
+#   With --binary each map is also written as a memory mapped map model (<game id>_map.wzmap, see Common/warzone_map_model.py).
+#
+#   Usage: python game_feed_client.py --email you@example.com --token TOKEN --output maps 123456 234567
+#          python game_feed_client.py --email you@example.com --token TOKEN --output maps --ids-file game_ids.txt [--binary]
+#
+###
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from game_feed_cache import GameFeedCache
+from map_uploader import create_session, get_api_url
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_map_model import MapModel, get_map_model_path
+
+GAME_FEED_ENDPOINT = 'GameFeed'
+
+DOWNLOAD_BLOCK_BYTES = 64 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 60
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+SUMMARY_FILE_NAME = 'batch_summary.json'
+
+STATUS_DOWNLOADED = 'downloaded'
+STATUS_CACHED = 'cached'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+
+_GAME_ID_PATTERN = re.compile(r'\d+')
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+def parse_game_ids(text: str) -> List[str]:
+    """ Returns the game ids in text separated by anything, in order and without repeats """
+    return list(dict.fromkeys(_GAME_ID_PATTERN.findall(text)))
+
+
+def get_map_save_path(save_folder: str, gameId) -> str:
+    return os.path.join(save_folder, f"{gameId}_map.json")
+
+
+class HostRateLimiter:
+    """ Token bucket per host, shared by threads: at most burst requests at once, then requests_per_second """
+
+    def __init__(self, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND, burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        # host -> time at which the bucket is full again
+        self._full_at: Dict[str, float] = {}
+
+    def acquire(self, url: str) -> None:
+        if self.interval == 0.0:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = self.clock()
+            full_at = max(self._full_at.get(host, now), now)
+            # taking a token pushes the full time one interval later, wait while that is more than a burst ahead
+            wait = full_at + self.interval - now - self.burst * self.interval
+            self._full_at[host] = full_at + self.interval
+        if wait > 0:
+            self.sleep(wait)
+
+
+def fetch_game_feed(
+        gameId, email: str, apiToken: str,
+        session: Optional[requests.Session] = None,
+        url: Optional[str] = None,
+        on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None) -> dict:
+    """ Streams the GameFeed response of the game, reporting (received bytes, total bytes or None) """
+    url = url or get_api_url(GAME_FEED_ENDPOINT)
+    params = {"GameID": gameId, "Email": email, "APIToken": apiToken}
+    with (session or requests).get(url, params=params, stream=True, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+        total = int(response.headers.get("Content-Length") or 0) or None
+        body = bytearray()
+        for block in response.iter_content(DOWNLOAD_BLOCK_BYTES):
+            if is_cancelled and is_cancelled():
+                raise DownloadCancelled()
+            body.extend(block)
+            if on_progress:
+                on_progress(len(body), total)
+    return json.loads(body)
+
+
+def get_game_map(
+        gameId, email: str, apiToken: str,
+        cache: Optional[GameFeedCache] = None,
+        refresh: bool = False,
+        url: Optional[str] = None,
+        limiter: Optional[HostRateLimiter] = None,
+        **fetch_arguments) -> (dict, bool):
+    """
+    Returns the GameFeed response for the game and whether it came from the cache
+
+    A cached game's response only holds its map, a downloaded response with a map is added to the cache.
+    Only requests that reach the api wait for the limiter.
+    """
+    if cache is not None and not refresh:
+        mapJson = cache.get(gameId)
+        if mapJson is not None:
+            return {"map": mapJson}, True
+    url = url or get_api_url(GAME_FEED_ENDPOINT)
+    if limiter is not None:
+        limiter.acquire(url)
+    jsonData = fetch_game_feed(gameId, email, apiToken, url=url, **fetch_arguments)
+    if cache is not None and not jsonData.get("error") and isinstance(jsonData.get("map"), dict):
+        cache.put(gameId, jsonData["map"])
+    return jsonData, False
+
+
+def validate_map_response(jsonData: dict) -> Optional[str]:
+    """ Returns why the response holds no usable map, None if it does """
+    if jsonData.get("error"):
+        return str(jsonData["error"])
+    mapJson = jsonData.get("map")
+    if not mapJson or "territories" not in mapJson or "bonuses" not in mapJson:
+        return "Map JSON missing 'territories' or 'bonuses'."
+    return None
+
+
+class GameDownloadResult(NamedTuple):
+    gameId: str
+    status: str
+    path: Optional[str]
+    error: Optional[str]
+    seconds: float
+
+
+class BatchDownloadSummary:
+    def __init__(self, results: List[GameDownloadResult], seconds: float):
+        self.results = results
+        self.seconds = seconds
+
+    def count(self, status: str) -> int:
+        return sum(1 for result in self.results if result.status == status)
+
+    @property
+    def failed(self) -> List[GameDownloadResult]:
+        return [result for result in self.results if result.status == STATUS_FAILED]
+
+    def to_dict(self) -> dict:
+        return {
+            "seconds": round(self.seconds, 3),
+            "counts": {status: self.count(status) for status in (STATUS_DOWNLOADED, STATUS_CACHED, STATUS_FAILED, STATUS_CANCELLED)},
+            "games": [result._asdict() for result in self.results],
+        }
+
+    def format_text(self) -> str:
+        lines = [
+            f"{len(self.results)} games in {self.seconds:.1f}s: {self.count(STATUS_DOWNLOADED)} downloaded, "
+            f"{self.count(STATUS_CACHED)} from cache, {self.count(STATUS_FAILED)} failed, {self.count(STATUS_CANCELLED)} cancelled"]
+        lines.extend(f"  {result.gameId}: {result.error}" for result in self.failed)
+        return "\n".join(lines)
+
+
+def download_games(
+        gameIds: Iterable, email: str, apiToken: str, save_folder: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        cache: Optional[GameFeedCache] = None,
+        refresh: bool = False,
+        session: Optional[requests.Session] = None,
+        url: Optional[str] = None,
+        on_result: Optional[Callable[[GameDownloadResult, int, int], None]] = None,
+        is_cancelled: Optional[Callable[[], bool]] = None,
+        write_model: bool = False) -> BatchDownloadSummary:
+    """
+    Downloads and saves the maps of the games concurrently, failures are recorded in the summary rather than raised
+
+    Args:
+        write_model: also save each map as a map model, next to its json
+        on_result: called with (result, finished count, game count) as each game finishes, on the calling thread
+        is_cancelled: checked before each request and between blocks, unfinished games are reported as cancelled
+
+    Returns:
+        BatchDownloadSummary: the results in the order of gameIds, also written to batch_summary.json in save_folder
+    """
+    gameIds = [str(gameId) for gameId in gameIds]
+    url = url or get_api_url(GAME_FEED_ENDPOINT)
+    os.makedirs(save_folder, exist_ok=True)
+    session = session or create_session(pool_size=max_workers)
+    limiter = HostRateLimiter(requests_per_second, burst=max_workers)
+    start = time.perf_counter()
+
+    def download(gameId: str) -> GameDownloadResult:
+        game_start = time.perf_counter()
+        try:
+            if is_cancelled and is_cancelled():
+                raise DownloadCancelled()
+            jsonData, from_cache = get_game_map(
+                gameId, email, apiToken, cache, refresh, url=url, limiter=limiter, session=session, is_cancelled=is_cancelled)
+            error = validate_map_response(jsonData)
+            if error:
+                return GameDownloadResult(gameId, STATUS_FAILED, None, error, time.perf_counter() - game_start)
+            save_path = get_map_save_path(save_folder, gameId)
+            with open(save_path, "w", encoding="utf-8") as f:
+                json.dump(jsonData["map"], f, indent=4)
+            if write_model:
+                MapModel.from_game_feed(jsonData["map"]).save(get_map_model_path(save_path))
+            status = STATUS_CACHED if from_cache else STATUS_DOWNLOADED
+            return GameDownloadResult(gameId, status, save_path, None, time.perf_counter() - game_start)
+        except DownloadCancelled:
+            return GameDownloadResult(gameId, STATUS_CANCELLED, None, None, time.perf_counter() - game_start)
+        except Exception as e:
+            return GameDownloadResult(gameId, STATUS_FAILED, None, repr(e), time.perf_counter() - game_start)
+
+    results: Dict[str, GameDownloadResult] = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='game-feed') as executor:
+        futures = [executor.submit(download, gameId) for gameId in gameIds]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.gameId] = result
+            if on_result:
+                on_result(result, len(results), len(gameIds))
+
+    summary = BatchDownloadSummary([results[gameId] for gameId in gameIds], time.perf_counter() - start)
+    with open(os.path.join(save_folder, SUMMARY_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(summary.to_dict(), f, indent=4)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downloads the maps of several games from the GameFeed api at once")
+    parser.add_argument("game_ids", nargs="*", help="game ids of games on the maps to download")
+    parser.add_argument("--ids-file", help="text file of game ids, separated by anything")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--output", required=True, help="folder the <game id>_map.json files and the summary are written to")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--requests-per-second", type=float, default=DEFAULT_REQUESTS_PER_SECOND)
+    parser.add_argument("--refresh", action="store_true", help="download games even if their map is cached")
+    parser.add_argument("--api-url", help="api base url, defaults to WARZONE_API_URL or the Warzone API")
+    parser.add_argument("--binary", action="store_true", help="also write each map as a <game id>_map.wzmap map model")
+    args = parser.parse_args()
+
+    gameIds = list(args.game_ids)
+    if args.ids_file:
+        with open(args.ids_file, encoding="utf-8") as f:
+            gameIds.extend(parse_game_ids(f.read()))
+    gameIds = list(dict.fromkeys(gameIds))
+    if not gameIds:
+        parser.error("no game ids given")
+
+    def report(result, finished, total):
+        print(f"[{finished}/{total}] {result.gameId} {result.status} {result.error or ''}".rstrip(), file=sys.stderr)
+
+    summary = download_games(
+        gameIds, args.email, args.token, args.output,
+        max_workers=args.workers, requests_per_second=args.requests_per_second,
+        cache=GameFeedCache(), refresh=args.refresh, url=get_api_url(GAME_FEED_ENDPOINT, args.api_url), on_result=report,
+        write_model=args.binary)
+    print(summary.format_text())
+    sys.exit(1 if summary.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+###
+#   Chunked Map Uploader
+#
+#   Splits a list of SetMapDetails commands into ordered chunks and posts them one at a time
+#   over a pooled requests session.
+#
+#   A chunk is only retried, with exponential backoff, when the api cannot have applied it: failures to connect,
+#   429 and 503 responses. Commands are not idempotent (a second addBonus fails with "already exists"), so a chunk
+#   that may have reached the api (a read timeout, a dropped connection, another 5xx) is never posted again.
+#   Progress is written to a checkpoint file after every successful chunk, so an interrupted upload resumes
+#   at the first chunk that did not finish. After a chunk that may or may not have been applied the checkpoint
+#   is marked uncertain and refuses to resume, the caller has to diff against the live map instead.
+#
+#   Errors reported by the Warzone API itself are not retried, they are returned to the caller
+#   in the same (error, responseJson) shape UploadMap has always used.
+#
+#   The api is https://www.warzone.com/API unless WARZONE_API_URL points somewhere else,
+#   e.g. at the local mock server (mock_warzone_api.py) for offline tests and benchmarks.
+#
+###
+
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Callable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_json import encode_command, payload_to_bytes
+
+API_URL_ENVIRONMENT_VARIABLE = 'WARZONE_API_URL'
+DEFAULT_API_URL = 'https://www.warzone.com/API'
+SET_MAP_DETAILS_ENDPOINT = 'SetMapDetails'
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 1.0
+DEFAULT_TIMEOUT_SECONDS = 60
+# responses to requests the api turned away before applying any command
+RETRYABLE_STATUS_CODES = {429, 503}
+
+
+class UncertainChunkError(Exception):
+    """ A chunk failed in a way that does not say whether the api applied it """
+
+
+def get_api_url(endpoint: str, base_url: Optional[str] = None) -> str:
+    """ Returns the url of an api endpoint under base_url, WARZONE_API_URL or the Warzone API, in that order """
+    base_url = base_url or os.environ.get(API_URL_ENVIRONMENT_VARIABLE) or DEFAULT_API_URL
+    return f'{base_url.rstrip("/")}/{endpoint}'
+
+
+def chunk_commands(commands: List, chunk_size: int) -> List[List]:
+    """ Splits the commands into ordered chunks of at most chunk_size commands """
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be at least 1, got {chunk_size}')
+    return [commands[i:i + chunk_size] for i in range(0, len(commands), chunk_size)]
+
+
+def hash_commands(commands: List) -> str:
+    """ Hashes a command list so a checkpoint can only be resumed against the same commands """
+    digest = hashlib.sha256()
+    for command in commands:
+        digest.update(encode_command(command).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def is_connect_failure(error: Exception) -> bool:
+    """ True if the request never reached the api, so posting it again cannot apply anything twice """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying failure
+    reason = getattr(error.args[0], 'reason', error.args[0]) if error.args else None
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def is_upload_uncertain(checkpoint_path: Optional[str], mapId: int) -> bool:
+    """ True if the last upload to the map stopped at a chunk the api may or may not have applied """
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return False
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return stored.get("mapId") == int(mapId) and bool(stored.get("uncertain"))
+
+
+def create_session(pool_size: int = 4) -> requests.Session:
+    """ Creates a session that keeps its connections to the Warzone API alive between chunks """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class UploadCheckpoint:
+    """ Records which chunks of an upload have been accepted by the api """
+
+    def __init__(self, path: Optional[str], mapId: int, commandsHash: str, chunkSize: int, chunkCount: int):
+        self.path = path
+        self.mapId = int(mapId)
+        self.commandsHash = commandsHash
+        self.chunkSize = chunkSize
+        self.chunkCount = chunkCount
+        self.completedChunks = 0
+        # the chunk after the completed ones failed and may have been applied
+        self.uncertain = False
+
+    def load(self) -> None:
+        """ Restores progress from disk if the stored checkpoint describes this exact upload """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if stored.get("mapId") == self.mapId \
+                and stored.get("commandsHash") == self.commandsHash \
+                and stored.get("chunkSize") == self.chunkSize:
+            self.completedChunks = min(int(stored.get("completedChunks", 0)), self.chunkCount)
+            self.uncertain = bool(stored.get("uncertain", False))
+
+    def save(self) -> None:
+        """ Writes progress atomically so a crash mid-write never corrupts the checkpoint """
+        if not self.path:
+            return
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "mapId": self.mapId,
+                "commandsHash": self.commandsHash,
+                "chunkSize": self.chunkSize,
+                "chunkCount": self.chunkCount,
+                "completedChunks": self.completedChunks,
+                "uncertain": self.uncertain,
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def remove(self) -> None:
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.completedChunks >= self.chunkCount
+
+
+class ChunkedMapUploader:
+    """ Uploads commands to the SetMapDetails api in ordered, retried, resumable chunks """
+
+    def __init__(
+            self,
+            email: str,
+            token: str,
+            mapId: int,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            max_retries: int = DEFAULT_MAX_RETRIES,
+            backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+            timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+            checkpoint_path: Optional[str] = None,
+            session: Optional[requests.Session] = None,
+            url: Optional[str] = None,
+            sleep: Callable[[float], None] = time.sleep):
+        self.email = email
+        self.token = token
+        self.mapId = int(mapId)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.checkpoint_path = checkpoint_path
+        self.session = session or create_session()
+        self.url = url or get_api_url(SET_MAP_DETAILS_ENDPOINT)
+        self.sleep = sleep
+
+    def build_body(self, chunk: List) -> bytes:
+        """ Streams the chunk through the compact encoder, the body is bounded by chunk_size """
+        return payload_to_bytes(self.email, self.token, self.mapId, chunk)
+
+    def post_chunk(self, chunk: List) -> dict:
+        """
+        Posts a single chunk, retrying failures to connect, 429 and 503 with exponential backoff
+
+        Returns:
+            dict: the api's json response
+
+        Raises:
+            ConnectionError: the api could not be reached within max_retries, nothing was applied
+            UncertainChunkError: the chunk may have been applied, it must not be posted again
+        """
+        body = self.build_body(chunk)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.url, data=body, timeout=self.timeout_seconds)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not is_connect_failure(e):
+                    raise UncertainChunkError(repr(e)) from e
+                failure = repr(e)
+            else:
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    failure = f'HTTP {response.status_code}'
+                else:
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        raise UncertainChunkError(f'HTTP {response.status_code}: {e!r}') from e
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise ConnectionError(f'Chunk upload failed after {self.max_retries} retries: {failure}')
+            self.sleep(self.backoff_seconds * (2 ** (attempt - 1)))
+
+    def upload(
+            self,
+            commands: List,
+            on_progress: Optional[Callable[[int, int], None]] = None,
+            is_cancelled: Optional[Callable[[], bool]] = None):
+        """
+        Uploads the commands, resuming from the checkpoint if one matches
+
+        Args:
+            commands (List): the ordered commands to upload
+            on_progress (Callable[[int, int], None]): called with (completed chunks, total chunks) after each chunk
+            is_cancelled (Callable[[], bool]): checked before each chunk, a cancelled upload keeps its checkpoint to resume later
+
+        Returns:
+            (str, dict): the api error (None on success) and the last api response.
+                A chunk that may have been applied is reported with its index as "uncertainChunk"
+        """
+        if is_upload_uncertain(self.checkpoint_path, self.mapId):
+            return ('The last upload to this map failed at a chunk that may or may not have been applied. '
+                    'Compare with the map as it is now rather than resuming it'), {}
+
+        chunks = chunk_commands(commands, self.chunk_size)
+        checkpoint = UploadCheckpoint(self.checkpoint_path, self.mapId, hash_commands(commands), self.chunk_size, len(chunks))
+        checkpoint.load()
+
+        responseJson = {}
+        for index in range(checkpoint.completedChunks, len(chunks)):
+            if is_cancelled and is_cancelled():
+                return f'Upload cancelled after {index} of {len(chunks)} chunks', responseJson
+            try:
+                responseJson = self.post_chunk(chunks[index])
+            except UncertainChunkError as e:
+                checkpoint.uncertain = True
+                checkpoint.save()
+                return f'Chunk {index + 1} of {len(chunks)} may or may not have been applied: {e}', {"uncertainChunk": index}
+            error = responseJson.get('error', None)
+            if error:
+                responseJson["failedChunk"] = index
+                return error, responseJson
+
+            checkpoint.completedChunks = index + 1
+            checkpoint.save()
+            if on_progress:
+                on_progress(checkpoint.completedChunks, len(chunks))
+
+        checkpoint.remove()
+        return None, responseJson
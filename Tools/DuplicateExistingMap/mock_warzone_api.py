@@ -0,0 +1,334 @@
+###
+#   Mock Warzone API
+#
+#   A local stand in for the SetMapDetails and GameFeed endpoints, so uploads and downloads can be tested
+#   and benchmarked offline at Luthadel scale without touching the real service.
+#
+#   SetMapDetails parses and validates every command of a request, checks it against the state of the map
+#   built by the earlier requests (no addTerritoryToBonus before its addBonus, no removing missing bonuses)
+#   and applies the request only if all of it is valid, answering {"error": ...} otherwise as the api does.
+#   GameFeed serves <game id>_map.json files from a folder, or the state uploaded to the map with the same id.
+#
+#   Latency, http failures (503, retried by the uploader) and api errors can be injected,
+#   and request, command and byte counts are recorded, served as json on GET /stats.
+#
+#   Point the tools at it with WARZONE_API_URL=http://127.0.0.1:8765/API
+#
+#   Usage: python mock_warzone_api.py [--port 8765] [--latency 0.1] [--jitter 0.05] [--http-error-rate 0.05]
+#                                     [--api-error-rate 0] [--maps-folder downloaded_maps] [--seed 1]
+#
+###
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_commands import (
+    AddBonusCommand, AddTerritoryToBonusCommand, Command, RemoveBonusCommand, RemoveTerritoryFromBonusCommand,
+    UpdateBonusCommand, command_from_dict, validate_commands)
+from warzone_map_diff import MapState
+
+DEFAULT_PORT = 8765
+API_PATH = '/API/'
+SET_MAP_DETAILS_PATH = '/API/SetMapDetails'
+GAME_FEED_PATH = '/API/GameFeed'
+STATS_PATH = '/stats'
+
+
+class EndpointStats:
+    __slots__ = ("requests", "failures", "api_errors", "commands", "bytes_in", "bytes_out", "seconds")
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, 0)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class MockWarzoneApi:
+    """ The state, fault injection settings and statistics behind the mock server, shared by its handler threads """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            http_error_rate: float = 0.0,
+            api_error_rate: float = 0.0,
+            maps_folder: Optional[str] = None,
+            seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.http_error_rate = http_error_rate
+        self.api_error_rate = api_error_rate
+        self.maps_folder = maps_folder
+        self.maps: Dict[int, MapState] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = {SET_MAP_DETAILS_PATH: EndpointStats(), GAME_FEED_PATH: EndpointStats()}
+            self.started = time.perf_counter()
+
+    def stats_to_dict(self) -> dict:
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            uploads = self.stats[SET_MAP_DETAILS_PATH]
+            return {
+                "seconds": round(elapsed, 3),
+                "commandsPerSecond": round(uploads.commands / elapsed, 1) if elapsed > 0 else 0.0,
+                "endpoints": {path: stats.to_dict() for path, stats in self.stats.items()},
+            }
+
+    def draw_faults(self) -> (float, bool, bool):
+        """ Returns this request's delay and whether it fails with a 503 or an api error """
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            http_error = self._random.random() < self.http_error_rate
+            api_error = not http_error and self._random.random() < self.api_error_rate
+        return delay, http_error, api_error
+
+    def record(self, path: str, **increments) -> None:
+        with self._lock:
+            stats = self.stats[path]
+            for field, value in increments.items():
+                setattr(stats, field, getattr(stats, field) + value)
+
+    def set_map_details(self, payload: dict) -> dict:
+        """ Validates and applies a SetMapDetails payload, all or nothing """
+        if not payload.get("email") or not payload.get("APIToken"):
+            return {"error": "Missing email or APIToken"}
+        try:
+            mapId = int(payload["mapID"])
+            commands = [command_from_dict(values) for values in payload["commands"]]
+        except (KeyError, TypeError, ValueError) as e:
+            return {"error": f"Malformed request: {e}"}
+
+        errors = validate_commands(commands)
+        if errors:
+            return {"error": errors[0]}
+        with self._lock:
+            state = self.maps.get(mapId) or MapState()
+            error = check_commands_against_state(state, commands)
+            if error:
+                return {"error": error}
+            state.apply(commands)
+            self.maps[mapId] = state
+        return {"success": True, "commandsApplied": len(commands)}
+
+    def game_feed(self, gameId: str) -> dict:
+        """ Returns the GameFeed response for a game, from the maps folder or the map uploaded with the same id """
+        if self.maps_folder:
+            path = os.path.join(self.maps_folder, f"{gameId}_map.json")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    return {"id": gameId, "map": json.load(f)}
+        if not gameId.isdigit():
+            return {"error": f"GameID {gameId} not found"}
+        with self._lock:
+            state = self.maps.get(int(gameId))
+            if state is None:
+                return {"error": f"GameID {gameId} not found"}
+            return {"id": gameId, "map": map_state_to_game_feed(state, int(gameId))}
+
+
+def check_commands_against_state(state: MapState, commands: List[Command]) -> Optional[str]:
+    """ Returns the first command that does not fit the map state as the commands before it leave it """
+    bonuses = set(state.bonuses)
+    for command in commands:
+        command_type = type(command)
+        if command_type is AddBonusCommand:
+            if command.name in bonuses:
+                return f"Bonus {command.name} already exists"
+            bonuses.add(command.name)
+        elif command_type is UpdateBonusCommand:
+            if command.name not in bonuses:
+                return f"Bonus {command.name} does not exist"
+            if command.newName is not None and command.newName != command.name:
+                if command.newName in bonuses:
+                    return f"Bonus {command.newName} already exists"
+                bonuses.discard(command.name)
+                bonuses.add(command.newName)
+        elif command_type is RemoveBonusCommand:
+            if command.name not in bonuses:
+                return f"Bonus {command.name} does not exist"
+            bonuses.discard(command.name)
+        elif command_type is AddTerritoryToBonusCommand or command_type is RemoveTerritoryFromBonusCommand:
+            if command.bonusName not in bonuses:
+                return f"Bonus {command.bonusName} does not exist"
+    return None
+
+
+def map_state_to_game_feed(state: MapState, mapId: int) -> dict:
+    """ Renders an uploaded map state in the shape of a GameFeed map """
+    territory_ids = set(state.names) | set(state.centerpoints)
+    for members in state.members.values():
+        territory_ids.update(members)
+    for id1, id2 in state.connections:
+        territory_ids.update((id1, id2))
+    connected: Dict[int, List[int]] = {territory_id: [] for territory_id in territory_ids}
+    for id1, id2 in state.connections:
+        connected[id1].append(id2)
+        connected[id2].append(id1)
+
+    territories = []
+    for territory_id in sorted(territory_ids):
+        x, y = state.centerpoints.get(territory_id, (0.0, 0.0))
+        territories.append({
+            "id": territory_id,
+            "name": state.names.get(territory_id, f"Territory {territory_id}"),
+            "connectedTo": connected[territory_id],
+            "coords": f"{x},{y}",
+        })
+    bonuses = [
+        {"id": index, "name": name, "value": armies, "territoryIDs": list(state.members.get(name, ()))}
+        for index, (name, (armies, _)) in enumerate(state.bonuses.items(), start=1)
+    ]
+    return {"id": mapId, "name": f"Mock map {mapId}", "territories": territories, "bonuses": bonuses}
+
+
+class MockWarzoneApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def api(self) -> MockWarzoneApi:
+        return self.server.api
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, value) -> int:
+        body = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def run_endpoint(self, path: str, bytes_in: int, respond) -> None:
+        start = time.perf_counter()
+        delay, http_error, api_error = self.api.draw_faults()
+        if delay > 0:
+            time.sleep(delay)
+        if http_error:
+            bytes_out = self.send_json(503, {"error": "Injected service unavailable"})
+            self.api.record(path, requests=1, failures=1, bytes_in=bytes_in, bytes_out=bytes_out, seconds=time.perf_counter() - start)
+            return
+        if api_error:
+            response, commands = {"error": "Injected api error"}, 0
+        else:
+            response, commands = respond()
+        bytes_out = self.send_json(200, response)
+        self.api.record(
+            path, requests=1, api_errors=1 if "error" in response else 0, commands=commands,
+            bytes_in=bytes_in, bytes_out=bytes_out, seconds=time.perf_counter() - start)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if path != SET_MAP_DETAILS_PATH:
+            self.send_json(404, {"error": f"Unknown endpoint {path}"})
+            return
+
+        def respond():
+            try:
+                payload = json.loads(body)
+            except ValueError as e:
+                return {"error": f"Malformed json: {e}"}, 0
+            response = self.api.set_map_details(payload)
+            return response, response.get("commandsApplied", 0)
+
+        self.run_endpoint(path, len(body), respond)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == STATS_PATH:
+            self.send_json(200, self.api.stats_to_dict())
+            return
+        if url.path != GAME_FEED_PATH:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}"})
+            return
+        query = parse_qs(url.query)
+        gameId = (query.get("GameID") or [""])[0]
+        self.run_endpoint(url.path, 0, lambda: (self.api.game_feed(gameId), 0))
+
+
+class MockWarzoneApiServer:
+    """
+    Runs the mock api on a background thread, port 0 picks a free port
+
+    Usage:
+        with MockWarzoneApiServer(latency=0.05) as server:
+            ChunkedMapUploader(email, token, mapId, url=f'{server.base_url}/SetMapDetails').upload(commands)
+            print(server.api.stats_to_dict())
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, verbose: bool = False, **api_options):
+        self.api = MockWarzoneApi(**api_options)
+        self.httpd = ThreadingHTTPServer((host, port), MockWarzoneApiHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.api = self.api
+        self.httpd.verbose = verbose
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}{API_PATH.rstrip("/")}'
+
+    def start(self) -> 'MockWarzoneApiServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-warzone-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'MockWarzoneApiServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves a local stand in for the Warzone SetMapDetails and GameFeed api")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="fraction of requests answered with an api error")
+    parser.add_argument("--maps-folder", help="folder of <game id>_map.json files served by GameFeed")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = MockWarzoneApiServer(
+        args.host, args.port, args.verbose, latency=args.latency, jitter=args.jitter, http_error_rate=args.http_error_rate,
+        api_error_rate=args.api_error_rate, maps_folder=args.maps_folder, seed=args.seed)
+    print(f"Mock Warzone API on {server.base_url}, set WARZONE_API_URL={server.base_url}", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.api.stats_to_dict(), indent=4), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
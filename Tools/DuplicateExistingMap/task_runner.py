@@ -0,0 +1,178 @@
+###
+#   Tk Task Runner
+#
+#   Runs slow work (api calls, compiling and uploading large maps) on a pool of worker threads
+#   so the Tk window keeps responding.
+#
+#   Tk may only be touched from the thread running mainloop, so workers never call back into the ui directly:
+#   they put their progress and results on a thread safe queue, which the main thread drains with after() polling
+#   and hands to the task's callbacks. Progress is coalesced per task, so a fast worker cannot flood the ui.
+#
+#   Cancellation is cooperative, the work checks context.is_cancelled() (or calls raise_if_cancelled)
+#   between its steps, e.g. between upload chunks. Work that finishes anyway, e.g. because the last chunk
+#   was already on its way, delivers its result: only work raising TaskCancelled counts as cancelled.
+#
+###
+
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from traceback import format_exc
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_POLL_MILLISECONDS = 50
+
+_PROGRESS = 'progress'
+_SUCCESS = 'success'
+_ERROR = 'error'
+_CANCELLED = 'cancelled'
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class TaskContext:
+    """ Handed to the work function so it can report progress and notice cancellation """
+
+    def __init__(self, handle: 'TaskHandle', results: queue.Queue):
+        self._handle = handle
+        self._results = results
+
+    def is_cancelled(self) -> bool:
+        return self._handle.cancel_requested.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.is_cancelled():
+            raise TaskCancelled()
+
+    def report_progress(self, completed: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        """ Reports completed out of total units of work, total None when it is not known yet """
+        self._results.put((_PROGRESS, self._handle, (completed, total, message)))
+
+
+class TaskHandle:
+    """ A submitted task, cancel it from the ui thread """
+
+    def __init__(self, task_id: int, name: str):
+        self.task_id = task_id
+        self.name = name
+        self.cancel_requested = threading.Event()
+        self.done = False
+        self.on_success: Optional[Callable[[Any], None]] = None
+        self.on_error: Optional[Callable[[Exception, str], None]] = None
+        self.on_progress: Optional[Callable[[float, Optional[float], Optional[str]], None]] = None
+        self.on_cancel: Optional[Callable[[], None]] = None
+
+    def cancel(self) -> None:
+        self.cancel_requested.set()
+
+
+class TkTaskRunner:
+    """
+    Worker pool whose results are delivered on the Tk main thread
+
+    Usage:
+        runner = TkTaskRunner(app)
+        handle = runner.submit(download, gameId, on_success=show_map, on_error=show_error, on_progress=progress_bar.update)
+
+        def download(context, gameId):
+            context.report_progress(0, None, "Downloading")
+            ...
+    """
+
+    def __init__(self, root, max_workers: int = DEFAULT_MAX_WORKERS, poll_milliseconds: int = DEFAULT_POLL_MILLISECONDS):
+        self.root = root
+        self.poll_milliseconds = poll_milliseconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warzone-task')
+        self._results: queue.Queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._active: Dict[int, TaskHandle] = {}
+        self._poll_id = None
+
+    def submit(
+            self,
+            work: Callable[..., Any],
+            *args,
+            name: str = '',
+            on_success: Optional[Callable[[Any], None]] = None,
+            on_error: Optional[Callable[[Exception, str], None]] = None,
+            on_progress: Optional[Callable[[float, Optional[float], Optional[str]], None]] = None,
+            on_cancel: Optional[Callable[[], None]] = None) -> TaskHandle:
+        """
+        Runs work(context, *args) on a worker thread, the callbacks are called on the Tk main thread
+
+        Args:
+            on_success: called with work's return value
+            on_error: called with the exception raised by work and its formatted traceback
+            on_progress: called with the latest (completed, total, message) reported since the last poll
+            on_cancel: called instead of on_success when work raises TaskCancelled
+        """
+        handle = TaskHandle(next(self._ids), name or getattr(work, '__name__', 'task'))
+        handle.on_success, handle.on_error, handle.on_progress, handle.on_cancel = on_success, on_error, on_progress, on_cancel
+        self._active[handle.task_id] = handle
+        self._executor.submit(self._run, handle, work, args)
+        self._schedule_poll()
+        return handle
+
+    def _run(self, handle: TaskHandle, work: Callable[..., Any], args) -> None:
+        context = TaskContext(handle, self._results)
+        try:
+            result = work(context, *args)
+            self._results.put((_SUCCESS, handle, result))
+        except TaskCancelled:
+            self._results.put((_CANCELLED, handle, None))
+        except Exception as e:
+            self._results.put((_ERROR, handle, (e, format_exc())))
+
+    def _schedule_poll(self) -> None:
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_milliseconds, self._poll)
+
+    def _poll(self) -> None:
+        self._poll_id = None
+        progress: Dict[int, tuple] = {}
+        finished = []
+        while True:
+            try:
+                kind, handle, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == _PROGRESS:
+                progress[handle.task_id] = (handle, value)
+            else:
+                progress.pop(handle.task_id, None)
+                finished.append((kind, handle, value))
+
+        for handle, value in progress.values():
+            if handle.on_progress and not handle.done:
+                handle.on_progress(*value)
+        for kind, handle, value in finished:
+            handle.done = True
+            self._active.pop(handle.task_id, None)
+            callback = {_SUCCESS: handle.on_success, _ERROR: handle.on_error, _CANCELLED: handle.on_cancel}[kind]
+            if callback is None:
+                continue
+            if kind == _CANCELLED:
+                callback()
+            elif kind == _ERROR:
+                callback(*value)
+            else:
+                callback(value)
+
+        if self._active:
+            self._schedule_poll()
+
+    def cancel_all(self) -> None:
+        for handle in list(self._active.values()):
+            handle.cancel()
+
+    def shutdown(self) -> None:
+        """ Cancels the running tasks and stops polling, call before destroying the root window """
+        self.cancel_all()
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,121 @@
+###
+#   Map Analysis
+#
+#   Reports on the connection graph of a map, for balancing bonuses and starting spots:
+#   components, articulation points (territories whose capture splits the map), the degree histogram,
+#   and for each bonus its territories, how many of them are on its border and how many territories outside it touch it.
+#   With --spots it also reports the distances between the starting spots and how many territories are closest to each.
+#
+#   The map is a downloaded map json or map model (.wzmap), or a map svg whose connections are derived from its
+#   Territory_ paths as territory_connections.py does, with the bonuses of its metadata.
+#   When most territories have no connections the analyses mean little, and a warning says so.
+#
+#   Usage: python analyse_map.py map.json [--spots 12 40 77] [--tolerance 4]
+#
+###
+
+import argparse
+import os
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_adjacency import DEFAULT_MIN_SHARED_LENGTH, territory_connection_commands
+from warzone_map_model import MAP_MODEL_EXTENSION, MapModel, load_map_json
+from warzone_paths import DEFAULT_FLATNESS
+from warzone_territory_graph import UNREACHABLE, TerritoryGraph, nearest_sources
+
+# warn when more territories than this have no connections
+MAX_UNCONNECTED_FRACTION = 0.5
+
+
+def load_graph(path: str, tolerance: Optional[float], min_shared_length: float, flatness: float) -> TerritoryGraph:
+    if path.lower().endswith(MAP_MODEL_EXTENSION):
+        return TerritoryGraph.from_map_model(MapModel.load(path))
+    if not path.lower().endswith(".svg"):
+        return TerritoryGraph.from_game_feed(load_map_json(path))
+
+    import inkex
+    from warzone_map_compiler import compile_map
+    from warzone_paths import get_territory_outlines
+
+    svg = inkex.load_svg(path).getroot()
+    territories = get_territory_outlines(svg, flatness)
+    connections = territory_connection_commands(territories, tolerance, min_shared_length)
+    compilation = compile_map(svg)
+    return TerritoryGraph.from_connections(
+        [(command.id1, command.id2) for command in connections],
+        [territory_id for territory_id, _ in territories],
+        compilation.members,
+        {name: bonus.armies for name, bonus in compilation.bonuses.items()})
+
+
+def format_ids(graph: TerritoryGraph, indices, limit: int = 20) -> str:
+    ids = graph.territory_ids[np.asarray(indices, dtype=np.int64)].tolist()
+    shown = ' '.join(str(territory_id) for territory_id in ids[:limit])
+    return shown + (f' ... ({len(ids)})' if len(ids) > limit else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reports on the connection graph of a map for balancing")
+    parser.add_argument("map", help="downloaded map json, map model (.wzmap) or map svg")
+    parser.add_argument("--spots", nargs="+", type=int, default=[], help="territory ids of the starting spots")
+    parser.add_argument("--tolerance", type=float, help="connection tolerance for an svg, defaults to an eighth of the median territory size")
+    parser.add_argument("--min-shared-length", type=float, default=DEFAULT_MIN_SHARED_LENGTH)
+    parser.add_argument("--flatness", type=float, default=DEFAULT_FLATNESS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = load_graph(args.map, args.tolerance, args.min_shared_length, args.flatness)
+    print(f'{graph.territory_count} territories loaded in {time.perf_counter() - start:.2f}s', file=sys.stderr)
+
+    unconnected = int(np.count_nonzero(graph.degrees == 0))
+    if unconnected > MAX_UNCONNECTED_FRACTION * graph.territory_count:
+        print(f'warning: {unconnected} of {graph.territory_count} territories have no connections, the analyses below are not meaningful. '
+              f'For an svg, try a larger --tolerance', file=sys.stderr)
+
+    start = time.perf_counter()
+    component_count, components = graph.connected_components()
+    articulation_points = graph.articulation_points()
+    borders = graph.bonus_borders()
+    print(f'{graph.territory_count} territories, {graph.connection_count} connections, {component_count} components')
+    if component_count > 1:
+        sizes = sorted(np.bincount(components).tolist(), reverse=True)
+        print(f'largest components: {" ".join(str(size) for size in sizes[:10])}')
+        print(f'unconnected territories: {format_ids(graph, np.flatnonzero(graph.degrees == 0))}')
+    print(f'articulation points: {format_ids(graph, articulation_points)}')
+    print('degree histogram: ' + ', '.join(
+        f'{degree}: {count}' for degree, count in enumerate(graph.degree_histogram().tolist()) if count))
+
+    if borders:
+        print()
+        print(f'{"bonus":<30} {"armies":>6} {"size":>5} {"border":>6} {"interior":>8} {"outside":>7}')
+        for name in sorted(borders):
+            border = borders[name]
+            armies = graph.bonus_values.get(name)
+            print(f'{name[:30]:<30} {"?" if armies is None else armies:>6} {len(graph.bonuses[name]):>5} '
+                  f'{len(border.border):>6} {len(border.interior):>8} {len(border.outside):>7}')
+
+    if args.spots:
+        try:
+            spots = graph.index_of(args.spots)
+        except KeyError as e:
+            parser.error(f'starting spot {e} is not a territory of the map')
+        distances = graph.bfs_distances(spots)
+        nearest_distances, nearest = nearest_sources(distances)
+        closest = np.bincount(nearest[nearest >= 0], minlength=len(spots))
+        print()
+        print(f'{"spot":>8} {"closest":>7} {"mean distance":>13}  distances to the other spots')
+        for row, spot_id in enumerate(args.spots):
+            own = nearest == row
+            mean = nearest_distances[own].mean() if own.any() else 0.0
+            others = ' '.join('-' if distance == UNREACHABLE else str(distance) for distance in distances[row, spots].tolist())
+            print(f'{spot_id:>8} {closest[row]:>7} {mean:>13.2f}  {others}')
+    print(f'analysed in {time.perf_counter() - start:.3f}s', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+###
+#   Path Validation
+#
+#   Checks every Territory_ path of a map svg (or every path with --all) for the problems that break
+#   the geometry tools and the upload: paths that are not closed, self intersections, zero area and duplicate vertices.
+#
+#   Results are kept in the cache folder by path data hash, so checking the map again after editing a few territories
+#   only checks those territories.
+#
+#   Usage: python validate_paths.py map.svg [--all] [--no-cache]
+#
+###
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_path_validation import PathValidator
+from warzone_svg_index import TERRITORY_PREFIX
+from warzone_svg_scanner import scan_svg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the territory paths of a map svg for invalid geometry")
+    parser.add_argument("svg", help="map svg with Territory_ ids")
+    parser.add_argument("--all", action="store_true", help="check every path of the svg, not only the territories")
+    parser.add_argument("--no-cache", action="store_true", help="check every path again instead of reusing saved results")
+    args = parser.parse_args()
+
+    validator = PathValidator() if args.no_cache else PathValidator.load()
+
+    start = time.perf_counter()
+    # the svg is streamed rather than loaded as a tree
+    if args.all:
+        reports = validator.validate_elements(scan_svg(args.svg, tags={'path'}))
+    else:
+        reports = validator.validate_elements(scan_svg(args.svg, id_prefixes=(TERRITORY_PREFIX,)))
+    print(f'{len(reports)} paths checked in {time.perf_counter() - start:.2f}s', file=sys.stderr)
+    if not args.no_cache:
+        validator.save()
+
+    invalid = {element_id: report for element_id, report in reports.items() if not report.is_valid}
+    for element_id, report in invalid.items():
+        print(f'{element_id}: {", ".join(report.problems())}')
+    print(f'{len(invalid)} of {len(reports)} paths have problems', file=sys.stderr)
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == "__main__":
+    main()
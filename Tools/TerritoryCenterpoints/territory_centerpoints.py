@@ -0,0 +1,56 @@
+###
+#   Territory Centerpoints
+#
+#   Computes the centerpoint of every Territory_ path of a map svg and writes them as a SetMapDetails payload
+#   of SetTerritoryCenterpointCommands, the same model the map uploader and the extensions output.
+#
+#   The centerpoint is the pole of inaccessibility, the point furthest inside the territory,
+#   so concave territories (crescents, L shapes) still get their army label inside them.
+#
+#   Usage: python territory_centerpoints.py map.svg [--output centerpoints.json] [--precision 0.5]
+#
+###
+
+import argparse
+import os
+import sys
+import time
+
+import inkex
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_centerpoints import DEFAULT_CENTERPOINT_PRECISION, territory_centerpoint_commands
+from warzone_commands import WarzoneSetDetailsPostRequestModel
+from warzone_paths import DEFAULT_FLATNESS, get_territory_outlines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Computes territory centerpoints from the territory paths of a map svg")
+    parser.add_argument("svg", help="map svg with Territory_ ids")
+    parser.add_argument("--output", help="payload json file, defaults to stdout")
+    parser.add_argument("--precision", type=float, default=DEFAULT_CENTERPOINT_PRECISION)
+    parser.add_argument("--flatness", type=float, default=DEFAULT_FLATNESS)
+    parser.add_argument("--email", default="ignore")
+    parser.add_argument("--token", default="ignore")
+    parser.add_argument("--map-id", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    territories = get_territory_outlines(inkex.load_svg(args.svg).getroot(), args.flatness)
+    print(f'{len(territories)} territories flattened in {time.perf_counter() - start:.2f}s', file=sys.stderr)
+
+    start = time.perf_counter()
+    commands = list(territory_centerpoint_commands(territories, args.precision))
+    print(f'{len(commands)} centerpoints found in {time.perf_counter() - start:.2f}s', file=sys.stderr)
+
+    json_model = WarzoneSetDetailsPostRequestModel(args.email, args.token, args.map_id, commands)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json_model.write_JSON(stream)
+    else:
+        json_model.write_JSON(sys.stdout)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
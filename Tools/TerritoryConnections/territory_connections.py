@@ -0,0 +1,67 @@
+###
+#   Territory Connections
+#
+#   Computes the connections of a map from the Territory_ paths of its svg and writes them as a SetMapDetails payload
+#   of AddTerritoryConnectionCommands, the same model the map uploader and the extensions output.
+#
+#   Territories whose outlines run alongside each other within --tolerance for at least --min-shared-length are connected,
+#   so tolerance should be a little larger than the gaps between neighbouring borders and larger than --flatness.
+#   By default it is worked out from the size of the territories (see Common/warzone_adjacency.py), which suits the CompletedMaps.
+#
+#   Usage: python territory_connections.py map.svg [--output connections.json] [--tolerance 4] [--min-shared-length 1]
+#
+###
+
+import argparse
+import os
+import sys
+import time
+
+import inkex
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Common"))
+from warzone_adjacency import DEFAULT_MIN_SHARED_LENGTH, estimate_tolerance, territory_connection_commands
+from warzone_commands import WarzoneSetDetailsPostRequestModel
+from warzone_paths import DEFAULT_FLATNESS, get_territory_outlines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Computes territory connections from the territory paths of a map svg")
+    parser.add_argument("svg", help="map svg with Territory_ ids")
+    parser.add_argument("--output", help="payload json file, defaults to stdout")
+    parser.add_argument("--tolerance", type=float, help="defaults to an eighth of the median territory size")
+    parser.add_argument("--min-shared-length", type=float, default=DEFAULT_MIN_SHARED_LENGTH)
+    parser.add_argument("--flatness", type=float, default=DEFAULT_FLATNESS)
+    parser.add_argument("--email", default="ignore")
+    parser.add_argument("--token", default="ignore")
+    parser.add_argument("--map-id", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    territories = get_territory_outlines(inkex.load_svg(args.svg).getroot(), args.flatness)
+    print(f'{len(territories)} territories flattened in {time.perf_counter() - start:.2f}s', file=sys.stderr)
+    tolerance = args.tolerance if args.tolerance is not None else estimate_tolerance([polygon for _, polygon in territories])
+    print(f'tolerance {tolerance:.2f}', file=sys.stderr)
+
+    connection_count = 0
+
+    def counted(commands):
+        nonlocal connection_count
+        for command in commands:
+            connection_count += 1
+            yield command
+
+    start = time.perf_counter()
+    commands = counted(territory_connection_commands(territories, tolerance, args.min_shared_length))
+    json_model = WarzoneSetDetailsPostRequestModel(args.email, args.token, args.map_id, commands)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            json_model.write_JSON(stream)
+    else:
+        json_model.write_JSON(sys.stdout)
+        sys.stdout.write("\n")
+    print(f'{connection_count} connections found in {time.perf_counter() - start:.2f}s', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()